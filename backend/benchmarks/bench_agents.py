@@ -0,0 +1,101 @@
+"""
+Per-stage latency of get_scheme_response with the decision and recommendation agents run
+serially, speculatively in parallel, and with the local skip-decision heuristic.
+
+    cd backend && python -m benchmarks.bench_agents --latency 0.3 --token-delay 0.01
+
+Queries are the recorded conversations plus a few vague ones; the fake model asks a
+follow-up for conversations under six words, which exercises cancelling the speculative run.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_default_openai_api, set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from benchmarks.fixtures import load_conversations  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, close_embedding_client  # noqa: E402
+from core.settings import settings  # noqa: E402
+from core.timing import StageTimer  # noqa: E402
+from service.recommendation import get_scheme_response  # noqa: E402
+
+VAGUE_QUERIES = ["pension", "I want a loan", "scholarship please", "any scheme for me"]
+
+MODES = {
+    "serial": {"SPECULATIVE_AGENTS": False, "DECISION_SKIP_HEURISTIC": False},
+    "speculative": {"SPECULATIVE_AGENTS": True, "DECISION_SKIP_HEURISTIC": False},
+    "speculative+skip": {"SPECULATIVE_AGENTS": True, "DECISION_SKIP_HEURISTIC": True},
+}
+
+
+def median(values):
+    return statistics.median(values) if values else 0.0
+
+
+async def run_mode(conversations, mode):
+    for name, value in MODES[mode].items():
+        setattr(settings, name, value)
+    timings = []
+    for history, current_input in conversations:
+        timer = StageTimer()
+        await get_scheme_response(history, current_input, timer=timer)
+        timings.append(timer.summary())
+    return timings
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    set_default_openai_api("chat_completions")
+    set_tracing_disabled(True)
+
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+    conversations = [(c["conversation_history"], c["current_input"]) for c in load_conversations()]
+    conversations += [([query], "") for query in VAGUE_QUERIES]
+
+    fake_api = start_server(PORT, args.latency, args.token_delay)
+    try:
+        await run_mode(conversations[:2], "serial")
+        results = {mode: await run_mode(conversations, mode) for mode in MODES}
+    finally:
+        fake_api.terminate()
+        await close_embedding_client()
+
+    print()
+    print(f"{len(conversations)} conversations, model latency {args.latency * 1000:.0f}ms, {args.token_delay * 1000:.0f}ms per 4-char chunk")
+    print(f"{'median ms':18}{'retrieval':>10}{'decision':>10}{'recommend':>10}{'total':>10}{'decisions':>11}{'cancelled':>11}")
+    for mode, timings in results.items():
+        print(
+            f"{mode:18}"
+            f"{median([t['retrieval'] for t in timings]):10.0f}"
+            f"{median([t['decision'] for t in timings if 'decision' in t]):10.0f}"
+            f"{median([t['recommendation'] for t in timings if 'recommendation' in t]):10.0f}"
+            f"{median([t['total'] for t in timings]):10.0f}"
+            f"{sum('decision' in t for t in timings):>11}"
+            f"{sum('recommendation (cancelled)' in t for t in timings):>11}"
+        )
+    serial = sum(t["total"] for t in results["serial"])
+    for mode in list(MODES)[1:]:
+        saved = serial - sum(t["total"] for t in results[mode])
+        print(f"{mode}: {saved / len(conversations):.0f}ms saved per turn on average")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    asyncio.run(main(parser.parse_args()))
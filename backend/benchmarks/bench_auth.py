@@ -0,0 +1,182 @@
+"""
+Auth overhead per request: firebase_admin's verify_id_token in FastAPI's threadpool (the
+previous sync dependency) vs the async FirebaseTokenVerifier with its verified-token cache.
+
+    cd backend && python -m benchmarks.bench_auth --users 200 --requests 5000 --concurrency 50
+
+Runs offline: an RSA key and certificate are minted locally, served as Google's certificate
+endpoint would serve them, and used to sign Firebase-shaped ID tokens. Each simulated user
+sends requests with one token, so all but the first request per user can hit the cache.
+Also checks both verifiers reject expired, wrong-audience and wrongly-signed tokens.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt  # noqa: E402
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+from fastapi.concurrency import run_in_threadpool  # noqa: E402
+
+from core.firebase_auth import ISSUER_PREFIX, FirebaseTokenVerifier  # noqa: E402
+
+PROJECT_ID = "yojana-bench"
+KID = "bench-key"
+PORT = int(os.getenv("FAKE_CERTS_PORT", "8767"))
+
+
+def mint_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "securetoken.system.gserviceaccount.com")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def mint_token(key, uid: str, project_id: str = PROJECT_ID, lifetime: int = 3600) -> str:
+    now = int(time.time())
+    claims = {
+        "iss": ISSUER_PREFIX + project_id, "aud": project_id, "sub": uid, "user_id": uid,
+        "auth_time": now - 60, "iat": now - 60, "exp": now + lifetime,
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": KID})
+
+
+def serve_certs(certs: dict, port: int) -> ThreadingHTTPServer:
+    """Local stand-in for Google's signing-certificate endpoint."""
+    body = json.dumps(certs).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Cache-Control", "public, max-age=21600, must-revalidate, no-transform")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_verifier(key, certs_url: str):
+    """The previous dependency body: firebase_admin's synchronous verify_id_token."""
+    import firebase_admin
+    from firebase_admin import _token_gen, auth, credentials
+
+    _token_gen.ID_TOKEN_CERT_URI = certs_url
+    service_account = {
+        "type": "service_account",
+        "project_id": PROJECT_ID,
+        "private_key": key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()).decode(),
+        "client_email": f"bench@{PROJECT_ID}.iam.gserviceaccount.com",
+        "token_uri": "https://oauth2.googleapis.com/token",
+    }
+    app = firebase_admin.initialize_app(credentials.Certificate(service_account), {"projectId": PROJECT_ID}, name="bench")
+    return lambda token: auth.verify_id_token(token, app=app)
+
+
+async def load(verify, tokens, requests: int, concurrency: int):
+    """Latencies (ms) of `requests` verifications issued by `concurrency` workers, cycling through `tokens`."""
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            await verify(tokens[i % len(tokens)])
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - start
+
+
+def rejects(verify_sync, token) -> bool:
+    try:
+        verify_sync(token)
+    except Exception:
+        return True
+    return False
+
+
+async def main(args):
+    key, cert = mint_key()
+    other_key, _ = mint_key()
+    server = serve_certs({KID: cert}, PORT)
+    certs_url = f"http://127.0.0.1:{PORT}/"
+
+    legacy = legacy_verifier(key, certs_url)
+    verifier = FirebaseTokenVerifier(PROJECT_ID, certs_url=certs_url)
+    await verifier.start()
+
+    bad_tokens = {
+        "expired": mint_token(key, "u-expired", lifetime=-120),
+        "wrong audience": mint_token(key, "u-aud", project_id="other-project"),
+        "wrong key": mint_token(other_key, "u-key"),
+    }
+    for name, token in bad_tokens.items():
+        try:
+            await verifier.verify(token)
+            new_rejects = False
+        except Exception:
+            new_rejects = True
+        print(f"{name:15} legacy rejects: {rejects(legacy, token)}, new rejects: {new_rejects}")
+        if not new_rejects:
+            sys.exit(1)
+
+    tokens = [mint_token(key, f"user-{i}") for i in range(args.users)]
+
+    async def legacy_dependency(token):
+        # FastAPI runs sync dependencies in its threadpool
+        return await run_in_threadpool(legacy, token)
+
+    results = {}
+    try:
+        await load(legacy_dependency, tokens[:5], 20, 5)
+        results["firebase_admin"] = await load(legacy_dependency, tokens, args.requests, args.concurrency)
+        results["cold cache"] = await load(verifier.verify, [mint_token(key, f"cold-{i}") for i in range(args.users)], args.users, args.concurrency)
+        results["async verifier"] = await load(verifier.verify, tokens, args.requests, args.concurrency)
+    finally:
+        stats = verifier.stats()
+        await verifier.close()
+        server.shutdown()
+
+    print()
+    print(f"{args.users} users, concurrency {args.concurrency}, {os.cpu_count()} CPUs")
+    print(f"{'':16}{'requests':>9}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>10}")
+    for name, (latencies, seconds) in results.items():
+        latencies = sorted(latencies)
+        print(
+            f"{name:16}{len(latencies):9}{statistics.mean(latencies):9.3f}{latencies[len(latencies) // 2]:9.3f}"
+            f"{latencies[int(len(latencies) * 0.99) - 1]:9.3f}{len(latencies) / seconds:10.0f}"
+        )
+    print(f"verifier: {stats['hits']} cache hits, {stats['misses']} misses, {stats['key_refreshes']} key fetches")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,147 @@
+"""
+Throughput of /recommend/batch against one /recommend call per profile, with the local fake OpenAI API.
+
+    cd backend && python -m benchmarks.bench_batch --profiles 50 --concurrency 8 --latency 0.1 --token-delay 0.002
+
+Screens `--profiles` synthetic beneficiary profiles three ways: one `get_scheme_response` at a
+time (a partner looping over /recommend), `--concurrency` of them at once, and `recommend_batch`
+with the same concurrency. Embeddings and agent replies come from the fake server, which waits
+`--latency` seconds per request plus `--token-delay` per four characters of a reply. Reports
+profiles per second, embedding API calls and, for the batch, when its first and last NDJSON
+lines were ready.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+os.environ.setdefault("VECTOR_ENGINE", "numpy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_default_openai_api, set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, OpenAIEmbeddingClient, set_embedding_client  # noqa: E402
+from core.settings import settings  # noqa: E402
+from service.batch import profile_query, recommend_batch  # noqa: E402
+from service.recommendation import get_scheme_response  # noqa: E402
+
+STATES = ["Kerala", "Maharashtra", "Bihar", "Tamil Nadu", "Rajasthan", "Assam", "Punjab", "Odisha"]
+OCCUPATIONS = ["farmer", "student", "fisherman", "weaver", "street vendor", "construction worker", "unemployed"]
+NEEDS = ["pension", "scholarship", "housing", "crop insurance", "business loan", "health insurance", "skill training"]
+
+
+class CountingEmbeddingClient:
+    """Counts embedding API calls and texts on their way to the wrapped client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.model = client.model
+        self.calls = 0
+        self.texts = 0
+
+    async def embed(self, texts):
+        self.calls += 1
+        self.texts += len(texts)
+        return await self.client.embed(texts)
+
+    async def close(self):
+        await self.client.close()
+
+
+def synthetic_profiles(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        {
+            "id": f"beneficiary-{i}",
+            "profile": {
+                "age": rng.randint(18, 80),
+                "gender": rng.choice(["female", "male"]),
+                "state": rng.choice(STATES),
+                "occupation": rng.choice(OCCUPATIONS),
+                "looking for": rng.choice(NEEDS),
+            },
+        }
+        for i in range(count)
+    ]
+
+
+async def per_request(profiles, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(profile):
+        async with semaphore:
+            return await get_scheme_response([], profile_query(profile))
+
+    return await asyncio.gather(*(one(profile) for profile in profiles))
+
+
+async def batch(profiles, concurrency: int):
+    """Seconds until each NDJSON line was ready, in the order they came out."""
+    start = time.perf_counter()
+    ready, errors = [], 0
+    async for line in recommend_batch(profiles, concurrency=concurrency):
+        ready.append(time.perf_counter() - start)
+        errors += "error" in line
+    return ready, errors
+
+
+async def main(args):
+    logging.disable(logging.WARNING)
+    set_default_openai_api("chat_completions")
+    set_tracing_disabled(True)
+    settings.SINGLE_FLIGHT = False
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+    profiles = synthetic_profiles(args.profiles)
+
+    fake_api = start_server(PORT, args.latency, args.token_delay)
+    rows = []
+    try:
+        for label, run in (
+            ("/recommend, one at a time", lambda: per_request(profiles, 1)),
+            (f"/recommend, {args.concurrency} at a time", lambda: per_request(profiles, args.concurrency)),
+            (f"batch, {args.concurrency} agents at a time", lambda: batch(profiles, args.concurrency)),
+        ):
+            client = CountingEmbeddingClient(OpenAIEmbeddingClient())
+            set_embedding_client(client)
+            start = time.perf_counter()
+            result = await run()
+            seconds = time.perf_counter() - start
+            await client.close()
+            rows.append((label, seconds, client.calls, result))
+    finally:
+        fake_api.terminate()
+
+    print()
+    print(f"{args.profiles} profiles, {args.schemes} schemes, fake model latency {args.latency * 1000:.0f}ms per request, {args.token_delay * 1000:.0f}ms per 4 characters generated")
+    print(f"{'':34}{'seconds':>9}{'profiles/s':>12}{'embed calls':>13}")
+    for label, seconds, calls, _ in rows:
+        print(f"{label:34}{seconds:9.2f}{args.profiles / seconds:12.1f}{calls:13}")
+    ready, errors = rows[-1][3]
+    print(
+        f"batch NDJSON lines: first after {ready[0] * 1000:.0f}ms, median {statistics.median(ready) * 1000:.0f}ms, "
+        f"last {ready[-1] * 1000:.0f}ms; {errors} errors"
+    )
+    print("/recommend may also run the follow-up decision agent; the batch runs only the recommendation agent")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--profiles", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.002)
+    asyncio.run(main(parser.parse_args()))
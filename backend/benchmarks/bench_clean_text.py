@@ -0,0 +1,103 @@
+"""
+clean_text_field micro-benchmark over the real scheme-detail shards.
+
+    cd backend && python -m benchmarks.bench_clean_text --repeat 3
+
+Compares the previous six-pass implementation with the precompiled one on every markdown
+field the extractor cleans, and checks the outputs are byte-identical, both for one pass
+(extract_scheme_fields) and for the second pass prepare_scheme_for_metadata applies.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.utils import clean_text_field  # noqa: E402
+from service.reindex import list_detail_shards  # noqa: E402
+
+# Edge cases the shards do not cover
+EXTRA_CASES = [
+    "", "   ", "plain text", " leading", "trailing ", "a  b", "a b", "a b", "x\x0by", "a\r\nb",
+    "1. first\n2. second", "- - nested bullet", "•item", "10.5 percent", "१. devanagari digit",
+    "**bold** and __under__ and ***both***", "snake_case_url", "[a](b) [[c](d)](e)", "[unclosed](",
+    "line<br>break<BR/>again<br />", "<b>not br</b>", "\t\ttabs\t", "-", "1.", "[x](y\nz)",
+    "a\r- b", "\n\n- x", " \n 1. y\n  • z", "* star bullet", "1.5 lakh", "a < b", "x\u2003\u00a0y",
+]
+
+
+def legacy_clean_text_field(text: str) -> str:
+    """clean_text_field as it was before the rules were precompiled."""
+    if not text or not isinstance(text, str):
+        return ""
+    text = re.sub(r"[*_]{1,3}", "", text)
+    text = re.sub(r"\[(.*?)\]\((.*?)\)", r"\1 ( \2 )", text)
+    text = re.sub(r"<br\s*/?>", " ", text, flags=re.IGNORECASE)
+    text = re.sub(r"^\s*(\d+\.\s*|[-•]\s*)", "", text, flags=re.MULTILINE)
+    text = re.sub(r"\s*[\n\r\t]+\s*", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def shard_fields():
+    fields = []
+    for path in list_detail_shards():
+        with open(path, "rb") as f:
+            data = json.load(f)
+        for scheme_obj in data.values():
+            en = scheme_obj.get("en", {})
+            content = en.get("schemeContent", {})
+            fields += [
+                content.get("detailedDescription_md", ""),
+                content.get("benefits_md", ""),
+                content.get("exclusions_md", ""),
+                en.get("eligibilityCriteria", {}).get("eligibilityDescription_md", ""),
+            ]
+            fields += [step.get("process_md", "") for step in en.get("applicationProcess", [])]
+    return fields
+
+
+def best_ms(fn, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            fn(text)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best
+
+
+def main(args):
+    fields = shard_fields()
+    texts = fields + EXTRA_CASES
+
+    legacy_once = [legacy_clean_text_field(text) for text in texts]
+    new_once = [clean_text_field(text) for text in texts]
+    legacy_twice = [legacy_clean_text_field(text) for text in legacy_once]
+    new_twice = [clean_text_field(text) for text in new_once]
+    mismatches = sum(a != b for a, b in zip(legacy_once, new_once)) + sum(a != b for a, b in zip(legacy_twice, new_twice))
+    not_fixed = sum(a != b for a, b in zip(new_once, new_twice))
+
+    legacy_ms = best_ms(legacy_clean_text_field, fields, args.repeat)
+    new_ms = best_ms(clean_text_field, fields, args.repeat)
+    cleaned = [clean_text_field(text) for text in fields]
+    legacy_again_ms = best_ms(legacy_clean_text_field, cleaned, args.repeat)
+    new_again_ms = best_ms(clean_text_field, cleaned, args.repeat)
+
+    print()
+    print(f"{len(fields)} fields, {sum(len(t or '') for t in fields) / 1e6:.1f}M chars, + {len(EXTRA_CASES)} edge cases")
+    print(f"byte-identical: {'yes' if mismatches == 0 else f'NO, {mismatches} mismatches'}"
+          f" ({not_fixed} outputs change on a second pass in both implementations)")
+    print(f"{'':22}{'legacy ms':>10}{'new ms':>10}{'speedup':>9}")
+    print(f"{'raw fields':22}{legacy_ms:10.1f}{new_ms:10.1f}{legacy_ms / new_ms:8.1f}x")
+    print(f"{'already cleaned':22}{legacy_again_ms:10.1f}{new_again_ms:10.1f}{legacy_again_ms / new_again_ms:8.1f}x")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3)
+    main(parser.parse_args())
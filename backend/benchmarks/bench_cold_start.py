@@ -0,0 +1,187 @@
+"""
+Cold start of the backend: import time, time to the first successful /recommend, and memory
+shared by forked workers.
+
+    cd backend && python -m benchmarks.bench_cold_start --schemes 2000 --workers 4
+
+1. Import: `import main` in fresh interpreters, and the heavy modules it no longer imports.
+2. Start: a fresh uvicorn process serving main.app (Firebase auth overridden, Redis and OpenAI
+   replaced by the local stand-ins) is polled on /health, then sent one /recommend, with the
+   startup warmup on and off. Timings are from process spawn.
+3. Fork: `--workers` processes forked from one parent each run a search, with the index and
+   the agents SDK loaded in each worker or preloaded in the parent (as gunicorn --preload does).
+   Reports each worker's private memory (pages not shared with any other process).
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+OPENAI_PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+REDIS_PORT = int(os.getenv("FAKE_REDIS_PORT", "6393"))
+APP_PORT = int(os.getenv("BENCH_APP_PORT", "8767"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{OPENAI_PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+os.environ["REDIS_URL"] = f"redis://127.0.0.1:{REDIS_PORT}?protocol=2"
+os.environ["EMBEDDING_CACHE_REDIS"] = "false"
+os.environ.setdefault("FIREBASE_PROJECT_ID", "bench")
+# Nothing listens there: the verifier logs that the keys are unavailable and auth is overridden anyway
+os.environ["FIREBASE_CERTS_URL"] = "http://127.0.0.1:9/certs"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import httpx  # noqa: E402
+
+# Serves main.app as uvicorn would, with Firebase auth replaced by a fixed user. The fake API
+# speaks chat completions, which the agents SDK is switched to once it has been imported.
+APP_SCRIPT = f"""
+import main, uvicorn
+from service import recommendation
+get_runner = recommendation.get_runner
+def chat_completions_runner():
+    from agents import set_default_openai_api
+    set_default_openai_api("chat_completions")
+    return get_runner()
+recommendation.get_runner = chat_completions_runner
+main.app.dependency_overrides[main.verify_firebase_token] = lambda: {{"uid": "bench"}}
+uvicorn.run(main.app, host="127.0.0.1", port={APP_PORT}, log_level="warning")
+"""
+
+
+def timed_import(statement: str) -> float:
+    code = f"import time; t = time.perf_counter(); {statement}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    return float(out.strip().splitlines()[-1]) * 1000
+
+
+def cold_start(warmup: bool) -> dict:
+    env = {**os.environ, "WARMUP": str(warmup).lower(), "PRELOAD": str(warmup).lower(), "RESPONSE_CACHE": "false"}
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", APP_SCRIPT], cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    timings = {}
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=60) as client:
+            while "ready" not in timings:
+                try:
+                    response = client.get("/health")
+                except httpx.TransportError:
+                    if process.poll() is not None:
+                        raise RuntimeError("app exited during startup")
+                    time.sleep(0.02)
+                    continue
+                timings.setdefault("listening", (time.perf_counter() - start) * 1000)
+                if response.status_code == 200:
+                    timings["ready"] = (time.perf_counter() - start) * 1000
+                    timings["state"] = response.json()
+                else:
+                    time.sleep(0.02)
+            sent = time.perf_counter()
+            response = client.post("/recommend", json={"conversation_history": ["I am a 60 year old farmer in Kerala looking for a pension scheme"]})
+            response.raise_for_status()
+            assert "detail" not in response.json(), response.json()
+            timings["first_request"] = (time.perf_counter() - sent) * 1000
+            timings["first_success"] = (time.perf_counter() - start) * 1000
+            sent = time.perf_counter()
+            client.post("/recommend", json={"conversation_history": ["scholarship for a girl student in Bihar studying engineering"]}).raise_for_status()
+            timings["second_request"] = (time.perf_counter() - sent) * 1000
+    finally:
+        process.terminate()
+        process.wait()
+    return timings
+
+
+def private_mb() -> float:
+    """Private_Clean + Private_Dirty of this process, in MB."""
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total / 1024
+
+
+def fork_workers(workers: int, preloaded: bool):
+    """Runs in its own interpreter; prints each forked worker's private memory as JSON."""
+    from core import startup
+    from core.embedding_search import query_schemes
+    from core.embeddings import HashingEmbeddingClient, set_embedding_client
+
+    if preloaded:
+        startup.preload(fork_safe=True)
+    read_end, write_end = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            startup.preload()
+            set_embedding_client(HashingEmbeddingClient())
+            asyncio.run(query_schemes("pension for farmers in Kerala", top_k=10))
+            os.write(write_end, f"{private_mb():.1f}\n".encode())
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    os.close(write_end)
+    with os.fdopen(read_end) as f:
+        print(json.dumps([float(line) for line in f.read().split()]))
+
+
+def run_fork_workers(workers: int, preloaded: bool):
+    env = {**os.environ, "VECTOR_ENGINE": "numpy"}
+    args = [sys.executable, "-m", "benchmarks.bench_cold_start", "--fork-workers", str(workers)] + (["--preloaded"] if preloaded else [])
+    out = subprocess.run(args, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(args):
+    from benchmarks.bench_indexing import synthetic_schemes
+    from benchmarks.fake_openai_server import start_server as start_openai
+    from benchmarks.fake_redis_server import start_server as start_redis
+    from core import embedding_search
+    from core.embeddings import HashingEmbeddingClient
+
+    asyncio.run(embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient()))
+
+    imports = {name: statistics.median(timed_import(f"import {name}") for _ in range(args.rounds)) for name in ("main", "agents", "chromadb")}
+    fake_api = start_openai(OPENAI_PORT, args.latency, 0.0)
+    fake_redis = start_redis(REDIS_PORT, 0.0)
+    try:
+        starts = {warmup: cold_start(warmup) for warmup in (False, True)}
+    finally:
+        fake_api.terminate()
+        fake_redis.terminate()
+    forks = {preloaded: run_fork_workers(args.workers, preloaded) for preloaded in (False, True)}
+
+    print()
+    print(f"import main: {imports['main']:.0f}ms (median of {args.rounds}); deferred until first use or preload: "
+          f"agents {imports['agents']:.0f}ms, chromadb {imports['chromadb']:.0f}ms")
+    print(f"cold start with {args.schemes} schemes on {os.getenv('VECTOR_ENGINE', 'chroma')}, fake model latency {args.latency * 1000:.0f}ms (ms from spawn)")
+    print(f"{'warmup':8}{'listening':>11}{'ready':>8}{'first /recommend':>18}{'first success':>15}{'second':>8}")
+    for warmup, t in starts.items():
+        print(f"{'on' if warmup else 'off':8}{t['listening']:11.0f}{t['ready']:8.0f}{t['first_request']:18.0f}{t['first_success']:15.0f}{t['second_request']:8.0f}")
+    print(f"/health when ready: {starts[True]['state']}")
+    print(f"{args.workers} forked workers, private MB each after one search")
+    for preloaded, sizes in forks.items():
+        print(f"{'preloaded in parent' if preloaded else 'loaded per worker':22}{statistics.mean(sizes):8.1f} (total {sum(sizes):.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--fork-workers", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--preloaded", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.fork_workers:
+        fork_workers(args.fork_workers, args.preloaded)
+    else:
+        main(args)
@@ -0,0 +1,107 @@
+"""
+Slim vector-store metadata plus the id-keyed detail store vs full records in Chroma metadata.
+
+    cd backend && python -m benchmarks.bench_detail_store --top-k 25 --picks 10
+
+Indexes the real scheme data with the offline hashing embedder, then for every recorded
+conversation measures the Chroma query with full vs slim metadata (time and bytes
+deserialized), reading the picked schemes from the detail store, and /recommend response
+size with and without a field projection.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.fixtures import load_conversations, load_real_schemes
+from core import embedding_search
+from core.embeddings import HashingEmbeddingClient
+from core.utils import combine_conversation, prepare_scheme_for_metadata
+from core.vector_index import VectorIndex
+
+PROJECTION = ["name", "benefits", "applicationProcess", "links"]
+
+
+def size(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def best_ms(fn, repeat=5):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, result
+
+
+async def main(args):
+    schemes = load_real_schemes()
+    embedder = HashingEmbeddingClient()
+    await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=embedder)
+
+    slim = embedding_search.get_collection()
+    index = embedding_search.get_vector_index()
+    by_id = embedding_search._dedupe_schemes(schemes)
+
+    # The layout before this change: every prepared field stored as Chroma metadata
+    full = embedding_search.get_chroma_client().get_or_create_collection(name="bench_full_metadata")
+    full_metadatas = [prepare_scheme_for_metadata(by_id[scheme_id]) for scheme_id in index.ids]
+    for start in range(0, len(index.ids), 500):
+        full.add(
+            ids=index.ids[start:start + 500],
+            embeddings=[row.tolist() for row in index.matrix[start:start + 500]],
+            metadatas=full_metadatas[start:start + 500],
+        )
+
+    export_dir = tempfile.mkdtemp(prefix="bench_vectors_")
+    VectorIndex(index.ids, index.matrix, full_metadatas).save(os.path.join(export_dir, "full"))
+    index.save(os.path.join(export_dir, "slim"))
+    load_full_ms, _ = best_ms(lambda: VectorIndex.load(os.path.join(export_dir, "full")))
+    load_slim_ms, _ = best_ms(lambda: VectorIndex.load(os.path.join(export_dir, "slim")))
+
+    rows = []
+    for conversation in load_conversations():
+        query = combine_conversation(conversation["conversation_history"], conversation["current_input"])
+        vector = (await embedder.embed([query]))[0]
+
+        full_ms, full_result = best_ms(lambda: full.query(query_embeddings=[vector], n_results=args.top_k))
+        slim_ms, slim_result = best_ms(lambda: slim.query(query_embeddings=[vector], n_results=args.top_k))
+        picks = slim_result["ids"][0][:args.picks]
+        details_ms, details = best_ms(lambda: embedding_search.get_scheme_details(picks))
+        projected = embedding_search.get_scheme_details(picks, PROJECTION)
+
+        rows.append({
+            "full_ms": full_ms,
+            "slim_ms": slim_ms + details_ms,
+            "details_ms": details_ms,
+            "full_bytes": size(full_result["metadatas"][0]),
+            "slim_bytes": size(slim_result["metadatas"][0]),
+            "response_full": size({"message": "", "results": [details[p] for p in picks]}),
+            "response_projected": size({"message": "", "results": [projected[p] for p in picks]}),
+        })
+
+    def mean(key):
+        return statistics.mean(row[key] for row in rows)
+
+    print()
+    print(f"{len(index)} schemes, {len(rows)} queries, top_k={args.top_k}, {args.picks} picks")
+    print(f"chroma query, full metadata        : {mean('full_ms'):7.2f}ms, {mean('full_bytes') / 1024:7.1f} KB deserialized")
+    print(f"chroma query, slim + detail reads  : {mean('slim_ms'):7.2f}ms, {mean('slim_bytes') / 1024:7.1f} KB deserialized"
+          f" (detail store {mean('details_ms'):.2f}ms)")
+    print(f"numpy index load, full vs slim     : {load_full_ms:7.1f}ms vs {load_slim_ms:.1f}ms")
+    print(f"/recommend response, all fields    : {mean('response_full') / 1024:7.1f} KB")
+    print(f"/recommend response, {len(PROJECTION)} fields      : {mean('response_projected') / 1024:7.1f} KB  ({', '.join(PROJECTION)})")
+
+    embedding_search.get_chroma_client().delete_collection(name="bench_full_metadata")
+
+
+if __name__ == "__main__":
+    import asyncio
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--picks", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
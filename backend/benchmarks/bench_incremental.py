@@ -0,0 +1,53 @@
+"""
+Incremental reindex benchmark against the offline hashing embedder.
+
+    cd backend && python -m benchmarks.bench_incremental --schemes 1000 --changed 30
+
+Builds a full index, then simulates a nightly scrape that edits, adds and removes a
+few schemes and runs the incremental sync.
+"""
+import argparse
+import asyncio
+import copy
+import time
+
+from benchmarks.bench_indexing import synthetic_schemes
+from core import embedding_search
+from core.embeddings import HashingEmbeddingClient
+
+
+async def main(args):
+    schemes = synthetic_schemes(args.schemes + args.added)
+    current, new_arrivals = schemes[:args.schemes], schemes[args.schemes:]
+
+    full_client = HashingEmbeddingClient(latency=args.latency)
+    start = time.perf_counter()
+    await embedding_search.index_schemes(current, force_reindex=True, embedding_client=full_client)
+    full_time = time.perf_counter() - start
+
+    scraped = copy.deepcopy(current[args.deleted:]) + new_arrivals
+    for scheme in scraped[:args.changed]:
+        scheme["description"] += " Revised guidelines for 2025."
+    for scheme in scraped[args.changed:args.changed + args.metadata_only]:
+        scheme["links"] = scheme["links"] + [{"title": "FAQ", "url": "https://example.org/faq"}]
+
+    incremental_client = HashingEmbeddingClient(latency=args.latency)
+    report = await embedding_search.update_index(scraped, embedding_client=incremental_client)
+
+    print()
+    print(f"full build          : {full_time:6.2f}s  {full_client.requests} embedding requests")
+    print(f"incremental sync    : {report['seconds']:6.2f}s  {incremental_client.requests} embedding requests")
+    for key in ["added", "changed", "metadata_only", "unchanged", "deleted", "embedding_calls_saved", "seconds_saved"]:
+        print(f"  {key:22}: {round(report[key], 2)}")
+    print(f"serving collection  : {embedding_search.get_collection().count()} schemes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=1000)
+    parser.add_argument("--changed", type=int, default=30)
+    parser.add_argument("--metadata-only", type=int, default=10)
+    parser.add_argument("--added", type=int, default=5)
+    parser.add_argument("--deleted", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per embedding request")
+    asyncio.run(main(parser.parse_args()))
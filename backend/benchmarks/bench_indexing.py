@@ -0,0 +1,103 @@
+"""
+Indexing benchmark against the offline hashing embedder.
+
+    cd backend && python -m benchmarks.bench_indexing --schemes 500 --latency 0.05
+
+Compares the old one-scheme-per-request loop (batch size 1, one request in flight)
+with the batched pipeline, then interrupts a build halfway and resumes it.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient  # noqa: E402
+
+STATES = ["Kerala", "Punjab", "Maharashtra", "Bihar", "Assam", ""]
+TAGS = ["Farmer", "Student", "Women", "Loan", "Pension", "Disabled", "Scholarship"]
+AGE_LIMITS = [{}, {"general": {"min_age": 18, "max_age": 60}}, {"general": {"min_age": 60, "max_age": None}}, {"general": {"min_age": None, "max_age": 25}}]
+
+
+def synthetic_schemes(count: int):
+    return [
+        {
+            "id": f"scheme-{i}",
+            "name": f"Synthetic {TAGS[i % len(TAGS)]} Scheme {i}",
+            "shortTitle": f"SYN{i}",
+            "description": f"Financial assistance for {TAGS[i % len(TAGS)].lower()} beneficiaries " * 8,
+            "eligibility": "Resident of the state with annual family income below 2 lakh.",
+            "ageLimits": AGE_LIMITS[i % len(AGE_LIMITS)],
+            "tags": [TAGS[i % len(TAGS)], TAGS[(i * 3) % len(TAGS)]],
+            "category": ["Social welfare & Empowerment"],
+            "state": STATES[i % len(STATES)],
+            "level": "State" if STATES[i % len(STATES)] else "Central",
+            "department": "Department of Social Justice",
+            "beneficiaries": ["Individual"],
+            "applicationProcess": ["Apply online on the portal."],
+            "links": [{"title": "Guidelines", "url": f"https://example.org/{i}"}],
+        }
+        for i in range(count)
+    ]
+
+
+class FlakyEmbeddingClient(HashingEmbeddingClient):
+    """Fails once after `fail_after` requests to simulate a crash mid-build."""
+
+    def __init__(self, fail_after: int, **kwargs):
+        super().__init__(**kwargs)
+        self.fail_after = fail_after
+
+    async def embed(self, texts):
+        if self.fail_after is not None and self.requests >= self.fail_after:
+            self.fail_after = None
+            raise RuntimeError("simulated embedding outage")
+        return await super().embed(texts)
+
+
+async def timed_build(schemes, client, **kwargs):
+    start = time.perf_counter()
+    await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=client, **kwargs)
+    return time.perf_counter() - start
+
+
+async def main(args):
+    schemes = synthetic_schemes(args.schemes)
+
+    sequential = HashingEmbeddingClient(latency=args.latency)
+    seq_time = await timed_build(schemes, sequential, batch_size=1, concurrency=1)
+
+    batched = HashingEmbeddingClient(latency=args.latency)
+    batch_time = await timed_build(schemes, batched, batch_size=args.batch_size, concurrency=args.concurrency)
+
+    batches = -(-len(schemes) // args.batch_size)
+    flaky = FlakyEmbeddingClient(fail_after=max(1, batches // 2), latency=args.latency)
+    try:
+        await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=flaky, batch_size=args.batch_size, concurrency=1)
+    except RuntimeError:
+        pass
+    partial = embedding_search.get_chroma_client().get_collection(embedding_search._read_json(embedding_search.CHECKPOINT_PATH)["collection"]).count()
+    resumed = HashingEmbeddingClient(latency=args.latency)
+    await embedding_search.index_schemes(schemes, embedding_client=resumed, batch_size=args.batch_size, concurrency=1)
+
+    print()
+    print(f"schemes indexed            : {len(schemes)}")
+    print(f"sequential                 : {seq_time:8.2f}s  {sequential.requests} embedding requests")
+    print(f"batched (b={args.batch_size}, c={args.concurrency})     : {batch_time:8.2f}s  {batched.requests} embedding requests")
+    print(f"speedup                    : {seq_time / batch_time:8.1f}x")
+    print(f"resume after crash         : {partial} stored before crash, {resumed.requests} requests to finish")
+    print(f"serving collection count   : {embedding_search.get_collection().count()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="simulated seconds per embedding request")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""
+BM25 lexical index benchmark: build, load and per-query latency, plus hybrid fusion.
+
+    cd backend && python -m benchmarks.bench_lexical --schemes 3600
+
+Keyword queries such as a scheme short title should be answered from BM25 alone,
+without an embedding request.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.bench_indexing import synthetic_schemes
+from core import embedding_search
+from core.embeddings import HashingEmbeddingClient, set_embedding_client
+from core.lexical_index import BM25Index
+from core.settings import settings
+
+QUERIES = [
+    "SYN42",
+    "synthetic pension scheme 117",
+    "scholarship for disabled students in Kerala",
+    "I want a loan for dairy business. in Madhya Pradesh. I am 32 years old and my income is below 2 lakh",
+    "financial assistance for women farmers",
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def main(args):
+    embedder = HashingEmbeddingClient()
+    set_embedding_client(embedder)
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=embedder)
+
+    path = os.path.join(embedding_search.LEXICAL_DIR, f"{embedding_search.get_active_index()['version']}.pkl")
+    start = time.perf_counter()
+    lexical = BM25Index.load(path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    print()
+    print(f"{len(lexical.ids)} documents, {len(lexical.postings)} terms, {os.path.getsize(path) / 1e6:.1f} MB on disk, load {load_ms:.1f}ms")
+    print(f"{'query':60}{'p50 ms':>9}{'p99 ms':>9}  embedding skipped")
+    for query in QUERIES:
+        latencies = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            hits = lexical.search(query, 25)
+            latencies.append((time.perf_counter() - start) * 1000)
+        skipped = lexical.is_confident(query, hits, settings.LEXICAL_SKIP_MAX_TERMS, settings.LEXICAL_SKIP_MARGIN)
+        print(f"{query[:58]:60}{statistics.median(latencies):9.3f}{percentile(latencies, 0.99):9.3f}  {skipped}")
+
+    embedder.requests = 0
+    start = time.perf_counter()
+    for query in QUERIES:
+        await embedding_search.query_schemes(query, top_k=25)
+    hybrid_ms = (time.perf_counter() - start) * 1000 / len(QUERIES)
+    print(f"hybrid query_schemes: {hybrid_ms:.2f}ms per query, {embedder.requests} embedding requests for {len(QUERIES)} queries")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=3600)
+    parser.add_argument("--repeat", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
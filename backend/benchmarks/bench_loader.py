@@ -0,0 +1,89 @@
+"""
+Scheme-detail loading: the serial load_all_scheme_details vs the parallel ingestion into the
+JSON Lines scheme store, and loading from that store.
+
+    cd backend && python -m benchmarks.bench_loader --workers 4
+
+Every measurement runs in a fresh process so peak RSS (ru_maxrss) is its own; ingestion
+also reports the peak of its worker processes.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+LOOKUP_ID = "pmmy"
+
+
+def peak_mb(who=resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+def measure(name: str, store_path: str, workers: int) -> dict:
+    os.environ["SCHEME_STORE_PATH"] = store_path
+    from service import reindex
+    from core.scheme_store import SchemeStore
+
+    if not os.path.exists(reindex.SCHEMES_JSON_PATH):
+        reindex.SCHEMES_AGE_LIMITS = {}
+
+    baseline = peak_mb()
+    start = time.perf_counter()
+    if name == "old loader":
+        count = len(reindex.load_all_scheme_details())
+    elif name == "ingest":
+        count = reindex.build_scheme_store(store_path, workers=workers)["schemes"]
+    elif name == "store: all":
+        store = SchemeStore(store_path)
+        count = len(store.all())
+    else:
+        store = SchemeStore(store_path)
+        count = int(store.get(LOOKUP_ID) is not None)
+    seconds = time.perf_counter() - start
+
+    return {
+        "name": name,
+        "seconds": seconds,
+        "records": count,
+        "peak_mb": peak_mb(),
+        "import_mb": baseline,
+        "workers_peak_mb": peak_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def main(args):
+    store_path = os.path.join(tempfile.mkdtemp(prefix="bench_store_"), "schemes.jsonl")
+    rows = []
+    for name in ("old loader", "ingest", "store: all", f"store: get {LOOKUP_ID}"):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_loader", "--measure", name, "--store", store_path, "--workers", str(args.workers)],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True,
+        ).stdout
+        rows.append(json.loads(output.strip().splitlines()[-1]))
+
+    print()
+    print(f"store {os.path.getsize(store_path) / 1e6:.1f} MB, {args.workers} workers, {os.cpu_count()} CPUs")
+    print(f"{'':18}{'wall ms':>10}{'records':>9}{'peak MB':>9}{'after import':>14}{'workers peak':>14}")
+    for row in rows:
+        workers = f"{row['workers_peak_mb']:14.0f}" if row["workers_peak_mb"] else f"{'-':>14}"
+        print(f"{row['name']:18}{row['seconds'] * 1000:10.1f}{row['records']:9}{row['peak_mb']:9.0f}{row['import_mb']:14.0f}{workers}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--measure")
+    parser.add_argument("--store")
+    args = parser.parse_args()
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.store, args.workers)))
+    else:
+        main(args)
@@ -0,0 +1,136 @@
+"""
+What the observability layer reports for /recommend and /recommend/stream, and what it costs.
+
+    cd backend && python -m benchmarks.bench_metrics --latency 0.1 --token-delay 0.005
+
+Runs the recorded conversations through both entry points under `track_request`, the same
+wrapper the endpoints use, against the fake model, then prints the per-stage breakdown and
+token counts read back from the `/metrics` exposition. Also times the per-request recording
+and a /metrics render, and runs the turns again with every request profiled.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+os.environ.setdefault("PROFILE_DIR", tempfile.mkdtemp(prefix="bench_profiles_"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_default_openai_api, set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from benchmarks.fixtures import load_conversations  # noqa: E402
+from core import embedding_search, metrics  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, close_embedding_client  # noqa: E402
+from core.settings import settings  # noqa: E402
+from core.timing import StageTimer  # noqa: E402
+from service.recommendation import get_scheme_response, stream_scheme_response  # noqa: E402
+
+_SERIES_RE = re.compile(r'^(\w+)\{(.*)\} (\S+)$')
+
+
+def scrape(text: str):
+    """{(metric name, sorted label pairs): value} from a Prometheus exposition."""
+    samples = {}
+    for line in text.splitlines():
+        match = _SERIES_RE.match(line)
+        if match:
+            labels = tuple(sorted(re.findall(r'(\w+)="([^"]*)"', match.group(2))))
+            samples[(match.group(1), labels)] = float(match.group(3))
+    return samples
+
+
+async def run_turns(conversations):
+    latencies = []
+    for history, current_input in conversations:
+        start = time.perf_counter()
+        with metrics.track_request("recommend") as timer:
+            await get_scheme_response(history, current_input, timer=timer)
+        with metrics.track_request("recommend_stream") as timer:
+            async for _ in stream_scheme_response(history, current_input, timer=timer):
+                pass
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    set_default_openai_api("chat_completions")
+    set_tracing_disabled(True)
+
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+    conversations = [(c["conversation_history"], c["current_input"]) for c in load_conversations()]
+
+    fake_api = start_server(PORT, args.latency, args.token_delay)
+    try:
+        plain = await run_turns(conversations)
+        exposition = metrics.render_metrics()
+
+        settings.PROFILE_SAMPLE_RATE = 1.0
+        profiled = await run_turns(conversations)
+        settings.PROFILE_SAMPLE_RATE = 0.0
+    finally:
+        fake_api.terminate()
+        await close_embedding_client()
+
+    # Cost of recording one request and of one scrape
+    timer = StageTimer()
+    for stage in ("combine", "retrieval", "embed", "query", "lexical", "summarize", "decision", "recommendation", "parse", "map"):
+        timer.stages[stage] = 12.5
+    timer.tokens = {"decision": {"prompt": 900, "completion": 40, "requests": 1}, "recommendation": {"prompt": 2500, "completion": 300, "requests": 1}}
+    timer.info = {"candidates": 25, "results": 10, "cache": "miss", "retrieval": "search", "outcome": "recommendation"}
+    settings.TRACE_LOG = True
+    rounds = 2000
+    start = time.perf_counter()
+    for _ in range(rounds):
+        metrics.observe_request("bench", timer, "recommendation")
+    observe_us = (time.perf_counter() - start) / rounds * 1e6
+    start = time.perf_counter()
+    for _ in range(100):
+        metrics.render_metrics()
+    render_ms = (time.perf_counter() - start) / 100 * 1000
+
+    samples = scrape(exposition)
+    print()
+    print(f"{len(conversations)} conversations per endpoint, model latency {args.latency * 1000:.0f}ms")
+    print(f"{'mean ms per stage':28}{'recommend':>11}{'stream':>9}")
+    stages = sorted({dict(labels)["stage"] for name, labels in samples if name == "yojana_stage_seconds_sum"})
+    for stage in stages:
+        row = []
+        for endpoint in ("recommend", "recommend_stream"):
+            labels = (("endpoint", endpoint), ("stage", stage))
+            total, count = samples.get(("yojana_stage_seconds_sum", labels)), samples.get(("yojana_stage_seconds_count", labels))
+            row.append(f"{total / count * 1000:.1f}" if count else "-")
+        print(f"{stage:28}{row[0]:>11}{row[1]:>9}")
+    for (name, labels), value in sorted(samples.items()):
+        if name == "yojana_llm_tokens_total":
+            labels = dict(labels)
+            print(f"{labels['agent']} {labels['kind']} tokens: {value:.0f}")
+    for (name, labels), value in sorted(samples.items()):
+        if name == "yojana_response_cache_lookups_total":
+            print(f"response cache {dict(labels)['result']}: {value:.0f}")
+    print(f"recording one request: {observe_us:.1f}us (trace line included); /metrics render: {render_ms:.2f}ms, {len(exposition.splitlines())} lines")
+    profiles = os.listdir(settings.PROFILE_DIR)
+    print(
+        f"mean ms per conversation (both endpoints): {statistics.mean(plain):.0f} unprofiled, "
+        f"{statistics.mean(profiled):.0f} with every request profiled ({len(profiles)} profiles in {settings.PROFILE_DIR})"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    asyncio.run(main(parser.parse_args()))
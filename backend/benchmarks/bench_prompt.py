@@ -0,0 +1,96 @@
+"""
+Recommendation prompt size: indented-JSON summaries vs token-budgeted compact rows.
+
+    cd backend && python -m benchmarks.bench_prompt --top-k 25
+
+Replays the recorded conversations against the real scheme data (BM25 retrieval, no
+network) and measures prompt tokens and prompt build time for both formats.
+"""
+import argparse
+import json
+import statistics
+import time
+
+from benchmarks.fixtures import load_conversations, load_real_schemes
+from core.embedding_search import lexical_text
+from core.lexical_index import BM25Index
+from core.prompts import build_prompt, count_tokens, tokenizer_name
+from core.utils import combine_conversation, prepare_scheme_for_metadata
+
+
+def legacy_summarize_scheme(scheme):
+    """The per-request summary used before prompt rows were precomputed."""
+    def safe(val, fallback="N/A"):
+        return val if val else fallback
+
+    def short(text, limit=100):
+        return text[:limit].strip() + ("..." if len(text) > limit else "")
+
+    summary = (
+        f"Id: {scheme.get('id')} "
+        f"{scheme.get('name', 'Unnamed Scheme')} "
+        f"is a {safe(scheme.get('benefitType'), 'benefit')} scheme by the "
+        f"{safe(scheme.get('department'), 'concerned department')} in {safe(scheme.get('state'), 'India')}.\n"
+        f"Target group: {', '.join(scheme.get('beneficiaries', [])) if isinstance(scheme.get('beneficiaries'), list) else safe(scheme.get('beneficiaries'))}.\n"
+        f"Eligibility: {short(scheme.get('eligibility', 'N/A'), 150)}\n"
+        f"Purpose: {short(scheme.get('description') or scheme.get('purpose'), 200)}\n"
+        f"Benefit Amount: {safe(scheme.get('amount_range')) or safe(scheme.get('benefits'), 'N/A')}"
+    )
+    return {"name": scheme.get("name", "Unnamed Scheme"), "summary": summary}
+
+
+def legacy_build_prompt(query, schemes):
+    return f"""
+You are a helpful AI that recommends government schemes.
+
+Conversation Context: \"{query}\"
+
+Available Schemes:
+{json.dumps(schemes, indent=2)}
+
+Only return valid JSON, no extra commentary.
+"""
+
+
+def main(args):
+    schemes = load_real_schemes()
+    metadatas = [prepare_scheme_for_metadata(s) for s in schemes]
+    lexical = BM25Index.build([m["id"] for m in metadatas], [lexical_text(s) for s in schemes])
+
+    rows = []
+    for conversation in load_conversations():
+        query = combine_conversation(conversation["conversation_history"], conversation["current_input"])
+        matched = [metadatas[row] for row, _ in lexical.search(query, args.top_k)]
+
+        start = time.perf_counter()
+        legacy = legacy_build_prompt(query, [legacy_summarize_scheme(m) for m in matched])
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        compact, stats = build_prompt(query, [m["promptRow"] for m in matched], args.budget)
+        compact_ms = (time.perf_counter() - start) * 1000
+
+        rows.append({
+            "legacy_tokens": count_tokens(legacy),
+            "compact_tokens": stats["prompt_tokens"],
+            "included": stats["schemes_included"],
+            "candidates": len(matched),
+            "legacy_ms": legacy_ms,
+            "compact_ms": compact_ms,
+        })
+
+    legacy_tokens = statistics.mean(r["legacy_tokens"] for r in rows)
+    compact_tokens = statistics.mean(r["compact_tokens"] for r in rows)
+    print()
+    print(f"{len(rows)} conversations, {len(schemes)} schemes, top_k={args.top_k}, budget={args.budget}, tokenizer={tokenizer_name()}")
+    print(f"indented JSON prompt : {legacy_tokens:7.0f} tokens, build {statistics.mean(r['legacy_ms'] for r in rows):.2f}ms")
+    print(f"compact rows prompt  : {compact_tokens:7.0f} tokens, build {statistics.mean(r['compact_ms'] for r in rows):.2f}ms "
+          f"({statistics.mean(r['included'] for r in rows):.1f}/{statistics.mean(r['candidates'] for r in rows):.1f} schemes fit)")
+    print(f"token reduction      : {100 * (1 - compact_tokens / legacy_tokens):.0f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--budget", type=int, default=3000)
+    main(parser.parse_args())
@@ -0,0 +1,153 @@
+"""
+Rate-limit overhead per request: fastapi-limiter's two Redis script calls vs the in-process
+TieredRateLimiter with batched Redis sync, against a local Redis stand-in.
+
+    cd backend && python -m benchmarks.bench_rate_limit --redis-latency 0.002 --concurrency 50
+
+Each request applies the /recommend rules (5 per minute and 50 per day, scaled up so the
+load is not denied). Also measures global enforcement with several limiter instances (one
+per simulated worker process) sharing one Redis, and behaviour with Redis unreachable.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as redis  # noqa: E402
+
+from benchmarks.fake_redis_server import start_server  # noqa: E402
+from core.rate_limit import TieredRateLimiter  # noqa: E402
+
+PORT = int(os.getenv("FAKE_REDIS_PORT", "6390"))
+DEAD_PORT = PORT + 1
+SCALE = 1000
+RULES = [(5 * SCALE, 60), (50 * SCALE, 86400)]
+
+# fastapi-limiter 0.1.x's script; the stand-in runs it natively
+LIMITER_LUA = """local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local expire_time = ARGV[2]
+local current = tonumber(redis.call('get', key) or "0")
+if current > 0 then
+ if current + 1 > limit then
+ return redis.call("PTTL",key)
+ else
+        redis.call("INCR", key)
+ return 0
+ end
+else
+    redis.call("SET", key, 1,"px",expire_time)
+ return 0
+end"""
+
+
+def legacy_check(conn, sha):
+    async def check(user: str) -> bool:
+        allowed = True
+        for dep_index, (times, seconds) in enumerate(RULES):
+            pexpire = await conn.evalsha(sha, 1, f"fastapi-limiter:127.0.0.1:/recommend:0:{dep_index}:{user}", str(times), str(seconds * 1000))
+            allowed = allowed and pexpire == 0
+        return allowed
+    return check
+
+
+def tiered_check(limiter: TieredRateLimiter):
+    async def check(user: str) -> bool:
+        allowed = True
+        for times, seconds in RULES:
+            allowed = allowed and not await limiter.hit(f"{user}:/recommend", times, seconds)
+        return allowed
+    return check
+
+
+async def load(check, users: int, requests: int, concurrency: int):
+    latencies = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for i in counter:
+            start = time.perf_counter()
+            await check(f"user-{i % users}")
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return sorted(latencies), time.perf_counter() - start
+
+
+async def enforcement(workers: int, limit: int, attempts: int, sync_batch: int) -> int:
+    """Requests admitted for one user across `workers` limiters sharing Redis, out of `attempts`."""
+    limiters = [TieredRateLimiter(redis.from_url(f"redis://127.0.0.1:{PORT}", protocol=2), sync_interval=0.05, sync_batch=sync_batch) for _ in range(workers)]
+    for limiter in limiters:
+        await limiter.start()
+    admitted = 0
+    for i in range(attempts):
+        limiter = limiters[i % workers]
+        admitted += not await limiter.hit(f"enforce-{workers}-{sync_batch}", limit, 60)
+        await asyncio.sleep(0.001)
+    for limiter in limiters:
+        await limiter.close()
+        await limiter.redis.aclose()
+    return admitted
+
+
+async def main(args):
+    server = start_server(PORT, args.redis_latency)
+    results = {}
+    try:
+        conn = redis.from_url(f"redis://127.0.0.1:{PORT}", protocol=2)
+        sha = await conn.script_load(LIMITER_LUA)
+        await load(legacy_check(conn, sha), args.users, 50, 5)
+        results["fastapi-limiter"] = await load(legacy_check(conn, sha), args.users, args.requests, args.concurrency)
+
+        limiter = TieredRateLimiter(redis.from_url(f"redis://127.0.0.1:{PORT}", protocol=2))
+        await limiter.start()
+        results["tiered"] = await load(tiered_check(limiter), args.users, args.requests, args.concurrency)
+        await limiter.close()
+        syncs = limiter.syncs
+
+        admitted = {
+            (workers, batch): await enforcement(workers, args.limit, args.limit * 3, batch)
+            for workers in (1, 4) for batch in (1, 5)
+        }
+        await conn.aclose()
+    finally:
+        server.terminate()
+
+    # Nothing listens on DEAD_PORT: Redis is unreachable
+    dead = redis.from_url(f"redis://127.0.0.1:{DEAD_PORT}", socket_connect_timeout=0.05)
+    try:
+        await legacy_check(dead, sha)("user-0")
+        legacy_down = "allowed"
+    except Exception as e:
+        legacy_down = f"fails ({type(e).__name__})"
+    fallback = TieredRateLimiter(dead, sync_batch=1)
+    down_admitted = sum([not await fallback.hit("down", 5, 60) for _ in range(10)])
+
+    print()
+    print(f"{args.users} users, {args.requests} requests, concurrency {args.concurrency}, Redis latency {args.redis_latency * 1000:.1f}ms")
+    print(f"{'':18}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'req/s':>10}")
+    for name, (latencies, seconds) in results.items():
+        print(
+            f"{name:18}{statistics.mean(latencies):9.3f}{latencies[len(latencies) // 2]:9.3f}"
+            f"{latencies[int(len(latencies) * 0.99) - 1]:9.3f}{len(latencies) / seconds:10.0f}"
+        )
+    print(f"tiered: {syncs} Redis syncs for {args.requests * len(RULES)} rule checks")
+    for (workers, batch), count in admitted.items():
+        print(f"limit {args.limit}/min, {workers} worker(s), sync batch {batch}: admitted {count} of {args.limit * 3}"
+              f" (bound {args.limit + workers * batch})")
+    print(f"Redis unreachable: fastapi-limiter {legacy_down}; tiered admits {down_admitted} of 10 under a 5/min limit")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--redis-latency", type=float, default=0.002)
+    parser.add_argument("--limit", type=int, default=40)
+    asyncio.run(main(parser.parse_args()))
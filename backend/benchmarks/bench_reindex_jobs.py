@@ -0,0 +1,139 @@
+"""
+Serving latency while a background reindex job runs, and the switch to its new index.
+
+    cd backend && python -m benchmarks.bench_reindex_jobs --rate 200
+
+Indexes the real scheme data with the offline hashing embedder, then serves searches of the
+recorded conversations in this process (watching the active index as the API workers do) while
+`service.reindex_worker --once` runs a full re-embedding job in a separate process:
+1. no job running (baseline),
+2. the worker at normal priority with no embedding cap,
+3. the worker at REINDEX_NICE priority embedding at most `--rate` texts per second.
+Reports search p50/p99 during each job, the job's progress and ETA as the API reports them,
+and how long after the job finished this process was serving the new version.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+os.environ.setdefault("VECTOR_ENGINE", "numpy")
+os.environ["REINDEX_QUEUE"] = "local"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks.fixtures import load_conversations  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, set_embedding_client  # noqa: E402
+from core.reindex_jobs import TERMINAL, ReindexJobs  # noqa: E402
+from core.settings import settings  # noqa: E402
+from core.utils import combine_conversation  # noqa: E402
+from service import reindex  # noqa: E402
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def serve(queries, stop: asyncio.Event, interval: float):
+    """Searches the queries in turn until `stop`, `interval` apart; latencies in ms."""
+    latencies = []
+    i = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await embedding_search.query_schemes(queries[i % len(queries)], top_k=25)
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(label, queries, args, jobs, env=None):
+    stop = asyncio.Event()
+    serving = asyncio.create_task(serve(queries, stop, args.interval))
+    reload_task = asyncio.create_task(embedding_search.watch_active_index(interval=args.reload_interval))
+    row = {"label": label, "progress": [], "switched_after": None}
+    try:
+        if env is None:
+            await asyncio.sleep(args.baseline)
+        else:
+            before = embedding_search.get_serving_index()["version"]
+            job, _ = await jobs.enqueue(force_reindex=False, incremental=False)
+            worker = subprocess.Popen(
+                [sys.executable, "-m", "service.reindex_worker", "--once"],
+                cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            while True:
+                await asyncio.sleep(args.sample)
+                job = await jobs.get(job["id"])
+                row["progress"].append((job.get("phase"), job.get("processed"), job.get("total"), job.get("eta_seconds"), job.get("throughput")))
+                if job["status"] in TERMINAL:
+                    break
+            finished = time.time()
+            while embedding_search.get_serving_index()["version"] in (before, None):
+                await asyncio.sleep(0.05)
+            row["switched_after"] = time.time() - job["finished"]
+            row["poll_lag"] = time.time() - finished
+            row["job"] = job
+            await asyncio.to_thread(worker.wait)
+    finally:
+        stop.set()
+        row["latencies"] = await serving
+        reload_task.cancel()
+        await asyncio.gather(reload_task, return_exceptions=True)
+    return row
+
+
+async def main(args):
+    logging.disable(logging.WARNING)
+    set_embedding_client(HashingEmbeddingClient())
+    if not os.path.exists(reindex.SCHEMES_JSON_PATH):
+        reindex.SCHEMES_AGE_LIMITS = {}
+    await reindex.reindex_schemes(incremental=False, embedding_client=HashingEmbeddingClient())
+    queries = [combine_conversation(c["conversation_history"], c["current_input"]) for c in load_conversations()]
+    await embedding_search.query_schemes("warm up", top_k=1)
+    jobs = ReindexJobs()
+
+    rows = [
+        await run("no job", queries, args, jobs),
+        await run("nice 0, no cap", queries, args, jobs, env={"REINDEX_NICE": "0", "REINDEX_EMBED_RATE": "0"}),
+        await run(f"nice {settings.REINDEX_NICE}, {args.rate:g}/s", queries, args, jobs, env={"REINDEX_EMBED_RATE": str(args.rate)}),
+    ]
+
+    print()
+    print(f"{len(queries)} queries searched every {args.interval * 1000:.0f}ms, {os.cpu_count()} CPU(s), reload checked every {args.reload_interval}s")
+    print(f"{'':20}{'searches':>9}{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}{'job s':>8}{'throttled s':>12}{'switched s':>11}")
+    for row in rows:
+        ms = row["latencies"]
+        job = row.get("job") or {}
+        switched = f"{row['switched_after']:11.2f}" if row["switched_after"] is not None else f"{'':>11}"
+        print(
+            f"{row['label']:20}{len(ms):9}{statistics.median(ms):9.2f}{percentile(ms, 0.99):9.2f}{max(ms):9.2f}"
+            f"{job.get('seconds', 0.0):8.1f}{job.get('throttled_seconds', 0.0):12.1f}{switched}"
+        )
+    for row in rows[1:]:
+        job = row["job"]
+        print(f"\n{row['label']}: job {job['id']} {job['status']}, version {job.get('version')}, report {job.get('report', {}).get('seconds')}")
+        # Every few samples of GET /admin/reindex
+        samples = row["progress"]
+        for phase, done, total, eta, throughput in samples[::max(1, len(samples) // 8)] + samples[-1:]:
+            print(f"  {phase or '-':10} {done or 0:>5}/{total or '?':<5} {throughput or 0:8.1f}/s  eta {eta if eta is not None else '-'}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rate", type=float, default=settings.REINDEX_EMBED_RATE, help="texts per second the throttled job embeds")
+    parser.add_argument("--interval", type=float, default=0.02, help="seconds between searches")
+    parser.add_argument("--baseline", type=float, default=10.0, help="seconds of searches with no job running")
+    parser.add_argument("--sample", type=float, default=1.0, help="seconds between progress samples")
+    parser.add_argument("--reload-interval", type=float, default=0.5, help="seconds between active-index checks")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,104 @@
+"""
+The recorded conversations through `get_scheme_response` with and without the local reranker.
+
+    cd backend && python -m benchmarks.bench_reranker --agent-latency 1.0 --direct
+
+Indexes the real scheme data (or `--schemes N` synthetic ones) with the offline hashing
+embedder and replays every labelled conversation twice: candidates straight from retrieval to
+the agents, then through the reranker loaded from RERANKER_MODEL. Agents are ScriptedRunner,
+taking `--agent-latency` seconds per run and picking the first ten schemes of their prompt, so
+the order the agents see decides which schemes come back. Reports per turn: agent runs, prompt
+tokens, latency, turns answered without the agents (with `--direct`), candidates sent to the agents, and recall
+of the labelled schemes among the results. The reranker's own time is the "reranker" stage.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ.setdefault("VECTOR_ENGINE", "numpy")
+os.environ["EMBEDDING_BACKEND"] = "hashing"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fixtures import load_conversations, load_real_schemes  # noqa: E402
+from benchmarks.scripted_agents import ScriptedRunner  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, set_embedding_client  # noqa: E402
+from core.reranker import Reranker, set_reranker  # noqa: E402
+from core.settings import settings  # noqa: E402
+from core.timing import StageTimer  # noqa: E402
+from service import recommendation  # noqa: E402
+
+
+async def replay(conversations, reranker):
+    set_reranker(reranker)
+    runner = ScriptedRunner(latency=recommendation.Runner.latency)
+    recommendation.Runner = runner
+    turns = []
+    for conversation in conversations:
+        timer = StageTimer()
+        response = await recommendation.get_scheme_response(conversation["conversation_history"], conversation["current_input"], timer=timer)
+        expected = set(conversation["expected_ids"])
+        returned = {scheme.get("id") for scheme in response.get("results") or []}
+        turns.append({
+            "ms": timer.elapsed(),
+            "prompt_tokens": sum(agent["prompt"] for agent in timer.tokens.values()),
+            "direct": timer.info.get("rerank") == "direct",
+            "followup": "followup_needed" in response,
+            "to_agents": timer.info.get("kept", timer.info.get("candidates", 0)),
+            "recall": len(expected & returned) / len(expected),
+            "reranker_ms": timer.stages.get("reranker", 0.0),
+        })
+    return runner.runs, turns
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    set_tracing_disabled(True)
+    set_embedding_client(HashingEmbeddingClient())
+    # Each turn's agents should run, not come from an identical earlier one
+    settings.SINGLE_FLIGHT = False
+    settings.RERANK_DIRECT = args.direct
+    recommendation.Runner = ScriptedRunner(latency=args.agent_latency)
+
+    schemes = synthetic_schemes(args.schemes) if args.schemes else load_real_schemes()
+    await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=HashingEmbeddingClient())
+    conversations = [c for c in load_conversations() if c.get("expected_ids")]
+    await embedding_search.query_schemes("warm up", top_k=1)
+
+    reranker = Reranker.load()
+    rows = {}
+    for label, model in (("retrieval order", None), ("reranked", reranker)):
+        runs, turns = await replay(conversations, model)
+        rows[label] = (runs, turns)
+
+    print()
+    print(f"{len(conversations)} conversations, {len(schemes)} schemes, scripted agents {args.agent_latency * 1000:.0f}ms per run, model {settings.RERANKER_MODEL}")
+    print(f"{'':18}{'agent runs':>11}{'prompt tok':>11}{'p50 ms':>9}{'mean ms':>9}{'direct':>8}{'follow-up':>10}{'to agents':>10}{'recall':>8}")
+    for label, (runs, turns) in rows.items():
+        ms = [t["ms"] for t in turns]
+        print(
+            f"{label:18}{runs / len(turns):11.2f}{statistics.mean(t['prompt_tokens'] for t in turns):11.0f}"
+            f"{statistics.median(ms):9.0f}{statistics.mean(ms):9.0f}{sum(t['direct'] for t in turns):8}"
+            f"{sum(t['followup'] for t in turns):10}{statistics.mean(t['to_agents'] for t in turns):10.1f}"
+            f"{statistics.mean(t['recall'] for t in turns):8.3f}"
+        )
+    reranker_ms = sorted(t["reranker_ms"] for t in rows["reranked"][1])
+    print(f"reranker stage per turn: p50 {reranker_ms[len(reranker_ms) // 2]:.2f}ms, max {reranker_ms[-1]:.2f}ms; {reranker.stats()}")
+    print("recall counts a follow-up question's preview schemes as its results")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=0, help="synthetic schemes to index instead of the real data")
+    parser.add_argument("--agent-latency", type=float, default=1.0, help="seconds each scripted agent run takes")
+    parser.add_argument("--direct", action="store_true", help="answer clear winners without the agents (RERANK_DIRECT)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,121 @@
+"""
+Whole-turn response cache: hit rate and latency saved on repeated and reworded conversations.
+
+    cd backend && python -m benchmarks.bench_response_cache --latency 0.3 --threshold 0.95
+
+Every recorded conversation is sent three times: as recorded, as an exact repeat that only
+differs in case, spacing and punctuation, and reworded (a filler phrase added). The reworded
+turns are also answered without the cache, to check near hits return the same schemes.
+A reindex at the end must turn every repeat into a miss.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_default_openai_api, set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from benchmarks.fixtures import load_conversations  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embedding_cache import CachedEmbeddingClient  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, close_embedding_client, create_embedding_client, set_embedding_client  # noqa: E402
+from core.response_cache import ResponseCache, set_response_cache  # noqa: E402
+from service.recommendation import get_scheme_response  # noqa: E402
+
+
+def exact_variant(history, current_input):
+    turns = [turn.upper().replace(" ", "  ") for turn in history]
+    return (turns, f"{current_input.upper()}!") if current_input else (turns[:-1] + [f"{turns[-1]}!"], "")
+
+
+def reworded_variant(history, current_input):
+    return history, f"{current_input} please suggest".strip()
+
+
+def ids(response):
+    return {scheme["id"] for scheme in response["results"]}
+
+
+async def timed_turn(history, current_input):
+    start = time.perf_counter()
+    response = await get_scheme_response(history, current_input)
+    return (time.perf_counter() - start) * 1000, response
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    set_default_openai_api("chat_completions")
+    set_tracing_disabled(True)
+
+    schemes = synthetic_schemes(args.schemes)
+    await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=HashingEmbeddingClient())
+    conversations = [(c["conversation_history"], c["current_input"]) for c in load_conversations()]
+
+    fake_api = start_server(PORT, args.latency, args.token_delay)
+    set_embedding_client(CachedEmbeddingClient(create_embedding_client()))
+    try:
+        set_response_cache(None)
+        uncached = [await timed_turn(*reworded_variant(*c)) for c in conversations]
+
+        cache = ResponseCache(threshold=args.threshold, min_overlap=args.min_overlap)
+        set_response_cache(cache)
+        rows = {"first": [], "exact repeat": [], "reworded": []}
+        agreement = []
+        for conversation, (_, fresh) in zip(conversations, uncached):
+            rows["first"].append((await timed_turn(*conversation))[0])
+            rows["exact repeat"].append((await timed_turn(*exact_variant(*conversation)))[0])
+            near_hits = cache.near_hits
+            ms, response = await timed_turn(*reworded_variant(*conversation))
+            rows["reworded"].append(ms)
+            if cache.near_hits > near_hits and ids(fresh):
+                agreement.append(len(ids(response) & ids(fresh)) / len(ids(response) | ids(fresh)))
+        stats = cache.stats()
+
+        # A new index version must not serve anything cached for the previous one
+        await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=HashingEmbeddingClient())
+        hits = cache.exact_hits + cache.near_hits
+        for conversation in conversations:
+            await get_scheme_response(*exact_variant(*conversation))
+        stale_hits = cache.exact_hits + cache.near_hits - hits
+    finally:
+        set_response_cache(None)
+        fake_api.terminate()
+        await close_embedding_client()
+
+    print()
+    print(f"{len(conversations)} conversations x 3 turns, model latency {args.latency * 1000:.0f}ms,"
+          f" threshold {args.threshold}, min overlap {args.min_overlap}")
+    print(f"{'median ms':16}{'turn':>10}")
+    print(f"{'no cache':16}{statistics.median(ms for ms, _ in uncached):10.1f}")
+    for name, timings in rows.items():
+        print(f"{name:16}{statistics.median(timings):10.1f}")
+    print(f"exact hits {stats['exact_hits']}, near hits {stats['near_hits']}, misses {stats['misses']},"
+          f" hit rate {stats['hit_rate']:.0%}, latency saved {stats['latency_saved_ms'] / 1000:.1f}s")
+    if agreement:
+        print(f"near hits vs fresh answers: {statistics.mean(agreement):.2f} mean Jaccard over {len(agreement)} hits")
+    print(f"hits after reindex: {stale_hits} (expected 0)")
+    if stale_hits:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--threshold", type=float, default=0.95)
+    parser.add_argument("--min-overlap", type=float, default=0.8)
+    asyncio.run(main(parser.parse_args()))
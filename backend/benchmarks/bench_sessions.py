@@ -0,0 +1,134 @@
+"""
+Multi-turn conversations with and without server-side sessions.
+
+    cd backend && python -m benchmarks.bench_sessions --latency 0.3 --embedding-latency 0.05
+
+Each recorded conversation is replayed turn by turn against the real scheme data, once
+stateless (the client resends the whole history and retrieval searches every scheme) and
+once with a conversation_id (the client sends only the new message and follow-ups re-rank
+the stored candidate pool). Reports request payload size, tokens sent to the embeddings API,
+retrieval and turn latency per follow-up, and recall@25 of the final turn.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_default_openai_api, set_tracing_disabled  # noqa: E402
+
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from benchmarks.fixtures import load_conversations, load_real_schemes  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embedding_cache import CachedEmbeddingClient  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, set_embedding_client  # noqa: E402
+from core.prompts import count_tokens  # noqa: E402
+from core.session_store import SessionStore, set_session_store  # noqa: E402
+from core.timing import StageTimer  # noqa: E402
+from service import recommendation  # noqa: E402
+
+
+class CountingEmbeddingClient(HashingEmbeddingClient):
+    """Offline embedder that counts the tokens it is asked to embed."""
+
+    def __init__(self, latency: float):
+        super().__init__(latency=latency)
+        self.tokens = 0
+
+    async def embed(self, texts):
+        self.tokens += sum(count_tokens(text) for text in texts)
+        return await super().embed(texts)
+
+
+def recall(matched_ids, expected_ids):
+    return len(set(matched_ids) & set(expected_ids)) / len(expected_ids) if expected_ids else 0.0
+
+
+async def replay(conversation, embedder, use_session):
+    """Per follow-up turn: payload bytes, embedded tokens, retrieval ms and turn ms; plus final-turn recall."""
+    turns = conversation["conversation_history"] + ([conversation["current_input"]] if conversation["current_input"] else [])
+    key = f"bench:{conversation['id']}" if use_session else None
+    rows = []
+    matched_ids = []
+    for i, turn in enumerate(turns):
+        history = [] if use_session else turns[:i]
+        payload = {"conversation_history": history, "current_input": turn}
+        if use_session:
+            payload["conversation_id"] = conversation["id"]
+
+        tokens = embedder.tokens
+        timer = StageTimer()
+        retrieve = recommendation.retrieve_candidates
+
+        async def recording_retrieve(*args):
+            result = await retrieve(*args)
+            matched_ids[:] = [scheme.get("id") for scheme in result[0]]
+            return result
+
+        recommendation.retrieve_candidates = recording_retrieve
+        try:
+            await recommendation.get_scheme_response(history, turn, timer=timer, session_key=key)
+        finally:
+            recommendation.retrieve_candidates = retrieve
+        if i:
+            summary = timer.summary()
+            rows.append({
+                "payload": len(json.dumps(payload).encode("utf-8")),
+                "tokens": embedder.tokens - tokens,
+                "retrieval": summary["retrieval"],
+                "total": summary["total"],
+            })
+    return rows, recall(matched_ids, conversation.get("expected_ids"))
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    set_default_openai_api("chat_completions")
+    set_tracing_disabled(True)
+
+    await embedding_search.index_schemes(load_real_schemes(), force_reindex=True, embedding_client=HashingEmbeddingClient())
+    conversations = [c for c in load_conversations() if len(c["conversation_history"]) + bool(c["current_input"]) > 1]
+
+    fake_api = start_server(PORT, args.latency, args.token_delay)
+    results = {}
+    try:
+        for mode, use_session in (("stateless", False), ("session", True)):
+            embedder = CountingEmbeddingClient(args.embedding_latency)
+            set_embedding_client(CachedEmbeddingClient(embedder))
+            set_session_store(SessionStore() if use_session else None)
+            replays = [await replay(c, embedder, use_session) for c in conversations]
+            results[mode] = ([row for rows, _ in replays for row in rows], [r for _, r in replays])
+    finally:
+        set_session_store(None)
+        fake_api.terminate()
+
+    print()
+    print(f"{len(conversations)} multi-turn conversations, {len(results['stateless'][0])} follow-up turns,"
+          f" model latency {args.latency * 1000:.0f}ms, embedding latency {args.embedding_latency * 1000:.0f}ms")
+    print(f"{'per follow-up':14}{'payload B':>11}{'emb tokens':>12}{'retrieval ms':>14}{'turn ms':>10}{'recall@25':>11}")
+    for mode, (rows, recalls) in results.items():
+        print(
+            f"{mode:14}"
+            f"{statistics.mean(r['payload'] for r in rows):11.0f}"
+            f"{statistics.mean(r['tokens'] for r in rows):12.1f}"
+            f"{statistics.median(r['retrieval'] for r in rows):14.1f}"
+            f"{statistics.median(r['total'] for r in rows):10.0f}"
+            f"{statistics.mean(recalls):11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--embedding-latency", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,153 @@
+"""
+Request coalescing under a burst of identical requests, with slow fake backends.
+
+    cd backend && python -m benchmarks.bench_single_flight --burst 50 --workers 4
+
+1. One worker: `--burst` concurrent get_scheme_response calls for the same question (with
+   differing case and spacing), with single-flight off and on. The embedder and the scripted
+   agents are slow and count their calls.
+2. Several workers: `--workers` SingleFlight groups (one per simulated uvicorn worker) share a
+   local Redis stand-in. The burst is spread across them and each request runs a slow backend
+   call through its worker's group: no coalescing, in-worker only, and with the Redis lock.
+   Also checks that followers take over when the leader fails.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as redis  # noqa: E402
+from agents import set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_redis_server import start_server  # noqa: E402
+from benchmarks.scripted_agents import ScriptedRunner  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embedding_cache import CachedEmbeddingClient  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, set_embedding_client  # noqa: E402
+from core.settings import settings  # noqa: E402
+from core.single_flight import SingleFlight, set_single_flight  # noqa: E402
+from core.timing import StageTimer  # noqa: E402
+from service import recommendation  # noqa: E402
+
+PORT = int(os.getenv("FAKE_REDIS_PORT", "6392"))
+QUESTION = "I am a 45 year old woman farmer from Kerala looking for a pension"
+VARIANTS = [QUESTION, QUESTION.upper(), "  " + QUESTION.replace(" ", "  "), QUESTION + "."]
+
+
+async def burst_turns(burst: int, coalesce: bool, args):
+    """Embedding requests, agent runs, latencies and coalesced count for one burst through get_scheme_response."""
+    embedder = HashingEmbeddingClient(latency=args.embedding_latency)
+    set_embedding_client(CachedEmbeddingClient(embedder))
+    runner = recommendation.Runner = ScriptedRunner(latency=args.agent_latency)
+    settings.SINGLE_FLIGHT = coalesce
+    set_single_flight(SingleFlight() if coalesce else None)
+
+    async def turn(i):
+        timer = StageTimer()
+        start = time.perf_counter()
+        response = await recommendation.get_scheme_response([VARIANTS[i % len(VARIANTS)]], "", timer=timer)
+        return (time.perf_counter() - start) * 1000, "coalesced" in timer.info, response
+
+    results = await asyncio.gather(*(turn(i) for i in range(burst)))
+    set_single_flight(None)
+    responses = {str(response) for _, _, response in results}
+    return {
+        "embeds": embedder.requests,
+        "runs": runner.runs,
+        "p50": statistics.median(ms for ms, _, _ in results),
+        "max": max(ms for ms, _, _ in results),
+        "coalesced": sum(shared for _, shared, _ in results),
+        "distinct": len(responses),
+    }
+
+
+async def burst_workers(burst: int, workers: int, mode: str, args, fail_leader: bool = False):
+    """Backend calls and latencies when `burst` identical requests are spread over `workers` groups."""
+    calls = 0
+    failed = False
+
+    async def backend():
+        nonlocal calls, failed
+        calls += 1
+        await asyncio.sleep(args.agent_latency)
+        if fail_leader and not failed:
+            failed = True
+            raise RuntimeError("leader failed")
+        return {"message": "ok", "results": [{"id": "scheme-1"}]}
+
+    conns = []
+    groups = []
+    for _ in range(workers):
+        if mode == "redis":
+            conns.append(redis.from_url(f"redis://127.0.0.1:{PORT}", protocol=2))
+        groups.append(SingleFlight(conns[-1] if mode == "redis" else None, lock_ttl=5, poll_interval=0.02))
+
+    async def request(i):
+        start = time.perf_counter()
+        try:
+            if mode == "off":
+                await backend()
+            else:
+                await groups[i % workers].do(f"bench-{mode}-{fail_leader}", backend)
+            ok = True
+        except RuntimeError:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    results = await asyncio.gather(*(request(i) for i in range(burst)))
+    for conn in conns:
+        await conn.aclose()
+    return {
+        "calls": calls,
+        "p50": statistics.median(ms for ms, _ in results),
+        "max": max(ms for ms, _ in results),
+        "failed": sum(not ok for _, ok in results),
+    }
+
+
+async def main(args):
+    logging.disable(logging.WARNING)
+    set_tracing_disabled(True)
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+
+    turns = {mode: await burst_turns(args.burst, mode == "on", args) for mode in ("off", "on")}
+
+    server = start_server(PORT, args.redis_latency)
+    try:
+        workers = {mode: await burst_workers(args.burst, args.workers, mode, args) for mode in ("off", "local", "redis")}
+        leader_failure = await burst_workers(args.burst, args.workers, "redis", args, fail_leader=True)
+    finally:
+        server.terminate()
+
+    print()
+    print(f"burst of {args.burst} identical turns, embedding {args.embedding_latency * 1000:.0f}ms, agent run {args.agent_latency * 1000:.0f}ms")
+    print(f"{'single-flight':14}{'embeds':>8}{'agent runs':>12}{'p50 ms':>9}{'max ms':>9}{'coalesced':>11}{'responses':>11}")
+    for mode, r in turns.items():
+        print(f"{mode:14}{r['embeds']:8}{r['runs']:12}{r['p50']:9.0f}{r['max']:9.0f}{r['coalesced']:11}{r['distinct']:11}")
+    print()
+    print(f"burst of {args.burst} over {args.workers} workers, backend call {args.agent_latency * 1000:.0f}ms, Redis latency {args.redis_latency * 1000:.1f}ms")
+    print(f"{'coalescing':14}{'calls':>8}{'p50 ms':>9}{'max ms':>9}")
+    for mode, r in workers.items():
+        print(f"{mode:14}{r['calls']:8}{r['p50']:9.0f}{r['max']:9.0f}")
+    print(
+        f"leader fails: {leader_failure['calls']} backend calls, {leader_failure['failed']} of {args.burst} requests failed "
+        f"(the leader's worker shares its error, one other worker retries), max {leader_failure['max']:.0f}ms"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--burst", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--embedding-latency", type=float, default=0.2)
+    parser.add_argument("--agent-latency", type=float, default=0.5)
+    parser.add_argument("--redis-latency", type=float, default=0.001)
+    asyncio.run(main(parser.parse_args()))
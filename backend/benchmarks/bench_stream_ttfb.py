@@ -0,0 +1,123 @@
+"""
+Time-to-first-byte of /recommend vs the streaming /recommend/stream, against the local fake OpenAI API.
+
+    cd backend && python -m benchmarks.bench_stream_ttfb --requests 10 --token-delay 0.02
+
+Both endpoints are served over real HTTP by uvicorn with the same service code as main.py,
+minus Firebase auth and Redis rate limiting. The fake model waits `latency` seconds and then
+generates the recommendation JSON four characters every `token-delay` seconds.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+APP_PORT = int(os.getenv("BENCH_APP_PORT", "8766"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+from agents import set_default_openai_api, set_tracing_disabled  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from fastapi.responses import StreamingResponse  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient  # noqa: E402
+from service.recommendation import get_scheme_response, stream_scheme_response  # noqa: E402
+
+QUERIES = [
+    "I am a farmer in Maharashtra looking for crop insurance",
+    "scholarship for girl students in Kerala",
+    "loan for dairy business in Madhya Pradesh",
+    "pension for senior citizens",
+    "financial assistance for disabled students",
+]
+
+app = FastAPI()
+
+
+@app.post("/recommend")
+async def recommend(payload: dict):
+    return await get_scheme_response(payload["conversation_history"], payload.get("current_input", ""))
+
+
+@app.post("/recommend/stream")
+async def recommend_stream(payload: dict):
+    return StreamingResponse(
+        stream_scheme_response(payload["conversation_history"], payload.get("current_input", "")),
+        media_type="text/event-stream",
+    )
+
+
+def start_app() -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=APP_PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def measure(client: httpx.AsyncClient, path: str, query: str) -> dict:
+    """Milliseconds from sending the request to the first body byte, to each SSE event's first arrival, and to the end."""
+    timings = {}
+    start = time.perf_counter()
+    async with client.stream("POST", path, json={"conversation_history": [query]}) as response:
+        async for chunk in response.aiter_text():
+            now = (time.perf_counter() - start) * 1000
+            timings.setdefault("first_byte", now)
+            for line in chunk.splitlines():
+                if line.startswith("event: "):
+                    timings.setdefault(line[len("event: "):], now)
+    timings["total"] = (time.perf_counter() - start) * 1000
+    return timings
+
+
+def median(rows, key):
+    values = [row[key] for row in rows if key in row]
+    return f"{statistics.median(values):8.0f}" if values else f"{'-':>8}"
+
+
+async def main(args):
+    set_default_openai_api("chat_completions")
+    set_tracing_disabled(True)
+
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+    fake_api = start_server(PORT, args.latency, args.token_delay)
+    server = start_app()
+    try:
+        results = {"/recommend": [], "/recommend/stream": []}
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{APP_PORT}", timeout=120) as client:
+            await measure(client, "/recommend/stream", QUERIES[0])
+            for i in range(args.requests):
+                query = QUERIES[i % len(QUERIES)]
+                for path in results:
+                    results[path].append(await measure(client, path, query))
+    finally:
+        server.should_exit = True
+        fake_api.terminate()
+
+    print()
+    print(f"{args.requests} requests per endpoint, model latency {args.latency * 1000:.0f}ms, {args.token_delay * 1000:.0f}ms per 4-char chunk")
+    print(f"median ms         {'1st byte':>8}{'candid.':>8}{'token':>8}{'scheme':>8}{'total':>8}")
+    for path, rows in results.items():
+        print(f"{path:18}{median(rows, 'first_byte')}{median(rows, 'candidates')}{median(rows, 'token')}{median(rows, 'scheme')}{median(rows, 'total')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--schemes", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,261 @@
+"""
+Offline benchmark and retrieval-quality suite, comparable across commits.
+
+    cd backend && python -m benchmarks.bench_suite --save
+    cd backend && python -m benchmarks.bench_suite --compare main
+
+Runs without any network access: embeddings come from the hashed n-gram HashingEmbeddingClient
+and agent replies from ScriptedRunner in place of `agents.Runner`. Three phases:
+- index: `index_schemes` over the real scheme data (or `--schemes N` synthetic ones)
+- retrieval: `query_schemes` for every recorded conversation, scored against its labelled
+  expected ids with recall@k and MRR
+- turns: every recorded conversation replayed through `get_scheme_response`, `--rounds` times
+  at `--concurrency`, for throughput and per-stage latency
+Each phase reports its time and the process's peak RSS afterwards. Retrieval uses the exact
+NumPy engine unless VECTOR_ENGINE is set, so quality scores only change when the code does.
+
+`--save` writes the results to benchmarks/results/<commit>.json. `--compare REF` reads the
+results saved for a git ref (or a results file) and flags every metric that got worse by more
+than `--tolerance`, or any drop in recall or MRR. With `--fail-on-regression` the exit status
+is 1 when something regressed. Timings are only comparable between runs on the same machine.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+# Exact search keeps recall and MRR identical between runs; Chroma's HNSW build is not deterministic
+os.environ.setdefault("VECTOR_ENGINE", "numpy")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents import set_tracing_disabled  # noqa: E402
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fixtures import load_conversations, load_real_schemes  # noqa: E402
+from benchmarks.scripted_agents import ScriptedRunner  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, set_embedding_client  # noqa: E402
+from core.settings import settings  # noqa: E402
+from core.timing import StageTimer  # noqa: E402
+from core.utils import combine_conversation  # noqa: E402
+from service import recommendation  # noqa: E402
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+RECALL_KS = (5, 10, 25)
+# Changes in a timing smaller than this are noise at these scales and never flagged
+MIN_DELTA_MS = 1.0
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def ranking_scores(matched_ids, expected_ids):
+    """recall@k for each of RECALL_KS and the reciprocal rank of the first expected id."""
+    expected = set(expected_ids)
+    scores = {f"recall@{k}": len(expected & set(matched_ids[:k])) / len(expected) for k in RECALL_KS}
+    rank = next((i + 1 for i, scheme_id in enumerate(matched_ids) if scheme_id in expected), None)
+    scores["mrr"] = 1 / rank if rank else 0.0
+    return scores
+
+
+async def bench_index(schemes):
+    start = time.perf_counter()
+    await embedding_search.index_schemes(schemes, force_reindex=True, embedding_client=HashingEmbeddingClient())
+    seconds = time.perf_counter() - start
+    return {
+        "schemes": len(schemes),
+        "seconds": round(seconds, 3),
+        "schemes_per_s": round(len(schemes) / seconds, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def bench_retrieval(conversations):
+    scores, latencies = [], []
+    # The first query loads the in-memory indexes
+    await embedding_search.query_schemes("warm up", top_k=1)
+    for conversation in conversations:
+        if not conversation.get("expected_ids"):
+            continue
+        query = combine_conversation(conversation["conversation_history"], conversation["current_input"])
+        start = time.perf_counter()
+        matched = await embedding_search.query_schemes(query, top_k=max(RECALL_KS))
+        latencies.append((time.perf_counter() - start) * 1000)
+        scores.append(ranking_scores([m.get("id") for m in matched], conversation["expected_ids"]))
+    return {
+        "queries": len(scores),
+        **{name: round(statistics.mean(s[name] for s in scores), 4) for name in scores[0]},
+        "p50_ms": round(percentile(latencies, 0.5), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+async def bench_turns(conversations, rounds: int, concurrency: int):
+    turns = [(c["conversation_history"], c["current_input"]) for c in conversations] * rounds
+    timings, tokens = [], []
+    pending = iter(turns)
+
+    async def worker():
+        for history, current_input in pending:
+            timer = StageTimer()
+            await recommendation.get_scheme_response(history, current_input, timer=timer)
+            timings.append(timer.summary())
+            tokens.append(sum(agent["prompt"] for agent in timer.tokens.values()))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - start
+    stages = sorted({name for timing in timings for name in timing})
+    return {
+        "turns": len(turns),
+        "seconds": round(seconds, 3),
+        "turns_per_s": round(len(turns) / seconds, 1),
+        "stages_p50_ms": {name: round(percentile([t[name] for t in timings if name in t], 0.5), 2) for name in stages},
+        "stages_p95_ms": {name: round(percentile([t[name] for t in timings if name in t], 0.95), 2) for name in stages},
+        "prompt_tokens_mean": round(statistics.mean(tokens), 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def flatten(results, prefix=""):
+    for name, value in results.items():
+        if isinstance(value, dict):
+            yield from flatten(value, f"{prefix}{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield f"{prefix}{name}", value
+
+
+def higher_is_better(metric: str) -> bool:
+    name = metric.rsplit(".", 1)[-1]
+    return name.startswith("recall@") or name == "mrr" or name.endswith("_per_s")
+
+
+def compare(baseline, current, tolerance: float):
+    """Rows of (metric, baseline, current, relative change, regressed) for metrics in both runs."""
+    base = dict(flatten({k: baseline[k] for k in ("index", "retrieval", "turns") if k in baseline}))
+    rows = []
+    for metric, value in flatten({k: current[k] for k in ("index", "retrieval", "turns")}):
+        if metric not in base or metric.endswith((".schemes", ".queries", ".turns")):
+            continue
+        old = base[metric]
+        change = (value - old) / old if old else 0.0
+        if metric.startswith("retrieval.") and higher_is_better(metric):
+            # Quality is deterministic, so any drop is a regression
+            regressed = value < old - 1e-9
+        elif higher_is_better(metric):
+            regressed = change < -tolerance
+        else:
+            regressed = change > tolerance and not ("_ms" in metric and value - old < MIN_DELTA_MS)
+        rows.append((metric, old, value, change, regressed))
+    return rows
+
+
+def resolve_baseline(ref: str) -> str:
+    if os.path.exists(ref):
+        return ref
+    commit = git("rev-parse", "--short=12", ref)
+    path = os.path.join(RESULTS_DIR, f"{commit or ref}.json")
+    if not os.path.exists(path):
+        raise SystemExit(f"No saved results for {ref} ({path}); check it out and run with --save first")
+    return path
+
+
+async def main(args):
+    logging.disable(logging.INFO)
+    set_tracing_disabled(True)
+    set_embedding_client(HashingEmbeddingClient())
+    recommendation.Runner = ScriptedRunner(latency=args.agent_latency)
+
+    conversations = load_conversations()
+    schemes = synthetic_schemes(args.schemes) if args.schemes else load_real_schemes()
+    results = {
+        "commit": git("rev-parse", "--short=12", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "schemes": "synthetic" if args.schemes else "real",
+            "rounds": args.rounds,
+            "concurrency": args.concurrency,
+            "agent_latency": args.agent_latency,
+            "vector_engine": settings.VECTOR_ENGINE,
+            "hybrid_search": settings.HYBRID_SEARCH,
+            "scheme_prefilter": settings.SCHEME_PREFILTER,
+            "cpus": os.cpu_count(),
+        },
+    }
+    results["index"] = await bench_index(schemes)
+    results["retrieval"] = await bench_retrieval(conversations)
+    results["turns"] = await bench_turns(conversations, args.rounds, args.concurrency)
+
+    index, retrieval, turns = results["index"], results["retrieval"], results["turns"]
+    print()
+    print(f"commit {results['commit']}{' (dirty)' if results['dirty'] else ''}, {os.cpu_count()} CPUs")
+    print(f"index      {index['schemes']} schemes in {index['seconds']:.2f}s ({index['schemes_per_s']:.0f}/s), peak RSS {index['peak_rss_mb']:.0f}MB")
+    print(
+        f"retrieval  {retrieval['queries']} queries: "
+        + ", ".join(f"recall@{k} {retrieval[f'recall@{k}']:.3f}" for k in RECALL_KS)
+        + f", MRR {retrieval['mrr']:.3f}, p50 {retrieval['p50_ms']:.1f}ms, p95 {retrieval['p95_ms']:.1f}ms"
+    )
+    print(f"turns      {turns['turns']} in {turns['seconds']:.2f}s ({turns['turns_per_s']:.1f}/s), {turns['prompt_tokens_mean']:.0f} prompt tokens per turn, peak RSS {turns['peak_rss_mb']:.0f}MB")
+    print(f"{'stage':28}{'p50 ms':>10}{'p95 ms':>10}")
+    for stage, p50 in turns["stages_p50_ms"].items():
+        print(f"{stage:28}{p50:10.2f}{turns['stages_p95_ms'][stage]:10.2f}")
+
+    if args.save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{results['commit'] or 'results'}{'-dirty' if results['dirty'] else ''}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved {path}")
+
+    if args.compare:
+        path = resolve_baseline(args.compare)
+        with open(path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, results, args.tolerance)
+        print()
+        print(f"vs {baseline.get('commit') or path} (tolerance {args.tolerance:.0%})")
+        print(f"{'metric':40}{'baseline':>12}{'current':>12}{'change':>9}")
+        for metric, old, value, change, regressed in rows:
+            print(f"{metric:40}{old:12.3f}{value:12.3f}{change:+9.1%}{'  REGRESSED' if regressed else ''}")
+        regressions = [row[0] for row in rows if row[4]]
+        print(f"{len(regressions)} regression(s)" + (f": {', '.join(regressions)}" if regressions else ""))
+        if regressions and args.fail_on_regression:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=0, help="synthetic schemes to index instead of the real data")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--agent-latency", type=float, default=0.0, help="seconds each scripted agent run takes")
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--compare", help="git ref or results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Chroma vs in-memory NumPy VectorIndex: latency and recall@k.
+
+    cd backend && python -m benchmarks.bench_vector_index --schemes 3600 --queries 200
+
+Ground truth is an exact float64 cosine ranking; queries are indexed scheme vectors
+with Gaussian noise so each has a meaningful neighbourhood.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.bench_indexing import synthetic_schemes
+from core import embedding_search
+from core.embeddings import HashingEmbeddingClient
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+def timed(fn, queries):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(fn(query))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies, results
+
+
+async def main(args):
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+    collection = embedding_search.get_collection()
+
+    start = time.perf_counter()
+    index = embedding_search.get_vector_index()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rng = np.random.default_rng(7)
+    picks = rng.choice(len(index), size=args.queries)
+    queries = np.asarray(index.matrix[picks], dtype=np.float64) + rng.normal(0, 0.02, size=(args.queries, index.matrix.shape[1]))
+
+    exact = np.asarray(index.matrix, dtype=np.float64)
+    truth = []
+    for query in queries:
+        scores = exact @ (query / np.linalg.norm(query))
+        truth.append({index.ids[row] for row in np.argsort(-scores)[:args.top_k]})
+
+    chroma_ms, chroma_results = timed(
+        lambda q: collection.query(query_embeddings=[q.tolist()], n_results=args.top_k, include=["metadatas"])["ids"][0],
+        queries,
+    )
+    numpy_ms, numpy_results = timed(
+        lambda q: [index.ids[row] for row, _ in index.query(q, args.top_k)],
+        queries,
+    )
+
+    start = time.perf_counter()
+    index.query_batch(queries, args.top_k)
+    batch_ms = (time.perf_counter() - start) * 1000
+
+    def recall(results):
+        return statistics.mean(len(truth_ids & set(ids)) / args.top_k for truth_ids, ids in zip(truth, results))
+
+    print()
+    print(f"{len(index)} schemes, {args.queries} queries, top_k={args.top_k}, numpy index load {load_ms:.1f}ms")
+    print(f"{'':8}{'p50 ms':>10}{'p99 ms':>10}{'recall@k':>10}")
+    print(f"{'chroma':8}{statistics.median(chroma_ms):10.3f}{percentile(chroma_ms, 0.99):10.3f}{recall(chroma_results):10.3f}")
+    print(f"{'numpy':8}{statistics.median(numpy_ms):10.3f}{percentile(numpy_ms, 0.99):10.3f}{recall(numpy_results):10.3f}")
+    print(f"numpy batched: {batch_ms:.2f}ms for all {args.queries} queries ({batch_ms / args.queries:.3f}ms each)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=3600)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=25)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""
+Structured pre-filtering evaluation: candidate-set size, precision per retrieved slot and latency.
+
+    cd backend && python -m benchmarks.eval_filters --schemes 3600 --top-k 25
+
+Precision is the share of the top_k results that satisfy the constraints extracted
+from the query (state or central, age range, gender).
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.bench_indexing import synthetic_schemes
+from core import embedding_search
+from core.embeddings import HashingEmbeddingClient
+from core.scheme_filters import build_chroma_where, extract_constraints
+
+QUERIES = [
+    "I am a 45 year old woman farmer from Kerala",
+    "scholarship for students in Punjab, I am 19",
+    "pension scheme for senior citizens in Maharashtra. age 67",
+    "loan for my shop in Bihar. I am a man aged 30",
+    "central government scheme for disabled persons",
+    "state government schemes for women in Assam",
+]
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    result = fn()
+    return (time.perf_counter() - start) * 1000, result
+
+
+async def main(args):
+    embedder = HashingEmbeddingClient()
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=embedder)
+    index = embedding_search.get_vector_index()
+    filters = embedding_search.get_filter_index()
+    collection = embedding_search.get_collection()
+
+    rows = []
+    for query in QUERIES:
+        constraints = extract_constraints(query)
+        vector = (await embedder.embed([query]))[0]
+        allowed = filters.mask(constraints)
+
+        filter_ms, candidates = timed_ms(lambda: filters.candidate_rows(constraints))
+        plain_ms, plain = timed_ms(lambda: index.query(vector, args.top_k))
+        filtered_ms, filtered = timed_ms(lambda: index.query(vector, args.top_k, rows=candidates))
+        where = build_chroma_where(constraints)
+        chroma_plain_ms, _ = timed_ms(lambda: collection.query(query_embeddings=[vector], n_results=args.top_k))
+        chroma_filtered_ms, _ = timed_ms(lambda: collection.query(query_embeddings=[vector], n_results=args.top_k, where=where))
+
+        rows.append({
+            "query": query,
+            "constraints": {k: v for k, v in constraints.items() if v is not None},
+            "candidates": len(candidates),
+            "precision_plain": sum(allowed[row] for row, _ in plain) / len(plain),
+            "precision_filtered": sum(allowed[row] for row, _ in filtered) / max(1, len(filtered)),
+            "numpy_plain_ms": plain_ms,
+            "numpy_filtered_ms": filter_ms + filtered_ms,
+            "chroma_plain_ms": chroma_plain_ms,
+            "chroma_filtered_ms": chroma_filtered_ms,
+        })
+
+    print()
+    print(f"{len(index)} schemes, top_k={args.top_k}")
+    for row in rows:
+        print(f"- {row['query']}")
+        print(f"    constraints {row['constraints']}")
+        print(f"    candidates {row['candidates']}/{len(index)}, precision {row['precision_plain']:.2f} → {row['precision_filtered']:.2f}")
+        print(f"    numpy {row['numpy_plain_ms']:.2f}ms → {row['numpy_filtered_ms']:.2f}ms, chroma {row['chroma_plain_ms']:.2f}ms → {row['chroma_filtered_ms']:.2f}ms")
+
+    print()
+    print(f"mean candidate set      : {statistics.mean(r['candidates'] for r in rows):.0f} of {len(index)}")
+    print(f"mean precision per slot : {statistics.mean(r['precision_plain'] for r in rows):.2f} → {statistics.mean(r['precision_filtered'] for r in rows):.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--schemes", type=int, default=3600)
+    parser.add_argument("--top-k", type=int, default=25)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,163 @@
+"""
+Local stand-in for the OpenAI API used by the load tests.
+
+    cd backend && python -m benchmarks.fake_openai_server --port 8765 --latency 0.05
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8765/v1.
+Embeddings are deterministic hashed n-gram vectors; every request waits `latency`
+seconds to mimic the network round trip.
+Chat completions answer the decision prompt with a follow-up question for conversations
+under six words and "no follow-up" otherwise, and the recommendation prompt with the first
+schemes of its list, generated `chunk_chars` characters every
+`token_delay` seconds when streamed. Token usage is reported as the tokenizer counts it
+(streamed usage only when `stream_options.include_usage` is set). The agents SDK must use the
+chat completions API (`set_default_openai_api("chat_completions")`).
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.embeddings import HashingEmbeddingClient  # noqa: E402
+from core.prompts import count_tokens  # noqa: E402
+
+app = FastAPI()
+app.state.latency = float(os.getenv("FAKE_OPENAI_LATENCY", "0.05"))
+app.state.token_delay = float(os.getenv("FAKE_OPENAI_TOKEN_DELAY", "0.02"))
+app.state.chunk_chars = 4
+embedder = HashingEmbeddingClient()
+
+_CONTEXT_RE = re.compile(r'Conversation Context: "(.*?)"', re.S)
+_SCHEME_LIST_RE = re.compile(r"Available Schemes \([^)]*\):\n(.*?)\n\n", re.S)
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    await asyncio.sleep(app.state.latency)
+    return {
+        "object": "list",
+        "model": body.get("model", "text-embedding-3-small"),
+        "data": [
+            {"object": "embedding", "index": i, "embedding": embedder.embed_one(text)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {"prompt_tokens": 0, "total_tokens": 0},
+    }
+
+
+def chat_usage(messages, reply: str):
+    prompt_tokens = sum(count_tokens(m["content"]) for m in messages if isinstance(m.get("content"), str))
+    completion_tokens = count_tokens(reply)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+
+def chat_reply(messages) -> str:
+    prompt = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    if isinstance(prompt, list):
+        prompt = " ".join(part.get("text", "") for part in prompt)
+    schemes = _SCHEME_LIST_RE.search(prompt)
+    if schemes is None:
+        context = _CONTEXT_RE.search(prompt)
+        if context and len(context.group(1).split()) < 6:
+            return json.dumps({
+                "followup_needed": True,
+                "show_recommendations": False,
+                "followup_question": "Which state do you live in, how old are you and what kind of help do you need?",
+            })
+        return json.dumps({"followup_needed": False, "show_recommendations": True, "followup_question": None})
+    ids = [line.split(" | ", 1)[0] for line in schemes.group(1).splitlines() if " | " in line][:10]
+    return json.dumps({
+        "message": "These schemes match the details you shared about your situation and needs.",
+        "schemes": [{"id": scheme_id, "reason": f"Fits the eligibility and purpose described for {scheme_id}."} for scheme_id in ids],
+    }, indent=2)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    reply = chat_reply(body["messages"])
+    model = body.get("model", "gpt-4o-mini")
+    await asyncio.sleep(app.state.latency)
+
+    if not body.get("stream"):
+        # Same generation time as the streamed reply, delivered at once
+        await asyncio.sleep(app.state.token_delay * -(-len(reply) // app.state.chunk_chars))
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": chat_usage(body["messages"], reply),
+        }
+
+    def chunk(delta, finish_reason=None, usage=None):
+        data = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else [],
+        }
+        if usage is not None:
+            data["usage"] = usage
+        return f"data: {json.dumps(data)}\n\n"
+
+    async def events():
+        yield chunk({"role": "assistant", "content": ""})
+        step = app.state.chunk_chars
+        for i in range(0, len(reply), step):
+            await asyncio.sleep(app.state.token_delay)
+            yield chunk({"content": reply[i:i + step]})
+        yield chunk({}, "stop")
+        if (body.get("stream_options") or {}).get("include_usage"):
+            yield chunk({}, usage=chat_usage(body["messages"], reply))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def start_server(port: int, latency: float, token_delay: float = 0.02) -> subprocess.Popen:
+    """Runs the fake API in a subprocess and waits until it accepts requests."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_openai_server", "--port", str(port), "--latency", str(latency),
+         "--token-delay", str(token_delay)],
+        cwd=backend_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.post(f"http://127.0.0.1:{port}/v1/embeddings", json={"input": "ping"}, timeout=1)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("fake OpenAI server did not start")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--token-delay", type=float, default=0.02)
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    app.state.token_delay = args.token_delay
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
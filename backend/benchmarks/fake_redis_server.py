@@ -0,0 +1,193 @@
+"""
+Local stand-in for Redis, speaking enough RESP for the rate-limit and single-flight benchmarks.
+
+    cd backend && python -m benchmarks.fake_redis_server --port 6390 --latency 0.001
+
+Supports GET, SET (EX/PX/NX), INCR, INCRBY, EXPIRE, PEXPIRE, PTTL, EXISTS, DEL, PING, CLIENT/HELLO
+handshakes, SCRIPT LOAD and EVALSHA of fastapi-limiter's rate-limit script (run natively,
+there is no Lua). Every batch of commands read from a connection (a single command or a
+pipeline) waits `latency` seconds before it is answered, to mimic a network round trip.
+"""
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+# fastapi-limiter 0.1.x: fixed-window counter, returns 0 if allowed else the window's PTTL
+LIMITER_SHA = "fastapi-limiter-script"
+
+
+class Store:
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    def get(self, key):
+        return self.values[key] if self._alive(key) else None
+
+    def set(self, key, value, px=None):
+        self.values[key] = value
+        self.expires.pop(key, None)
+        if px is not None:
+            self.expires[key] = time.monotonic() + px / 1000
+
+    def incrby(self, key, amount):
+        value = int(self.get(key) or 0) + amount
+        self.values[key] = str(value).encode()
+        return value
+
+    def pexpire(self, key, ms):
+        if not self._alive(key):
+            return 0
+        self.expires[key] = time.monotonic() + ms / 1000
+        return 1
+
+    def pttl(self, key):
+        if not self._alive(key):
+            return -2
+        expires_at = self.expires.get(key)
+        return -1 if expires_at is None else int((expires_at - time.monotonic()) * 1000)
+
+    def limiter_script(self, key, limit, expire_ms):
+        current = int(self.get(key) or 0)
+        if current > 0:
+            if current + 1 > limit:
+                return self.pttl(key)
+            self.incrby(key, 1)
+            return 0
+        self.set(key, b"1", px=expire_ms)
+        return 0
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if isinstance(value, bool):
+        value = int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, Exception):
+        return b"-ERR " + str(value).encode() + b"\r\n"
+    if isinstance(value, str):
+        return b"+" + value.encode() + b"\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+
+def execute(store: Store, args):
+    command = args[0].upper()
+    if command in (b"PING",):
+        return "PONG"
+    if command in (b"CLIENT", b"SELECT"):
+        return "OK"
+    if command == b"HELLO":
+        return Exception("unknown command 'HELLO'")
+    if command == b"GET":
+        return store.get(args[1])
+    if command == b"SET":
+        px = None
+        options = [a.upper() for a in args[3:]]
+        if b"PX" in options:
+            px = int(args[3 + options.index(b"PX") + 1])
+        if b"EX" in options:
+            px = int(args[3 + options.index(b"EX") + 1]) * 1000
+        if b"NX" in options and store.get(args[1]) is not None:
+            return None
+        store.set(args[1], args[2], px)
+        return "OK"
+    if command == b"INCR":
+        return store.incrby(args[1], 1)
+    if command == b"INCRBY":
+        return store.incrby(args[1], int(args[2]))
+    if command == b"EXPIRE":
+        return store.pexpire(args[1], int(args[2]) * 1000)
+    if command == b"PEXPIRE":
+        return store.pexpire(args[1], int(args[2]))
+    if command == b"PTTL":
+        return store.pttl(args[1])
+    if command == b"EXISTS":
+        return sum(store.get(key) is not None for key in args[1:])
+    if command == b"DEL":
+        return sum(store.values.pop(key, None) is not None for key in args[1:])
+    if command == b"SCRIPT":
+        return LIMITER_SHA.encode()
+    if command == b"EVALSHA":
+        return store.limiter_script(args[3], int(args[4]), int(args[5]))
+    return Exception(f"unknown command '{command.decode()}'")
+
+
+def parse(buffer: bytes):
+    """Complete RESP commands at the start of `buffer` and the number of bytes they take."""
+    commands, position = [], 0
+    while True:
+        end = buffer.find(b"\r\n", position)
+        if end < 0:
+            return commands, position
+        count, cursor, args = int(buffer[position + 1:end]), end + 2, []
+        for _ in range(count):
+            end = buffer.find(b"\r\n", cursor)
+            if end < 0:
+                return commands, position
+            length = int(buffer[cursor + 1:end])
+            if end + 2 + length + 2 > len(buffer):
+                return commands, position
+            args.append(buffer[end + 2:end + 2 + length])
+            cursor = end + 2 + length + 2
+        commands.append(args)
+        position = cursor
+
+
+async def serve(port: int, latency: float):
+    store = Store()
+
+    async def handle(reader, writer):
+        buffer = b""
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            buffer += data
+            commands, used = parse(buffer)
+            buffer = buffer[used:]
+            if not commands:
+                continue
+            if latency:
+                await asyncio.sleep(latency)
+            writer.write(b"".join(encode(execute(store, args)) for args in commands))
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", port)
+    async with server:
+        await server.serve_forever()
+
+
+def start_server(port: int, latency: float) -> subprocess.Popen:
+    """Runs the stand-in in a subprocess and waits until it accepts connections."""
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_redis_server", "--port", str(port), "--latency", str(latency)],
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("fake Redis server did not start")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=6390)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(serve(args.port, args.latency))
@@ -0,0 +1,25 @@
+"""Shared inputs for the benchmarks: recorded conversations and the scraped scheme data."""
+import json
+import os
+import tempfile
+
+# Keep benchmark indexes out of the serving chroma_db
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+
+CONVERSATIONS_PATH = os.path.join(os.path.dirname(__file__), "data", "conversations.jsonl")
+
+
+def load_conversations(path: str = CONVERSATIONS_PATH):
+    """Recorded conversations: conversation_history, current_input and labelled expected_ids."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def load_real_schemes():
+    """All schemes from data/scheme-details, extracted the way reindexing does."""
+    from service import reindex
+
+    if not os.path.exists(reindex.SCHEMES_JSON_PATH):
+        # data/schemes.json (age limits) is produced by scripts/fetch_schemes.ts and not checked in
+        reindex.SCHEMES_AGE_LIMITS = {}
+    return [s for s in reindex.load_all_scheme_details() if s.get("id")]
@@ -0,0 +1,101 @@
+"""
+Load test for query_schemes against a local fake embeddings server.
+
+    cd backend && python -m benchmarks.load_test_query --requests 200 --rate 40
+
+"before" replays the previous implementation (a new synchronous OpenAI client per call
+and a blocking Chroma query inside the coroutine); "after" is the current query_schemes
+using the shared async client.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+PORT = int(os.getenv("FAKE_OPENAI_PORT", "8765"))
+os.environ.setdefault("CHROMA_PERSIST_DIR", tempfile.mkdtemp(prefix="bench_chroma_"))
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+os.environ["EMBEDDING_BACKEND"] = "openai"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_indexing import synthetic_schemes  # noqa: E402
+from benchmarks.fake_openai_server import start_server  # noqa: E402
+from core import embedding_search  # noqa: E402
+from core.embeddings import HashingEmbeddingClient, close_embedding_client  # noqa: E402
+from core.utils import EMBEDDINGS_MODEL  # noqa: E402
+
+QUERIES = [
+    "I am a farmer in Maharashtra looking for crop insurance",
+    "scholarship for girl students in Kerala",
+    "loan for dairy business in Madhya Pradesh",
+    "pension for senior citizens",
+    "financial assistance for disabled students",
+]
+
+
+async def legacy_query_schemes(user_query: str, top_k: int = 10):
+    from openai import OpenAI
+
+    collection = embedding_search.get_collection()
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    response = client.embeddings.create(input=user_query, model=EMBEDDINGS_MODEL)
+    result = collection.query(query_embeddings=[response.data[0].embedding], n_results=top_k)
+    return result.get("metadatas", [[]])[0]
+
+
+async def run_load(query_fn, total: int, rate: float):
+    """Open-loop load: request i arrives at i / rate seconds; latency counts from arrival."""
+    latencies = []
+    start = time.perf_counter()
+
+    async def one(i: int):
+        arrival = start + i / rate
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        await query_fn(QUERIES[i % len(QUERIES)], top_k=25)
+        latencies.append(time.perf_counter() - arrival)
+
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "rps": total / elapsed,
+    }
+
+
+async def main(args):
+    await embedding_search.index_schemes(synthetic_schemes(args.schemes), force_reindex=True, embedding_client=HashingEmbeddingClient())
+
+    # Warm both paths so connection setup and collection load are not measured
+    await legacy_query_schemes(QUERIES[0])
+    await embedding_search.query_schemes(QUERIES[0])
+
+    before = await run_load(legacy_query_schemes, args.requests, args.rate)
+    after = await run_load(embedding_search.query_schemes, args.requests, args.rate)
+    await close_embedding_client()
+
+    print()
+    print(f"{args.requests} requests offered at {args.rate:.0f} req/s, fake embedding latency {args.latency * 1000:.0f}ms")
+    print(f"{'':8}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for label, stats in [("before", before), ("after", after)]:
+        print(f"{label:8}{stats['p50_ms']:10.1f}{stats['p99_ms']:10.1f}{stats['rps']:10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=40, help="offered load in requests per second")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server seconds per embedding request")
+    parser.add_argument("--schemes", type=int, default=500)
+    args = parser.parse_args()
+
+    server = start_server(PORT, args.latency)
+    try:
+        asyncio.run(main(args))
+    finally:
+        server.terminate()
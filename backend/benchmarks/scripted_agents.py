@@ -0,0 +1,71 @@
+"""
+In-process stand-in for `agents.Runner`, for benchmarks that should not depend on a model.
+
+Replies come from the same script as the fake OpenAI server (`chat_reply`): a follow-up
+question for short conversations, otherwise the first schemes of the prompt's list. Usage is
+the tokenizer's count of instructions, prompt and reply. Install it with
+
+    from service import recommendation
+    recommendation.Runner = ScriptedRunner(latency=0.0)
+"""
+import asyncio
+from types import SimpleNamespace
+
+from agents.usage import Usage
+from openai.types.responses import ResponseTextDeltaEvent
+
+from benchmarks.fake_openai_server import chat_reply
+from core.prompts import count_tokens
+
+
+class ScriptedRun:
+    """The parts of RunResult / RunResultStreaming the recommendation service reads."""
+
+    def __init__(self, agent, prompt: str, latency: float, chunk_chars: int):
+        self.reply = chat_reply([{"role": "user", "content": prompt}])
+        self.final_output = self.reply
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.is_complete = False
+        self.context_wrapper = SimpleNamespace(usage=Usage(
+            requests=1,
+            input_tokens=count_tokens(agent.instructions or "") + count_tokens(prompt),
+            output_tokens=count_tokens(self.reply),
+        ))
+
+    def cancel(self):
+        self.is_complete = True
+
+    async def stream_events(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i in range(0, len(self.reply), self.chunk_chars):
+            if self.is_complete:
+                return
+            delta = ResponseTextDeltaEvent.model_construct(
+                content_index=0, delta=self.reply[i:i + self.chunk_chars], item_id="scripted",
+                logprobs=[], output_index=0, sequence_number=i, type="response.output_text.delta",
+            )
+            yield SimpleNamespace(type="raw_response_event", data=delta)
+        self.is_complete = True
+
+
+class ScriptedRunner:
+    """`Runner.run` and `Runner.run_streamed` answering from the script after `latency` seconds."""
+
+    def __init__(self, latency: float = 0.0, chunk_chars: int = 16):
+        self.latency = latency
+        self.chunk_chars = chunk_chars
+        self.runs = 0
+
+    async def run(self, agent, prompt: str) -> ScriptedRun:
+        self.runs += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        result = ScriptedRun(agent, prompt, self.latency, self.chunk_chars)
+        result.is_complete = True
+        return result
+
+    def run_streamed(self, agent, prompt: str) -> ScriptedRun:
+        self.runs += 1
+        return ScriptedRun(agent, prompt, self.latency, self.chunk_chars)
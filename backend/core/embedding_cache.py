@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_EDGE_PUNCTUATION = " .,;:!?-\"'"
+
+
+def normalize_query(text: str) -> str:
+    """
+    Canonical form of a query for cache lookups.
+    "Schemes for farmers in  Maharashtra." and "schemes for farmers in maharashtra" map to the same key.
+    """
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return _WHITESPACE_RE.sub(" ", text).strip(_EDGE_PUNCTUATION)
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def decode_vector(data: bytes) -> List[float]:
+    return np.frombuffer(data, dtype=np.float32).tolist()
+
+
+class LRUCache:
+    """In-process LRU of float32-encoded vectors with a size cap and per-entry TTL."""
+
+    def __init__(self, max_items: int, ttl: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_items:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "max_items": self.max_items,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class CachedEmbeddingClient:
+    """
+    Wraps an embedding client with an in-process LRU and an optional shared Redis tier.
+    Keys are the normalized text plus the model name; only misses reach the wrapped
+    client, and all misses of one call go out as a single embedding request.
+    - `redis_conn` must be a binary (decode_responses=False) redis.asyncio client
+    """
+
+    KEY_PREFIX = "emb:"
+
+    def __init__(self, client, redis_conn=None, max_items: int = None, ttl: float = None):
+        self.client = client
+        self.model = getattr(client, "model", "")
+        self.redis = redis_conn
+        self.ttl = ttl or settings.EMBEDDING_CACHE_TTL
+        self.local = LRUCache(max_items or settings.EMBEDDING_CACHE_SIZE, self.ttl)
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+
+    async def _redis_get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        if not self.redis or not keys:
+            return [None] * len(keys)
+        try:
+            values = await self.redis.mget([self.KEY_PREFIX + key for key in keys])
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Embedding cache Redis read failed: {e}")
+            return [None] * len(keys)
+        for value in values:
+            if value is None:
+                self.redis_misses += 1
+            else:
+                self.redis_hits += 1
+        return values
+
+    async def _redis_set_many(self, items: Dict[str, bytes]):
+        if not self.redis or not items:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in items.items():
+                    pipe.set(self.KEY_PREFIX + key, value, ex=int(self.ttl))
+                await pipe.execute()
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"Embedding cache Redis write failed: {e}")
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        keys = [cache_key(text, self.model) for text in texts]
+        found: Dict[str, bytes] = {}
+
+        for key in dict.fromkeys(keys):
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+
+        remote_keys = [key for key in dict.fromkeys(keys) if key not in found]
+        for key, value in zip(remote_keys, await self._redis_get_many(remote_keys)):
+            if value is not None:
+                found[key] = value
+                self.local.set(key, value)
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = await self.client.embed(list(missing.values()))
+            fresh = {key: encode_vector(vector) for key, vector in zip(missing.keys(), vectors)}
+            for key, value in fresh.items():
+                self.local.set(key, value)
+            await self._redis_set_many(fresh)
+            found.update(fresh)
+
+        return [decode_vector(found[key]) for key in keys]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "local": self.local.stats(),
+            "redis": {
+                "enabled": self.redis is not None,
+                "hits": self.redis_hits,
+                "misses": self.redis_misses,
+                "errors": self.redis_errors,
+            },
+        }
+
+    async def close(self):
+        await self.client.close()
@@ -1,83 +1,812 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from typing import List, Dict
-import chromadb
-from chromadb.config import Settings
-from openai import OpenAI
-from core.utils import get_age_text, prepare_scheme_for_metadata
+import shutil
+import time
+import uuid
+from typing import Callable, List, Dict, Optional
+import numpy as np
+from core.embeddings import create_embedding_client, get_embedding_client
+from core.settings import settings
+from core.utils import detail_record, get_age_text, prepare_scheme_for_metadata, project_fields, slim_metadata
+from core.lexical_index import BM25Index, reciprocal_rank_fusion
+from core.scheme_filters import FilterIndex, build_chroma_where, extract_constraints
+from core.vector_index import VectorIndex
+from core.scheme_store import SchemeStore, SchemeStoreWriter
+from core.timing import StageTimer
 
-PERSIST_DIR = "./chroma_db"
+logger = logging.getLogger(__name__)
+
+PERSIST_DIR = settings.CHROMA_PERSIST_DIR
 SCHEMES_COLLECTION = "schemes"
 
-# Create Chroma client and collection
-chroma_client = chromadb.PersistentClient(path=PERSIST_DIR)
+# Pointer to the collection that serves queries. Rewritten atomically when a rebuild finishes;
+# serving workers notice and switch to it (`watch_active_index`).
+ACTIVE_INDEX_PATH = os.path.join(PERSIST_DIR, "active_index.json")
+# Written while a rebuild is in progress so an interrupted run can resume its shadow collection.
+CHECKPOINT_PATH = os.path.join(PERSIST_DIR, "reindex_checkpoint.json")
+# Content hashes of every indexed scheme, used to re-embed only what changed.
+MANIFEST_PATH = os.path.join(PERSIST_DIR, "index_manifest.json")
+# NumPy exports of each index version, served when VECTOR_ENGINE=numpy
+VECTORS_DIR = os.path.join(PERSIST_DIR, "vectors")
+# BM25 index of each index version, rows aligned with the NumPy export
+LEXICAL_DIR = os.path.join(PERSIST_DIR, "lexical")
+# Full scheme details of each index version, read by id for the schemes returned to the user
+DETAILS_DIR = os.path.join(PERSIST_DIR, "details")
+# Rows per read and write when an incremental sync copies unchanged embeddings to its new collection
+COPY_BATCH_SIZE = 1000
+
+# Called as progress(phase, done, total) while an index is built: "embedding" after every batch,
+# then "exporting" and "swapping"
+Progress = Callable[[str, int, int], None]
+
+
+def _no_progress(phase: str, done: int, total: int):
+    pass
 
-# Fetch or create collection
+# Chroma client, opened on first use: importing chromadb and opening the store takes a while
+# and the NumPy engine serves queries from its own exports
+_chroma_client = None
+# The active index as it was when this worker loaded its serving indexes
+_serving = None
 _collection = None
+_vector_index = None
+_filter_index = None
+_lexical_index = None
+_detail_store = None
+
+
+def _read_json(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json_atomic(path: str, data: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _new_version() -> str:
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def get_active_index() -> Dict[str, str]:
+    """Returns {"collection", "version"} for the index currently serving queries, as recorded on disk."""
+    active = _read_json(ACTIVE_INDEX_PATH)
+    if not active:
+        # Stores built before the pointer existed serve the plain "schemes" collection
+        return {"collection": SCHEMES_COLLECTION, "version": "0"}
+    return active
+
+
+def get_serving_index() -> Dict[str, str]:
+    """
+    {"collection", "version"} of the index this worker serves: the active index when its serving
+    indexes were first loaded, until `reload_serving_indexes` switches them all together.
+    """
+    global _serving
+    if _serving is None:
+        _serving = get_active_index()
+    return _serving
+
+
+def get_chroma_client():
+    global _chroma_client
+    if _chroma_client is None:
+        import chromadb
+        _chroma_client = chromadb.PersistentClient(path=PERSIST_DIR)
+    return _chroma_client
+
+
+def _create_collection(name: str):
+    # A fixed HNSW search breadth, at least the session pool, so a query's results don't depend on
+    # n_results: the first 25 of a pool-sized search are the results of a 25-result one
+    search_ef = max(settings.CHROMA_SEARCH_EF, settings.SESSION_CANDIDATE_POOL)
+    return get_chroma_client().create_collection(name=name, metadata={"hnsw:search_ef": search_ef})
+
 
 def get_collection():
     global _collection
     if _collection is None:
+        name = get_serving_index()["collection"]
         try:
-            _collection = chroma_client.get_collection(name=SCHEMES_COLLECTION)
+            _collection = get_chroma_client().get_collection(name=name)
         except:
-            _collection = chroma_client.create_collection(name=SCHEMES_COLLECTION)
+            _collection = _create_collection(name)
     return _collection
 
-# Rebuild index from scratch using OpenAI embeddings
-async def index_schemes(schemes: List[Dict[str, any]], force_reindex: bool = False):
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-    if force_reindex:
+def _drop_other_versions(directory: str, keep: str):
+    """Deletes exports of every version except `keep` and the active one, which workers may still be serving."""
+    kept = {keep, get_active_index()["version"]}
+    for name in os.listdir(directory):
+        if name.split(".", 1)[0] not in kept:
+            path = os.path.join(directory, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+
+def export_serving_indexes(collection, version: str, schemes_by_id: Dict[str, Dict[str, any]] = None):
+    """
+    Writes the collection as a memory-mappable VectorIndex plus a row-aligned BM25 index and
+    the id-keyed detail store, and drops exports of older versions. Lexical text and details
+    come from `schemes_by_id` when given, otherwise from the stored metadata.
+    """
+    schemes_by_id = schemes_by_id or {}
+    index = VectorIndex.from_collection(collection)
+
+    os.makedirs(DETAILS_DIR, exist_ok=True)
+    writer = SchemeStoreWriter(os.path.join(DETAILS_DIR, f"{version}.jsonl"))
+    for scheme_id, metadata in zip(index.ids, index.metadatas):
+        details = detail_record(prepare_scheme_for_metadata(schemes_by_id[scheme_id]) if scheme_id in schemes_by_id else metadata)
+        writer.write(scheme_id, json.dumps(details, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    writer.close()
+    _drop_other_versions(DETAILS_DIR, version)
+
+    texts = [lexical_text(schemes_by_id.get(scheme_id) or metadata) for scheme_id, metadata in zip(index.ids, index.metadatas)]
+
+    # Collections written before metadata was slimmed still hold full records
+    index.metadatas = [slim_metadata(metadata) for metadata in index.metadatas]
+    index.save(os.path.join(VECTORS_DIR, version))
+    _drop_other_versions(VECTORS_DIR, version)
+
+    os.makedirs(LEXICAL_DIR, exist_ok=True)
+    BM25Index.build(index.ids, texts).save(os.path.join(LEXICAL_DIR, f"{version}.pkl"))
+    _drop_other_versions(LEXICAL_DIR, version)
+
+
+def get_vector_index() -> VectorIndex:
+    global _vector_index
+    if _vector_index is None:
+        version = get_serving_index()["version"]
+        directory = os.path.join(VECTORS_DIR, version)
+        if not os.path.exists(directory):
+            # Stores indexed before the NumPy engine existed have no export yet
+            export_serving_indexes(get_collection(), version)
+        _vector_index = VectorIndex.load(directory)
+    return _vector_index
+
+
+def get_lexical_index() -> BM25Index:
+    global _lexical_index
+    if _lexical_index is None:
+        index = get_vector_index()
+        path = os.path.join(LEXICAL_DIR, f"{get_serving_index()['version']}.pkl")
+        if not os.path.exists(path):
+            # Exports from before BM25 existed: rebuild its text from the detail records, since the
+            # slim metadata has no description, eligibility or tags
+            store = get_detail_store()
+            os.makedirs(LEXICAL_DIR, exist_ok=True)
+            BM25Index.build(index.ids, [lexical_text(_scheme_from_details(store.get(i) or m)) for i, m in zip(index.ids, index.metadatas)]).save(path)
+        _lexical_index = BM25Index.load(path)
+    return _lexical_index
+
+
+def get_filter_index() -> FilterIndex:
+    global _filter_index
+    if _filter_index is None:
+        _filter_index = FilterIndex(get_vector_index().metadatas)
+    return _filter_index
+
+
+def get_detail_store() -> SchemeStore:
+    global _detail_store
+    if _detail_store is None:
+        version = get_serving_index()["version"]
+        path = os.path.join(DETAILS_DIR, f"{version}.jsonl")
+        if not SchemeStore.exists(path):
+            export_serving_indexes(get_collection(), version)
+        _detail_store = SchemeStore(path)
+    return _detail_store
+
+
+def get_scheme_details(scheme_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Dict[str, any]]:
+    """Full details of the given schemes by id, optionally projected onto `fields`."""
+    store = get_detail_store()
+    return {scheme_id: project_fields(store.get(scheme_id), fields) for scheme_id in scheme_ids if scheme_id in store}
+
+
+def load_serving_indexes(open_collection: bool = True):
+    """
+    Loads what serves queries for the active index, ahead of the first request: the vector
+    index, BM25 and filter indexes and the detail store (plus the Chroma collection when it is
+    the engine and `open_collection` is set; a Chroma client must not be shared across forks).
+    """
+    get_vector_index()
+    get_filter_index()
+    get_detail_store()
+    if settings.HYBRID_SEARCH:
+        get_lexical_index()
+    if settings.VECTOR_ENGINE != "numpy" and open_collection:
+        get_collection()
+
+
+def _load_version(active: Dict[str, str]) -> Dict[str, any]:
+    """The serving indexes of `active`, loaded without touching this worker's current ones."""
+    version = active["version"]
+    directory = os.path.join(VECTORS_DIR, version)
+    details_path = os.path.join(DETAILS_DIR, f"{version}.jsonl")
+    lexical_path = os.path.join(LEXICAL_DIR, f"{version}.pkl")
+    if not os.path.exists(directory) or not SchemeStore.exists(details_path):
+        raise FileNotFoundError(f"Index version {version} has not been exported")
+    vector_index = VectorIndex.load(directory)
+    loaded = {
+        "vector_index": vector_index,
+        "filter_index": FilterIndex(vector_index.metadatas),
+        "detail_store": SchemeStore(details_path),
+        "lexical_index": BM25Index.load(lexical_path) if settings.HYBRID_SEARCH and os.path.exists(lexical_path) else None,
+        "collection": None,
+    }
+    if settings.VECTOR_ENGINE != "numpy":
+        loaded["collection"] = get_chroma_client().get_collection(name=active["collection"])
+    return loaded
+
+
+async def reload_serving_indexes() -> bool:
+    """
+    Switches this worker to the active index if a reindex has swapped in a new version since it
+    loaded its own. The new version is loaded in a thread while the old one keeps serving, then
+    every serving index is replaced at once, so no request mixes the two. True if it switched.
+    """
+    global _serving, _collection, _vector_index, _filter_index, _lexical_index, _detail_store
+    active = get_active_index()
+    if _serving is None or active["version"] == _serving["version"]:
+        # Nothing loaded yet: the first request loads the active version anyway
+        return False
+    loaded = await asyncio.to_thread(_load_version, active)
+    previous = _serving["version"]
+    _serving = active
+    _vector_index = loaded["vector_index"]
+    _filter_index = loaded["filter_index"]
+    _detail_store = loaded["detail_store"]
+    _lexical_index = loaded["lexical_index"]
+    _collection = loaded["collection"]
+    logger.info(f"Switched serving from index version {previous} to {active['version']}")
+    return True
+
+
+async def watch_active_index(interval: float = None):
+    """Reloads the serving indexes whenever the active index pointer changes; runs until cancelled."""
+    interval = interval or settings.INDEX_RELOAD_INTERVAL
+    last_seen = None
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            mtime = os.stat(ACTIVE_INDEX_PATH).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if mtime == last_seen:
+            continue
         try:
-            chroma_client.delete_collection(name=SCHEMES_COLLECTION)
+            await reload_serving_indexes()
+            last_seen = mtime
+        except Exception as e:
+            # Retried on the next tick; the previous version keeps serving meanwhile
+            logger.warning(f"Reloading the serving indexes failed: {e}")
+
+
+def _reset_serving_caches():
+    global _serving, _collection, _vector_index, _filter_index, _lexical_index, _detail_store
+    _serving = None
+    _collection = None
+    _vector_index = None
+    _filter_index = None
+    _lexical_index = None
+    # Not closed: requests in flight may still read the previous version's file
+    _detail_store = None
+
+
+def build_scheme_text(scheme: Dict[str, any]) -> str:
+    """Text that represents a scheme in the embedding space."""
+    return " | ".join(filter(None, [
+        scheme.get("name", "") or "",
+        scheme.get("description", "") or "",
+        "Eligibility: " + (scheme.get("eligibility", "") or ""),
+        # Detail records hold the age text already rendered
+        get_age_text(scheme.get("ageLimits", {})) or scheme.get("ageText") or "",
+        "Tags: " + ", ".join(filter(None, scheme.get("tags", []))) if isinstance(scheme.get("tags"), list) else (scheme.get("tags") or ""),
+        "Categories: " + ", ".join(scheme.get("category", [])) if isinstance(scheme.get("category"), list) else (scheme.get("category") or ""),
+        "State: " + (scheme.get("state") or ""),
+        "Level: " + (scheme.get("level") or ""),
+        "Department: " + (scheme.get("department") or ""),
+        "Benefit Type: " + (scheme.get("benefitType") or ""),
+        "Agency: " + (scheme.get("agency") or ""),
+        "Beneficiaries: " + ", ".join(scheme.get("beneficiaries", [])) if isinstance(scheme.get("beneficiaries"), list) else (scheme.get("beneficiaries") or "")
+    ]))
+
+
+def lexical_text(scheme: Dict[str, any]) -> str:
+    """Text for the BM25 index: the embedded text plus short title and tags, so acronyms and tags match exactly."""
+    tags = scheme.get("tags")
+    return " | ".join(filter(None, [
+        build_scheme_text(scheme),
+        scheme.get("shortTitle") or "",
+        ", ".join(filter(None, tags)) if isinstance(tags, list) else (tags or ""),
+    ]))
+
+
+def _scheme_from_details(details: Dict[str, any]) -> Dict[str, any]:
+    """A detail record as a scheme again: list fields split back out of the comma-joined strings metadata stores them as."""
+    # Missing values (an age limit, an agency) are stored as the string "None"
+    scheme = {key: value for key, value in details.items() if value != "None"}
+    for key in ("tags", "category", "beneficiaries"):
+        # Scraped tags are always a list; an empty category or beneficiaries field is ""
+        if isinstance(scheme.get(key), str) and (scheme[key] or key == "tags"):
+            scheme[key] = [part for part in scheme[key].split(", ") if part and part != "None"]
+    return scheme
+
+
+def _open_shadow_collection(force_reindex: bool):
+    """Reuses the shadow collection of an interrupted run, or starts a new one."""
+    checkpoint = _read_json(CHECKPOINT_PATH)
+    if checkpoint and not force_reindex:
+        try:
+            collection = get_chroma_client().get_collection(name=checkpoint["collection"])
+            print(f"Resuming interrupted reindex into {checkpoint['collection']}")
+            return collection, checkpoint["version"]
+        except Exception:
+            pass
+
+    if checkpoint:
+        try:
+            get_chroma_client().delete_collection(name=checkpoint["collection"])
         except:
             pass
 
-    collection = chroma_client.create_collection(name=SCHEMES_COLLECTION)
+    version = _new_version()
+    name = f"{SCHEMES_COLLECTION}_{version}"
+    collection = _create_collection(name)
+    _write_json_atomic(CHECKPOINT_PATH, {"collection": name, "version": version})
+    return collection, version
+
+
+def _swap_active_collection(name: str, version: str):
+    """
+    Points serving at the freshly built collection. The one it replaces is kept until the next
+    swap, since other workers serve from it until they reload; the one before that is dropped.
+    """
+    active = get_active_index()
+    stale = active.get("previous")
 
+    _write_json_atomic(ACTIVE_INDEX_PATH, {"collection": name, "version": version, "previous": active["collection"]})
+    _reset_serving_caches()
+    checkpoint = _read_json(CHECKPOINT_PATH)
+    # Incremental syncs have no checkpoint and leave an interrupted rebuild's alone
+    if checkpoint and checkpoint["collection"] == name:
+        os.remove(CHECKPOINT_PATH)
+
+    if stale and stale not in (name, active["collection"]):
+        try:
+            get_chroma_client().delete_collection(name=stale)
+        except:
+            pass
+
+
+def _dedupe_schemes(schemes: List[Dict[str, any]]) -> Dict[str, Dict[str, any]]:
+    # Duplicate ids across shards would fail the bulk add; keep the first occurrence
+    unique_schemes = {}
     for scheme in schemes:
-        scheme_id = scheme.get("id")
-
-        text = " | ".join(filter(None, [
-            scheme.get("name", "") or "",
-            scheme.get("description", "") or "",
-            "Eligibility: " + (scheme.get("eligibility", "") or ""),
-            get_age_text(scheme.get("ageLimits", {})) or "",
-            "Tags: " + ", ".join(filter(None, scheme.get("tags", []))) if isinstance(scheme.get("tags"), list) else (scheme.get("tags") or ""),
-            "Categories: " + ", ".join(scheme.get("category", [])) if isinstance(scheme.get("category"), list) else (scheme.get("category") or ""),
-            "State: " + (scheme.get("state") or ""),
-            "Level: " + (scheme.get("level") or ""),
-            "Department: " + (scheme.get("department") or ""),
-            "Benefit Type: " + (scheme.get("benefitType") or ""),
-            "Agency: " + (scheme.get("agency") or ""),
-            "Beneficiaries: " + ", ".join(scheme.get("beneficiaries", [])) if isinstance(scheme.get("beneficiaries"), list) else (scheme.get("beneficiaries") or "")
-        ]))
-
-        response = client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
-        embedding = response.data[0].embedding
+        if scheme.get("id") and scheme["id"] not in unique_schemes:
+            unique_schemes[scheme["id"]] = scheme
+    return unique_schemes
+
+
+def _hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def scheme_hashes(scheme: Dict[str, any]) -> Dict[str, str]:
+    """Content hashes of the embedded text and the stored metadata of a scheme."""
+    return {
+        "text": _hash_text(build_scheme_text(scheme)),
+        "meta": _hash_text(json.dumps(prepare_scheme_for_metadata(scheme), sort_keys=True, ensure_ascii=False)),
+    }
 
-        collection.add(
-            ids=[scheme_id],
-            embeddings=[embedding],
-            metadatas=[prepare_scheme_for_metadata(scheme)]
+
+def _write_manifest(collection_name: str, hashes: Dict[str, Dict[str, str]], seconds_per_text: float):
+    _write_json_atomic(MANIFEST_PATH, {
+        "collection": collection_name,
+        "seconds_per_text": seconds_per_text,
+        "schemes": hashes,
+    })
+
+
+def _copy_rows(source, target, ids: List[str], metadatas: Dict[str, Dict[str, any]], batch_size: int):
+    """Copies the embeddings of `ids` from `source` to `target`, with the metadata in `metadatas` where given."""
+    for i in range(0, len(ids), batch_size):
+        rows = source.get(ids=ids[i:i + batch_size], include=["embeddings", "metadatas"])
+        target.add(
+            ids=rows["ids"],
+            embeddings=rows["embeddings"],
+            metadatas=[metadatas.get(scheme_id, metadata) for scheme_id, metadata in zip(rows["ids"], rows["metadatas"])],
         )
 
-    print("Embeddings indexed and stored successfully.")
 
-# Semantic search using OpenAI embeddings
-async def query_schemes(user_query: str, top_k: int = 10) -> List[Dict[str, any]]:
-    collection = get_collection()
+async def _embed_and_write(collection, schemes, client, batch_size, concurrency, progress: Progress = _no_progress) -> Dict[str, float]:
+    """Embeds `schemes` in concurrent batches and writes each batch with one bulk call."""
+    batches = [schemes[i:i + batch_size] for i in range(0, len(schemes), batch_size)]
+
+    semaphore = asyncio.Semaphore(concurrency)
+    write_lock = asyncio.Lock()
+    indexed = 0
+    start = time.perf_counter()
+
+    async def index_batch(batch: List[Dict[str, any]]):
+        nonlocal indexed
+        async with semaphore:
+            embeddings = await client.embed([build_scheme_text(s) for s in batch])
+
+        async with write_lock:
+            collection.add(
+                ids=[s["id"] for s in batch],
+                embeddings=embeddings,
+                metadatas=[slim_metadata(prepare_scheme_for_metadata(s)) for s in batch]
+            )
+            indexed += len(batch)
+            print(f"Indexed {indexed}/{len(schemes)} schemes")
+            progress("embedding", indexed, len(schemes))
 
-    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-    response = client.embeddings.create(
-        input=user_query,
-        model="text-embedding-3-small"
+    await asyncio.gather(*(index_batch(batch) for batch in batches))
+    return {"calls": len(batches), "seconds": time.perf_counter() - start}
+
+
+# Rebuild index into a shadow collection using batched, concurrent embedding requests
+async def index_schemes(
+    schemes: List[Dict[str, any]],
+    force_reindex: bool = False,
+    embedding_client=None,
+    batch_size: int = None,
+    concurrency: int = None,
+    progress: Progress = _no_progress,
+) -> Dict[str, any]:
+    """
+    Embeds all schemes into a new collection and swaps it in once complete.
+    - Up to `batch_size` texts per embedding request, `concurrency` requests in flight
+    - Each finished batch is written with one `collection.add`, so an interrupted run
+      resumes from the schemes already stored in its shadow collection
+    - `force_reindex` discards any interrupted run and starts over
+    - `progress` is told how many of the pending schemes are embedded, then of the export and swap
+    """
+    client = embedding_client or create_embedding_client()
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    concurrency = concurrency or settings.EMBEDDING_CONCURRENCY
+
+    collection, version = _open_shadow_collection(force_reindex)
+    unique_schemes = _dedupe_schemes(schemes)
+
+    done_ids = set(collection.get(include=[])["ids"])
+    stale_ids = list(done_ids - unique_schemes.keys())
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+
+    pending = [s for scheme_id, s in unique_schemes.items() if scheme_id not in done_ids]
+    print(f"Indexing {len(pending)} schemes ({len(done_ids) - len(stale_ids)} already done)")
+    progress("embedding", 0, len(pending))
+
+    stats = await _embed_and_write(collection, pending, client, batch_size, concurrency, progress=progress)
+    seconds_per_text = stats["seconds"] / len(pending) if pending else 0.0
+
+    _write_manifest(
+        collection.name,
+        {scheme_id: scheme_hashes(s) for scheme_id, s in unique_schemes.items()},
+        seconds_per_text,
     )
+    progress("exporting", len(unique_schemes), len(unique_schemes))
+    export_serving_indexes(collection, version, unique_schemes)
+    progress("swapping", len(unique_schemes), len(unique_schemes))
+    _swap_active_collection(collection.name, version)
+    print("Embeddings indexed and stored successfully.")
+
+    return {
+        "mode": "full",
+        "added": len(unique_schemes),
+        "changed": 0,
+        "metadata_only": 0,
+        "unchanged": 0,
+        "deleted": 0,
+        "embedding_calls": stats["calls"],
+        "embedding_calls_saved": 0,
+        "seconds": stats["seconds"],
+        "seconds_saved": 0.0,
+    }
+
+
+async def update_index(
+    schemes: List[Dict[str, any]],
+    embedding_client=None,
+    batch_size: int = None,
+    concurrency: int = None,
+    progress: Progress = _no_progress,
+) -> Dict[str, any]:
+    """
+    Incrementally syncs the index with `schemes` using the hash manifest.
+    - New schemes and schemes whose embedding text changed are re-embedded
+    - Schemes whose metadata alone changed get a metadata rewrite, keeping their embedding
+    - Schemes missing from `schemes` are dropped
+    The result is built in a new collection, starting from a copy of the serving one's unchanged
+    embeddings, and swapped in like a full rebuild, so the serving collection is never modified.
+    Falls back to a full `index_schemes` when no manifest matches the serving collection.
+    """
+    manifest = _read_json(MANIFEST_PATH)
+    active = get_active_index()
+    if not manifest or manifest.get("collection") != active["collection"]:
+        print("No index manifest for the serving collection, running a full reindex")
+        return await index_schemes(schemes, embedding_client=embedding_client, batch_size=batch_size, concurrency=concurrency, progress=progress)
+
+    client = embedding_client or create_embedding_client()
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    concurrency = concurrency or settings.EMBEDDING_CONCURRENCY
+    start = time.perf_counter()
+
+    unique_schemes = _dedupe_schemes(schemes)
+    previous = manifest["schemes"]
+    hashes = {scheme_id: scheme_hashes(s) for scheme_id, s in unique_schemes.items()}
+
+    added = [s for scheme_id, s in unique_schemes.items() if scheme_id not in previous]
+    changed = [
+        s for scheme_id, s in unique_schemes.items()
+        if scheme_id in previous and previous[scheme_id]["text"] != hashes[scheme_id]["text"]
+    ]
+    metadata_only = [
+        s for scheme_id, s in unique_schemes.items()
+        if scheme_id in previous
+        and previous[scheme_id]["text"] == hashes[scheme_id]["text"]
+        and previous[scheme_id]["meta"] != hashes[scheme_id]["meta"]
+    ]
+    deleted = [scheme_id for scheme_id in previous if scheme_id not in unique_schemes]
+    unchanged = len(unique_schemes) - len(added) - len(changed) - len(metadata_only)
+
+    stats = {"calls": 0, "seconds": 0.0}
+    progress("embedding", 0, len(added) + len(changed))
+    if added or changed or metadata_only or deleted:
+        serving = get_chroma_client().get_collection(name=active["collection"])
+        version = _new_version()
+        collection = _create_collection(f"{SCHEMES_COLLECTION}_{version}")
+        try:
+            reembedded = {s["id"] for s in changed}
+            kept = [scheme_id for scheme_id in unique_schemes if scheme_id in previous and scheme_id not in reembedded]
+            _copy_rows(
+                serving, collection, kept,
+                {s["id"]: slim_metadata(prepare_scheme_for_metadata(s)) for s in metadata_only},
+                COPY_BATCH_SIZE,
+            )
+            stats = await _embed_and_write(collection, added + changed, client, batch_size, concurrency, progress=progress)
+        except BaseException:
+            # Nothing points at it yet; the next sync starts from the serving collection again
+            get_chroma_client().delete_collection(name=collection.name)
+            raise
+    else:
+        collection = get_chroma_client().get_collection(name=active["collection"])
+
+    embedded = len(added) + len(changed)
+    seconds_per_text = stats["seconds"] / embedded if embedded else manifest.get("seconds_per_text", 0.0)
+    full_calls = -(-len(unique_schemes) // batch_size)
+
+    _write_manifest(collection.name, hashes, seconds_per_text)
+    if embedded or metadata_only or deleted:
+        progress("exporting", len(unique_schemes), len(unique_schemes))
+        export_serving_indexes(collection, version, unique_schemes)
+        progress("swapping", len(unique_schemes), len(unique_schemes))
+        _swap_active_collection(collection.name, version)
+
+    report = {
+        "mode": "incremental",
+        "added": len(added),
+        "changed": len(changed),
+        "metadata_only": len(metadata_only),
+        "unchanged": unchanged,
+        "deleted": len(deleted),
+        "embedding_calls": stats["calls"],
+        "embedding_calls_saved": full_calls - stats["calls"],
+        "seconds": time.perf_counter() - start,
+        "seconds_saved": (len(unique_schemes) - embedded) * seconds_per_text,
+    }
+    print(f"Incremental reindex: {report}")
+    return report
+
+async def _vector_search(user_query: str, top_k: int, constraints: Dict[str, any], timer: StageTimer, query_vector: Optional[List[float]] = None) -> List[Dict[str, any]]:
+    if query_vector is not None:
+        query_embedding = query_vector
+    else:
+        with timer.stage("embed"):
+            query_embedding = (await get_embedding_client().embed([user_query]))[0]
+
+    if settings.VECTOR_ENGINE == "numpy":
+        index = get_vector_index()
+        rows = get_filter_index().candidate_rows(constraints) if constraints else None
+        if rows is not None and len(rows) == 0:
+            rows = None
+        with timer.stage("query"):
+            return [index.metadatas[row] for row, _ in index.query(query_embedding, top_k, rows=rows)]
+
+    # Chroma's query is synchronous; keep it off the event loop
+    collection = get_collection()
+    where = build_chroma_where(constraints) if constraints else None
+    with timer.stage("query"):
+        result = await asyncio.to_thread(collection.query, query_embeddings=[query_embedding], n_results=top_k, where=where)
+        if where and not result.get("ids", [[]])[0]:
+            result = await asyncio.to_thread(collection.query, query_embeddings=[query_embedding], n_results=top_k)
 
-    query_embedding = response.data[0].embedding
-    result = collection.query(query_embeddings=[query_embedding], n_results=top_k)
-    
     return result.get("metadatas", [[]])[0]
+
+
+async def _metadatas_by_id(scheme_ids: List[str]) -> Dict[str, Dict[str, any]]:
+    """Stored metadata of BM25 hits, from the configured engine like the vector results they are fused with."""
+    if not scheme_ids:
+        return {}
+    if settings.VECTOR_ENGINE == "numpy":
+        index = get_vector_index()
+        return {scheme_id: index.metadatas[index.row_by_id[scheme_id]] for scheme_id in scheme_ids if scheme_id in index.row_by_id}
+    result = await asyncio.to_thread(get_collection().get, ids=scheme_ids, include=["metadatas"])
+    return dict(zip(result["ids"], result["metadatas"]))
+
+
+# Hybrid search: BM25 and OpenAI embeddings fused by reciprocal rank
+async def query_schemes(
+    user_query: str,
+    top_k: int = 10,
+    constraints: Dict[str, any] = None,
+    timer: Optional[StageTimer] = None,
+    fusion_depth: Optional[int] = None,
+    query_vector: Optional[List[float]] = None,
+) -> List[Dict[str, any]]:
+    """
+    Nearest schemes to `user_query`, restricted to those matching its structured constraints
+    (state, level, age, gender). Constraints are extracted from the query unless passed in;
+    if nothing matches them, the search runs over all schemes.
+    With HYBRID_SEARCH, BM25 results are fused with the vector results, and a confident
+    keyword match (e.g. a scheme acronym) is returned without calling the embedding API.
+    BM25 runs over the version's lexical export whatever the engine; the vector ranking and
+    the metadata returned come from VECTOR_ENGINE.
+    Embedding, vector query and BM25 times are recorded on `timer` as "embed", "query" and "lexical".
+    - `fusion_depth`: the first `fusion_depth` results are those a search with top_k=fusion_depth
+      returns (fused from that many of each ranking), followed by the rest of the top_k
+    - `query_vector`: the embedding of `user_query` when the caller already has it
+    """
+    timer = timer or StageTimer()
+    if constraints is None and settings.SCHEME_PREFILTER:
+        constraints = extract_constraints(user_query)
+
+    if not settings.HYBRID_SEARCH:
+        return await _vector_search(user_query, top_k, constraints, timer, query_vector)
+
+    lexical = get_lexical_index()
+    mask = get_filter_index().mask(constraints) if constraints else None
+    if mask is not None and not mask.any():
+        mask = None
+
+    with timer.stage("lexical"):
+        lexical_hits = lexical.search(user_query, top_k, mask=mask)
+    if lexical.is_confident(user_query, lexical_hits, settings.LEXICAL_SKIP_MAX_TERMS, settings.LEXICAL_SKIP_MARGIN):
+        ids = [lexical.ids[row] for row, _ in lexical_hits]
+        by_id = await _metadatas_by_id(ids)
+        return [by_id[scheme_id] for scheme_id in ids if scheme_id in by_id]
+
+    vector_results = await _vector_search(user_query, top_k, constraints, timer, query_vector)
+    return await _fuse(vector_results, lexical_hits, top_k, fusion_depth)
+
+
+async def _fuse(vector_results: List[Dict[str, any]], lexical_hits, top_k: int, depth: Optional[int] = None) -> List[Dict[str, any]]:
+    """Vector results and BM25 hits merged by reciprocal rank of their ids (see `query_schemes` for `depth`)."""
+    if not lexical_hits:
+        return vector_results
+    rankings = [[m.get("id") for m in vector_results], [get_lexical_index().ids[row] for row, _ in lexical_hits]]
+    fused_ids = reciprocal_rank_fusion(rankings, k=settings.RRF_K)
+    if depth is not None and depth < top_k:
+        # Deeper rankings add votes to ids beyond `depth`, which would reorder the leading results
+        head = reciprocal_rank_fusion([ranking[:depth] for ranking in rankings], k=settings.RRF_K)[:depth]
+        fused_ids = list(dict.fromkeys(head + fused_ids))
+    fused_ids = fused_ids[:top_k]
+    by_id = {m.get("id"): m for m in vector_results}
+    by_id.update(await _metadatas_by_id([scheme_id for scheme_id in fused_ids if scheme_id not in by_id]))
+    return [by_id[scheme_id] for scheme_id in fused_ids if scheme_id in by_id]
+
+
+async def _vector_search_batch(user_queries: List[str], top_k: int, constraints: List[Dict[str, any]], timer: StageTimer) -> List[List[Dict[str, any]]]:
+    if not user_queries:
+        return []
+    with timer.stage("embed"):
+        query_embeddings = await get_embedding_client().embed(user_queries)
+
+    if settings.VECTOR_ENGINE == "numpy":
+        index = get_vector_index()
+        filters = get_filter_index()
+        masks = [filters.mask(c) if c else None for c in constraints]
+        masks = [mask if mask is not None and mask.any() else None for mask in masks]
+        with timer.stage("query"):
+            hits = index.query_batch(query_embeddings, top_k, masks=masks)
+        return [[index.metadatas[row] for row, _ in query_hits] for query_hits in hits]
+
+    # Chroma takes one `where` per call, so queries are grouped by their constraints
+    collection = get_collection()
+    groups: Dict[str, List[int]] = {}
+    wheres = [build_chroma_where(c) if c else None for c in constraints]
+    for i, where in enumerate(wheres):
+        groups.setdefault(json.dumps(where, sort_keys=True), []).append(i)
+    results: List[List[Dict[str, any]]] = [[] for _ in user_queries]
+    with timer.stage("query"):
+        for positions in groups.values():
+            where = wheres[positions[0]]
+            result = await asyncio.to_thread(collection.query, query_embeddings=[query_embeddings[i] for i in positions], n_results=top_k, where=where)
+            for i, metadatas in zip(positions, result.get("metadatas") or []):
+                results[i] = metadatas
+            empty = [i for i in positions if where and not results[i]]
+            if empty:
+                result = await asyncio.to_thread(collection.query, query_embeddings=[query_embeddings[i] for i in empty], n_results=top_k)
+                for i, metadatas in zip(empty, result.get("metadatas") or []):
+                    results[i] = metadatas
+    return results
+
+
+async def query_schemes_batch(user_queries: List[str], top_k: int = 10, timer: Optional[StageTimer] = None) -> List[List[Dict[str, any]]]:
+    """
+    `query_schemes` for many queries at once, e.g. a batch of beneficiary profiles: the queries
+    that need an embedding are embedded in one call and, on the NumPy engine, searched with one
+    matrix product (Chroma: one query per distinct set of constraints). Constraints are
+    extracted from each query. Results are in the order of `user_queries`.
+    """
+    timer = timer or StageTimer()
+    constraints = [extract_constraints(q) if settings.SCHEME_PREFILTER else None for q in user_queries]
+    if not settings.HYBRID_SEARCH:
+        return await _vector_search_batch(user_queries, top_k, constraints, timer)
+
+    lexical = get_lexical_index()
+    filters = get_filter_index()
+    lexical_hits, confident, results = [], [], [None] * len(user_queries)
+    with timer.stage("lexical"):
+        for i, query in enumerate(user_queries):
+            mask = filters.mask(constraints[i]) if constraints[i] else None
+            hits = lexical.search(query, top_k, mask=mask if mask is not None and mask.any() else None)
+            lexical_hits.append(hits)
+            if lexical.is_confident(query, hits, settings.LEXICAL_SKIP_MAX_TERMS, settings.LEXICAL_SKIP_MARGIN):
+                confident.append(i)
+    if confident:
+        by_id = await _metadatas_by_id(list({lexical.ids[row] for i in confident for row, _ in lexical_hits[i]}))
+        for i in confident:
+            results[i] = [by_id[lexical.ids[row]] for row, _ in lexical_hits[i] if lexical.ids[row] in by_id]
+
+    pending = [i for i, result in enumerate(results) if result is None]
+    vector_results = await _vector_search_batch([user_queries[i] for i in pending], top_k, [constraints[i] for i in pending], timer)
+    for i, matched in zip(pending, vector_results):
+        results[i] = await _fuse(matched, lexical_hits[i], top_k)
+    return results
+
+
+def rerank_candidates(user_query: str, query_vector: List[float], candidate_ids: List[str], constraints: Dict[str, any] = None) -> List[Dict[str, any]]:
+    """
+    Re-ranks an earlier search's candidates for a follow-up turn instead of searching every scheme.
+    Candidates failing `constraints` are dropped and the rest are ordered by cosine similarity to
+    `query_vector` (fused with BM25 over the same rows under HYBRID_SEARCH), so the result is
+    the narrowed candidate pool, best first.
+    """
+    index = get_vector_index()
+    rows = np.array([index.row_by_id[scheme_id] for scheme_id in candidate_ids if scheme_id in index.row_by_id], dtype=np.int64)
+    mask = get_filter_index().mask(constraints) if constraints else None
+    if mask is not None:
+        rows = rows[mask[rows]]
+    if len(rows) == 0:
+        return []
+    vector_hits = index.query(query_vector, len(rows), rows=rows)
+    if not settings.HYBRID_SEARCH:
+        return [index.metadatas[row] for row, _ in vector_hits]
+
+    candidate_mask = np.zeros(len(index), dtype=bool)
+    candidate_mask[rows] = True
+    lexical = get_lexical_index()
+    lexical_hits = lexical.search(user_query, len(rows), mask=candidate_mask)
+    fused_ids = reciprocal_rank_fusion(
+        [[index.ids[row] for row, _ in vector_hits], [lexical.ids[row] for row, _ in lexical_hits]],
+        k=settings.RRF_K,
+    )
+    return [index.metadatas[index.row_by_id[scheme_id]] for scheme_id in fused_ids]
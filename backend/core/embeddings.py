@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import math
+import re
+from typing import List
+from core.settings import settings
+from core.utils import EMBEDDINGS_MODEL
+
+EMBEDDING_DIMENSIONS = 1536
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class OpenAIEmbeddingClient:
+    """
+    Embeds texts with the OpenAI embeddings API, many inputs per request.
+    Holds one pooled HTTP connection set for its whole lifetime; at most `max_in_flight`
+    requests run at once and each is bounded by `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        model: str = EMBEDDINGS_MODEL,
+        api_key: str = None,
+        timeout: float = None,
+        max_connections: int = None,
+        max_in_flight: int = None,
+    ):
+        import httpx
+        from openai import AsyncOpenAI
+
+        self.model = model
+        max_connections = max_connections or settings.EMBEDDING_MAX_CONNECTIONS
+        self._http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(timeout or settings.EMBEDDING_TIMEOUT, connect=5.0),
+        )
+        self._client = AsyncOpenAI(
+            api_key=api_key or settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            http_client=self._http_client,
+            max_retries=settings.EMBEDDING_MAX_RETRIES,
+        )
+        self._semaphore = asyncio.Semaphore(max_in_flight or settings.EMBEDDING_MAX_IN_FLIGHT)
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        async with self._semaphore:
+            response = await self._client.embeddings.create(input=texts, model=self.model)
+        # The API documents `index` on every item; don't rely on response order
+        return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+
+    async def close(self):
+        await self._client.close()
+        await self._http_client.aclose()
+
+
+class HashingEmbeddingClient:
+    """
+    Deterministic offline embeddings built from hashed word and character n-grams.
+    Not semantically comparable to OpenAI vectors, but stable across runs, so it can
+    drive benchmarks and local indexing without network access.
+    - `latency` simulates the round trip of a real embeddings request (seconds)
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS, latency: float = 0.0, model: str = "hashing-ngram"):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.model = model
+        self.requests = 0
+
+    def embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        words = _WORD_RE.findall((text or "").lower())
+        features = list(words)
+        features += [f"{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f"#{word}#"
+            features += [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self.embed_one(text) for text in texts]
+
+    async def close(self):
+        pass
+
+
+def create_embedding_client(backend: str = None):
+    """Build the embedding client configured by EMBEDDING_BACKEND."""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "hashing":
+        return HashingEmbeddingClient()
+    if backend == "openai":
+        return OpenAIEmbeddingClient()
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+# Shared client for the request path, created once in the FastAPI lifespan
+_embedding_client = None
+
+
+def get_embedding_client():
+    global _embedding_client
+    if _embedding_client is None:
+        _embedding_client = create_embedding_client()
+    return _embedding_client
+
+
+def set_embedding_client(client):
+    global _embedding_client
+    _embedding_client = client
+
+
+async def close_embedding_client():
+    global _embedding_client
+    if _embedding_client is not None:
+        await _embedding_client.close()
+        _embedding_client = None
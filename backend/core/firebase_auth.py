@@ -1,30 +1,203 @@
-import firebase_admin
-from firebase_admin import auth, credentials
-from fastapi import Depends, HTTPException, Request
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+import httpx
+import jwt
+from cryptography.x509 import load_pem_x509_certificate
+from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from core.settings import settings
-import os
-import json
 
-# Initialize Firebase app only once
-if not firebase_admin._apps:
-    cred_json = settings.FIREBASE_JSON
-    if cred_json:
-        cred_dict = json.loads(cred_json)
-        cred = credentials.Certificate(cred_dict)
-        firebase_admin.initialize_app(cred)
-    else:
-        print("non cred")
-        firebase_admin.initialize_app()
+logger = logging.getLogger(__name__)
+
+ISSUER_PREFIX = "https://securetoken.google.com/"
+_MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+# Signing keys are refreshed this long before the endpoint's max-age runs out
+REFRESH_MARGIN = 300
+# Retry delay after a failed refresh, and the minimum gap between refreshes forced by an unknown key id
+RETRY_INTERVAL = 30
+DEFAULT_MAX_AGE = 3600
+
+
+class TokenVerificationError(Exception):
+    pass
+
+
+def firebase_project_id() -> Optional[str]:
+    """FIREBASE_PROJECT_ID, else the project of the service account in FIREBASE_JSON."""
+    if settings.FIREBASE_PROJECT_ID:
+        return settings.FIREBASE_PROJECT_ID
+    try:
+        return json.loads(settings.FIREBASE_JSON).get("project_id")
+    except (TypeError, ValueError):
+        return None
+
+
+class FirebaseTokenVerifier:
+    """
+    Verifies Firebase ID tokens against Google's published signing certificates, without firebase_admin.
+    - Certificates are fetched with an async client, kept for the endpoint's Cache-Control max-age
+      and refreshed in the background before they expire
+    - Claims of verified tokens are kept in a bounded LRU until the token's own `exp`, so repeat
+      requests with the same token skip signature verification
+    - Signature checks run inline: an RS256 verify takes tens of microseconds, less than a threadpool hop
+    """
+
+    def __init__(self, project_id: str, certs_url: str = None, cache_size: int = None, http_client: httpx.AsyncClient = None):
+        if not project_id:
+            raise ValueError("Firebase project id is not configured (FIREBASE_PROJECT_ID or FIREBASE_JSON)")
+        self.project_id = project_id
+        self.issuer = ISSUER_PREFIX + project_id
+        self.certs_url = certs_url or settings.FIREBASE_CERTS_URL
+        self.cache_size = cache_size or settings.AUTH_CACHE_SIZE
+        self.http = http_client or httpx.AsyncClient(timeout=10)
+        self._keys: Dict[str, any] = {}
+        self._keys_expire_at = 0.0
+        self._last_refresh = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._claims: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.refreshes = 0
+
+    async def start(self):
+        """Fetches the signing keys and starts refreshing them in the background."""
+        try:
+            await self.refresh_keys()
+        except Exception as e:
+            logger.warning(f"Firebase signing keys unavailable at startup, fetching on first request: {e}")
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            await asyncio.gather(self._refresh_task, return_exceptions=True)
+        await self.http.aclose()
+
+    async def refresh_keys(self):
+        async with self._refresh_lock:
+            await self._fetch_keys()
+
+    async def _fetch_keys(self):
+        self._last_refresh = time.time()
+        response = await self.http.get(self.certs_url)
+        response.raise_for_status()
+        keys = {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in response.json().items()
+        }
+        match = _MAX_AGE_RE.search(response.headers.get("cache-control", ""))
+        self._keys = keys
+        self._keys_expire_at = time.time() + (int(match.group(1)) if match else DEFAULT_MAX_AGE)
+        self.refreshes += 1
+
+    def _needs_refresh(self, kid: str) -> bool:
+        now = time.time()
+        # An unknown key id may be a newly rotated key; refetch, but not more than once per interval
+        return now >= self._keys_expire_at or (kid not in self._keys and now - self._last_refresh >= RETRY_INTERVAL)
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(max(RETRY_INTERVAL, self._keys_expire_at - REFRESH_MARGIN - time.time()))
+            try:
+                await self.refresh_keys()
+            except Exception as e:
+                logger.warning(f"Firebase signing key refresh failed: {e}")
+
+    async def _public_key(self, kid: str):
+        if self._needs_refresh(kid):
+            async with self._refresh_lock:
+                # Requests that queued behind one fetch reuse its result
+                if self._needs_refresh(kid):
+                    await self._fetch_keys()
+        key = self._keys.get(kid)
+        if key is None:
+            raise TokenVerificationError("Token signed with an unknown key")
+        return key
+
+    async def verify(self, token: str) -> Dict[str, any]:
+        """Decoded claims of a valid Firebase ID token, with `uid` set; raises otherwise."""
+        now = time.time()
+        cache_key = hashlib.sha256(token.encode("utf-8")).digest()
+        cached = self._claims.get(cache_key)
+        if cached is not None:
+            expires_at, claims = cached
+            if expires_at > now:
+                self._claims.move_to_end(cache_key)
+                self.hits += 1
+                return dict(claims)
+            del self._claims[cache_key]
+
+        self.misses += 1
+        try:
+            header = jwt.get_unverified_header(token)
+            if header.get("alg") != "RS256" or not header.get("kid"):
+                raise TokenVerificationError("Token must be RS256 with a key id")
+            claims = jwt.decode(
+                token,
+                await self._public_key(header["kid"]),
+                algorithms=["RS256"],
+                audience=self.project_id,
+                issuer=self.issuer,
+                options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+            )
+            subject = claims["sub"]
+            if not isinstance(subject, str) or not subject or len(subject) > 128:
+                raise TokenVerificationError("Token has an invalid subject")
+            if claims.get("auth_time", 0) > now:
+                raise TokenVerificationError("Token has an auth_time in the future")
+        except Exception:
+            self.failures += 1
+            raise
+
+        claims["uid"] = subject
+        self._claims[cache_key] = (claims["exp"], claims)
+        while len(self._claims) > self.cache_size:
+            self._claims.popitem(last=False)
+        return dict(claims)
+
+    def stats(self) -> Dict[str, any]:
+        return {
+            "cached_tokens": len(self._claims),
+            "hits": self.hits,
+            "misses": self.misses,
+            "failures": self.failures,
+            "key_refreshes": self.refreshes,
+            "keys": len(self._keys),
+            "keys_expire_in": round(max(0.0, self._keys_expire_at - time.time())),
+        }
+
 
 bearer_scheme = HTTPBearer()
 
-def verify_firebase_token(
+# Shared verifier, started in the FastAPI lifespan
+_token_verifier: Optional[FirebaseTokenVerifier] = None
+
+
+def get_token_verifier() -> FirebaseTokenVerifier:
+    global _token_verifier
+    if _token_verifier is None:
+        _token_verifier = FirebaseTokenVerifier(firebase_project_id())
+    return _token_verifier
+
+
+def set_token_verifier(verifier: Optional[FirebaseTokenVerifier]):
+    global _token_verifier
+    _token_verifier = verifier
+
+
+async def verify_firebase_token(
     credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ):
     token = credentials.credentials
     try:
-        decoded_token = auth.verify_id_token(token)
-        return decoded_token
+        return await get_token_verifier().verify(token)
     except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or missing Firebase ID token.") 
\ No newline at end of file
+        raise HTTPException(status_code=401, detail="Invalid or missing Firebase ID token.")
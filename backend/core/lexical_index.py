@@ -0,0 +1,114 @@
+import pickle
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+_TOKEN_RE = re.compile(r"\w+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "that", "the", "this", "to", "under", "was", "we", "which",
+    "who", "will", "with", "want", "need", "looking", "scheme", "schemes", "any", "am",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[str]:
+    """Fuses ranked id lists: each id scores sum(1 / (k + rank)) over the lists it appears in."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index, one document per scheme.
+    Each posting list holds sorted row numbers and their precomputed BM25 term weights,
+    so a query is a handful of vectorized adds into one score array.
+    """
+
+    def __init__(self, ids: List[str], postings: Dict[str, Tuple[np.ndarray, np.ndarray]]):
+        self.ids = ids
+        self.postings = postings
+
+    @classmethod
+    def build(cls, ids: List[str], texts: List[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        doc_terms = [Counter(tokenize(text)) for text in texts]
+        doc_lengths = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+        avg_length = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+
+        rows_by_term = defaultdict(list)
+        for row, terms in enumerate(doc_terms):
+            for term, freq in terms.items():
+                rows_by_term[term].append((row, freq))
+
+        count = len(texts)
+        postings = {}
+        for term, entries in rows_by_term.items():
+            rows = np.array([row for row, _ in entries], dtype=np.int32)
+            freqs = np.array([freq for _, freq in entries], dtype=np.float32)
+            idf = np.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = k1 * (1 - b + b * doc_lengths[rows] / avg_length)
+            postings[term] = (rows, (idf * freqs * (k1 + 1) / (freqs + norm)).astype(np.float32))
+        return cls(list(ids), postings)
+
+    def search(self, query: str, top_k: int = 10, mask: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """(row, score) pairs of the best matching documents; `mask` restricts the rows considered."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = False
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+                matched = True
+        if not matched:
+            return []
+        if mask is not None:
+            scores[~mask] = 0.0
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            # Every hit tying the k-th score is kept, so ties are broken by row below, whatever top_k
+            kth = scores[hits[np.argpartition(-scores[hits], top_k - 1)[top_k - 1]]]
+            hits = hits[scores[hits] >= kth]
+        hits = hits[np.lexsort((hits, -scores[hits]))][:top_k]
+        return [(int(row), float(scores[row])) for row in hits]
+
+    def contains_all_terms(self, row: int, query: str) -> bool:
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                return False
+            rows = posting[0]
+            position = np.searchsorted(rows, row)
+            if position >= len(rows) or rows[position] != row:
+                return False
+        return True
+
+    def is_confident(self, query: str, hits: List[Tuple[int, float]], max_terms: int, margin: float) -> bool:
+        """
+        True for short keyword queries (an acronym, a scheme title) whose best hit contains
+        every query term and clearly beats the runner-up, so the embedding call can be skipped.
+        """
+        terms = set(tokenize(query))
+        if not hits or not terms or len(terms) > max_terms:
+            return False
+        if not self.contains_all_terms(hits[0][0], query):
+            return False
+        return len(hits) == 1 or hits[0][1] >= margin * hits[1][1]
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump({"ids": self.ids, "postings": self.postings}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        return cls(data["ids"], data["postings"])
@@ -0,0 +1,178 @@
+import asyncio
+import bisect
+import json
+import logging
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+from core.profiling import profile_request
+from core.settings import settings
+from core.timing import StageTimer
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("yojana.trace")
+
+PREFIX = "yojana_"
+# Seconds, from a cache lookup up to a slow agent run
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 15, 20, 25, 50, 100)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 16000)
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    """Monotonic Prometheus counter with fixed label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self.values.items())]
+        return lines
+
+
+class Histogram:
+    """Prometheus histogram with fixed buckets and label names."""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: count in each bucket (non-cumulative, plus +Inf), sum
+        self.series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                bucket_labels = _labels(self.labelnames, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+REQUESTS = Counter("requests_total", "Recommendation requests by endpoint and outcome.", ("endpoint", "outcome"))
+REQUEST_SECONDS = Histogram("request_seconds", "End-to-end recommendation latency.", ("endpoint", "outcome"))
+STAGE_SECONDS = Histogram("stage_seconds", "Latency of each stage of a recommendation request.", ("endpoint", "stage"))
+CANDIDATES = Histogram("candidates", "Schemes retrieved per request.", ("endpoint",), COUNT_BUCKETS)
+RESULTS = Histogram("results", "Schemes returned per request.", ("endpoint",), COUNT_BUCKETS)
+TOKENS = Counter("llm_tokens_total", "Model tokens reported by the API, by agent and kind.", ("agent", "kind"))
+PROMPT_TOKENS = Histogram("llm_prompt_tokens", "Prompt tokens per agent run.", ("agent",), TOKEN_BUCKETS)
+RESPONSE_CACHE = Counter("response_cache_lookups_total", "Response cache lookups per request by result.", ("result",))
+RERANKED = Counter("reranked_total", "Requests through the local reranker: answered directly or passed on to the agents.", ("result",))
+KEPT = Histogram("reranker_kept", "Candidates kept by the reranker's cutoff per request.", ("endpoint",), COUNT_BUCKETS)
+METRICS = [REQUESTS, REQUEST_SECONDS, STAGE_SECONDS, CANDIDATES, RESULTS, TOKENS, PROMPT_TOKENS, RESPONSE_CACHE, RERANKED, KEPT]
+
+
+def observe_request(endpoint: str, timer: StageTimer, outcome: str):
+    """Records one finished request in the metrics and, with TRACE_LOG, as a JSON trace line."""
+    elapsed = timer.elapsed()
+    REQUESTS.inc(endpoint=endpoint, outcome=outcome)
+    REQUEST_SECONDS.observe(elapsed / 1000, endpoint=endpoint, outcome=outcome)
+    for stage, ms in timer.stages.items():
+        STAGE_SECONDS.observe(ms / 1000, endpoint=endpoint, stage=stage)
+    if "candidates" in timer.info:
+        CANDIDATES.observe(timer.info["candidates"], endpoint=endpoint)
+    if "results" in timer.info:
+        RESULTS.observe(timer.info["results"], endpoint=endpoint)
+    for agent, tokens in timer.tokens.items():
+        TOKENS.inc(tokens["prompt"], agent=agent, kind="prompt")
+        TOKENS.inc(tokens["completion"], agent=agent, kind="completion")
+        PROMPT_TOKENS.observe(tokens["prompt"], agent=agent)
+    if "cache" in timer.info:
+        RESPONSE_CACHE.inc(result=timer.info["cache"])
+    if "rerank" in timer.info:
+        RERANKED.inc(result=timer.info["rerank"])
+        KEPT.observe(timer.info["kept"], endpoint=endpoint)
+
+    if settings.TRACE_LOG:
+        trace_logger.info(json.dumps({
+            "request_id": timer.request_id,
+            "endpoint": endpoint,
+            "outcome": outcome,
+            "total_ms": round(elapsed, 1),
+            "stages_ms": {name: round(ms, 1) for name, ms in timer.stages.items()},
+            "tokens": timer.tokens,
+            **timer.info,
+        }, default=str))
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[StageTimer]:
+    """
+    A StageTimer for one request, recorded by `observe_request` when the block exits.
+    The outcome is the `outcome` the request set on `timer.info`, "cancelled" if the client
+    went away, or "error" if it raised.
+    Sampled requests (PROFILE_SAMPLE_RATE) are profiled while the block runs.
+    """
+    timer = StageTimer()
+    outcome = "error"
+    try:
+        with profile_request(timer.request_id):
+            yield timer
+        outcome = timer.info.get("outcome", "ok")
+    except (asyncio.CancelledError, GeneratorExit):
+        # The client went away, e.g. a closed stream
+        outcome = "cancelled"
+        raise
+    finally:
+        try:
+            observe_request(endpoint, timer, outcome)
+        except Exception as e:
+            logger.warning(f"Failed to record request metrics: {e}")
+
+
+def _flatten(prefix: str, stats: Dict[str, any]) -> Iterator[Tuple[str, float]]:
+    for name, value in stats.items():
+        if isinstance(value, dict):
+            yield from _flatten(f"{prefix}_{name}", value)
+        elif isinstance(value, (bool, int, float)):
+            yield f"{prefix}_{name}", float(value)
+
+
+def render_metrics(component_stats: Optional[Dict[str, Dict[str, any]]] = None) -> str:
+    """
+    Prometheus text exposition of the request metrics, plus one gauge per numeric value of
+    each component's `stats()` (e.g. `yojana_embedding_cache_local_hits`).
+    """
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    for component, stats in (component_stats or {}).items():
+        for name, value in _flatten(PREFIX + component, stats):
+            lines += [f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,85 @@
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Optional
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Stack sampler for one thread, using only the standard library.
+    A daemon thread records the target thread's Python stack every `interval` seconds; the
+    result is in collapsed-stack form ("outer;inner;leaf count" per line), which flamegraph.pl
+    and speedscope read directly.
+    - The target is normally the event-loop thread, so concurrent requests are sampled too and
+      time spent waiting on I/O shows up under the loop's selector
+    """
+
+    def __init__(self, thread_id: int = None, interval: float = None):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval or settings.PROFILE_INTERVAL
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return dict(self.samples)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+_profiling = threading.Lock()
+
+
+@contextmanager
+def profile_request(request_id: str):
+    """
+    Profiles the block for a PROFILE_SAMPLE_RATE share of requests, one at a time, and writes
+    the stacks to PROFILE_DIR/<request_id>.folded. Does nothing when the rate is 0.
+    """
+    if settings.PROFILE_SAMPLE_RATE <= 0 or random.random() >= settings.PROFILE_SAMPLE_RATE or not _profiling.acquire(blocking=False):
+        yield
+        return
+    profiler = SamplingProfiler()
+    profiler.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.stop()
+        _profiling.release()
+        path = os.path.join(settings.PROFILE_DIR, f"{request_id}.folded")
+        try:
+            profiler.write(path)
+            logger.info(f"Profiled request {request_id} ({(time.perf_counter() - started) * 1000:.0f}ms, {sum(profiler.samples.values())} samples): {path}")
+        except OSError as e:
+            logger.warning(f"Could not write profile {path}: {e}")
@@ -1,4 +1,13 @@
-import json
+import logging
+import math
+import re
+from typing import Dict, List, Tuple
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Column order of the compact scheme rows in the recommendation prompt
+SCHEME_ROW_HEADER = "id | name | region | for | eligibility | purpose | benefit"
 
 SYSTEM_PROMPT = """
 You are an assistant that helps users find relevant government schemes in India.
@@ -49,17 +58,101 @@ If the user query is too broad or lacks clarity, generate a **single follow-up q
 Your goal is to reduce back-and-forth. Be specific, helpful, and warm. If the user's input is already detailed enough to match schemes accurately, DONT DRAG THE CONVERSTAION. DON'T KEEP ON ASKING QUESTIONS IF ALREADY 2-3 HAVE BEEN ANSWERED. DONT ASK MORE THAN 3 QUESTIONS.
 """
 
-def build_prompt(query: str, schemes: list) -> str:
-    return f"""
+_encoding = None
+_APPROX_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _get_encoding():
+    """tiktoken encoding for MODEL, or None when tiktoken or its encoding files are unavailable."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            from core.utils import MODEL
+
+            _encoding = tiktoken.encoding_for_model(MODEL)
+        except Exception as e:
+            logger.warning(f"tiktoken unavailable, using approximate token counts: {e}")
+            _encoding = False
+    return _encoding or None
+
+
+def tokenizer_name() -> str:
+    encoding = _get_encoding()
+    return encoding.name if encoding else "approximate"
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens of `text` for MODEL, counted locally."""
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text or ""))
+    # Roughly one token per 4 characters of each word, one per punctuation mark
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _APPROX_TOKEN_RE.findall(text or ""))
+
+
+def _short(text: str, limit: int) -> str:
+    text = (text or "").strip()
+    return text[:limit].strip() + ("..." if len(text) > limit else "")
+
+
+def _joined(value) -> str:
+    return ", ".join(map(str, value)) if isinstance(value, list) else (value or "")
+
+
+def build_scheme_row(scheme: Dict[str, any]) -> str:
+    """
+    One-line summary of a scheme for the recommendation prompt, in SCHEME_ROW_HEADER order.
+    Computed once at index time and stored with the scheme metadata.
+    """
+    region = scheme.get("state") or "All India"
+    if scheme.get("level"):
+        region += f" ({scheme['level']})"
+    benefit = " ".join(filter(None, [scheme.get("benefitType") or "", _short(scheme.get("benefits") or scheme.get("amount_range"), 100)]))
+
+    return " | ".join([
+        str(scheme.get("id")),
+        scheme.get("name") or "Unnamed Scheme",
+        region,
+        _joined(scheme.get("beneficiaries")) or "N/A",
+        _short(scheme.get("eligibility"), 150) or "N/A",
+        _short(scheme.get("description") or scheme.get("purpose"), 200) or "N/A",
+        benefit or "N/A",
+    ]).replace("\n", " ")
+
+
+def build_prompt(query: str, scheme_rows: List[str], token_budget: int = None) -> Tuple[str, Dict[str, int]]:
+    """
+    Packs scheme rows, in rank order, into the recommendation prompt until `token_budget` is reached.
+    Returns the prompt and its measured token counts.
+    """
+    token_budget = token_budget or settings.PROMPT_TOKEN_BUDGET
+    header = f"""
 You are a helpful AI that recommends government schemes.
 
 Conversation Context: \"{query}\"
 
-Available Schemes:
-{json.dumps(schemes, indent=2)}
-
+Available Schemes ({SCHEME_ROW_HEADER}):
+"""
+    footer = """
 Only return valid JSON, no extra commentary.
 """
+    used = count_tokens(header) + count_tokens(footer)
+    rows = []
+    for row in scheme_rows:
+        # Rows are joined with newlines, which merge into neighbouring tokens; this over-counts slightly
+        row_tokens = count_tokens(row) + 1
+        if rows and used + row_tokens > token_budget:
+            break
+        rows.append(row)
+        used += row_tokens
+
+    prompt = header + "\n".join(rows) + "\n" + footer
+    return prompt, {
+        "prompt_tokens": count_tokens(prompt),
+        "schemes_included": len(rows),
+        "schemes_dropped": len(scheme_rows) - len(rows),
+    }
 
 def build_decision_prompt(query: str, matches: list) -> str:
     return f"""
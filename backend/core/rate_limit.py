@@ -0,0 +1,233 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+from fastapi import Depends, HTTPException, Request
+from core.firebase_auth import verify_firebase_token
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _Limit:
+    """
+    One user's budget under one rule in this process:
+    - a token bucket (capacity `times`, refilled continuously over `seconds`) enforced locally
+    - the Redis fixed-window count across all processes as of the last sync, plus the
+      requests admitted here since (`pending`), which bound the global total
+    """
+
+    __slots__ = ("tokens", "updated", "window", "global_count", "pending", "syncing")
+
+    def __init__(self, times: int, now: float):
+        self.tokens = float(times)
+        self.updated = now
+        self.window = -1
+        self.global_count = 0
+        self.pending = 0
+        # Set while a flush of this entry's pending count is in flight
+        self.syncing: Optional[asyncio.Future] = None
+
+
+class TieredRateLimiter:
+    """
+    Rate limits decided in-process, with Redis consulted in batches instead of on every request.
+    - Each (key, rule) has a local token bucket, so one process never exceeds the rule on its own
+    - Admitted requests are counted locally and flushed to per-window Redis counters every
+      `sync_interval` seconds, or at once when a key has `sync_batch` unsynced requests; the
+      totals read back bound what every process admits, so the global overshoot is at most
+      `sync_batch` requests per process per window
+    - While Redis is unreachable only the local buckets apply; syncing resumes when it is back
+    - `redis_conn` is a redis.asyncio client, or None for local-only limits
+    """
+
+    KEY_PREFIX = "ratelimit:"
+
+    def __init__(self, redis_conn=None, sync_interval: float = None, sync_batch: int = None, max_keys: int = None):
+        self.redis = redis_conn
+        self.sync_interval = sync_interval or settings.RATE_LIMIT_SYNC_INTERVAL
+        self.sync_batch = sync_batch or settings.RATE_LIMIT_SYNC_BATCH
+        self.max_keys = max_keys or settings.RATE_LIMIT_MAX_KEYS
+        self._limits: Dict[Tuple[str, int, int], _Limit] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+        self.redis_available = redis_conn is not None
+        self.allowed = 0
+        self.denied = 0
+        self.syncs = 0
+        self.sync_errors = 0
+
+    async def start(self):
+        if self.redis is not None:
+            self._sync_task = asyncio.create_task(self._sync_loop())
+
+    async def close(self):
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+            await self.sync()
+
+    def _limit(self, key: str, times: int, seconds: int, now: float) -> _Limit:
+        limit = self._limits.get((key, times, seconds))
+        if limit is None:
+            if len(self._limits) >= self.max_keys:
+                self._evict(now)
+            limit = self._limits[(key, times, seconds)] = _Limit(times, now)
+        # Refill the bucket and roll the global count over into a new window
+        limit.tokens = min(times, limit.tokens + (now - limit.updated) * times / seconds)
+        limit.updated = now
+        window = int(now // seconds)
+        if window != limit.window:
+            limit.window, limit.global_count, limit.pending = window, 0, 0
+        return limit
+
+    def _evict(self, now: float):
+        """Drops idle entries: full buckets with nothing left to sync."""
+        for entry, limit in list(self._limits.items()):
+            _, times, seconds = entry
+            full = limit.tokens + (now - limit.updated) * times / seconds >= times
+            if full and not limit.pending:
+                del self._limits[entry]
+
+    async def hit(self, key: str, times: int, seconds: int, cost: int = 1) -> int:
+        """
+        Admits one request for `key` under `times` per `seconds`: 0 if allowed, else milliseconds to wait.
+        The request takes `cost` tokens of the budget, e.g. one per profile of a batch.
+        """
+        return await self.hit_all(key, [(times, seconds)], cost)
+
+    async def hit_all(self, key: str, rules: List[Tuple[int, int]], cost: int = 1) -> int:
+        """
+        `hit` under several (times, seconds) budgets at once: the request takes `cost` tokens of
+        every budget only if all of them allow it, otherwise of none, and the wait is the longest.
+        """
+        if self.redis_available:
+            for times, seconds in rules:
+                limit = self._limit(key, times, seconds, time.time())
+                if limit.pending >= self.sync_batch:
+                    if limit.syncing is not None:
+                        await limit.syncing
+                    if limit.pending >= self.sync_batch:
+                        await self._flush([((key, times, seconds), limit)])
+
+        # No awaits from here on, so no other request takes tokens between the checks and the updates
+        now = time.time()
+        limits = [(times, seconds, self._limit(key, times, seconds, now)) for times, seconds in rules]
+        wait_ms = 0
+        for times, seconds, limit in limits:
+            if limit.tokens < cost:
+                wait_ms = max(wait_ms, math.ceil((cost - limit.tokens) * seconds / times * 1000))
+            elif self.redis_available and limit.global_count + limit.pending + cost > times:
+                wait_ms = max(wait_ms, math.ceil(((limit.window + 1) * seconds - now) * 1000))
+        if wait_ms:
+            self.denied += 1
+            return wait_ms
+
+        for _, _, limit in limits:
+            limit.tokens -= cost
+            limit.pending += cost
+        self.allowed += 1
+        return 0
+
+    async def sync(self):
+        """Flushes every unsynced count to Redis in one pipeline and reads back the global totals."""
+        await self._flush(list(self._limits.items()))
+
+    async def _flush(self, entries):
+        if self.redis is None:
+            return
+        batch = [(entry, limit, limit.window, limit.pending) for entry, limit in entries if limit.pending and limit.syncing is None]
+        if not batch:
+            return
+        done = asyncio.get_running_loop().create_future()
+        for _, limit, _, _ in batch:
+            limit.syncing = done
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for (key, times, seconds), _, window, pending in batch:
+                    redis_key = f"{self.KEY_PREFIX}{key}:{times}/{seconds}:{window}"
+                    pipe.incrby(redis_key, pending)
+                    pipe.expire(redis_key, seconds)
+                results = await pipe.execute()
+        except Exception as e:
+            self.sync_errors += 1
+            if self.redis_available:
+                logger.warning(f"Rate limiter Redis sync failed, enforcing local limits only: {e}")
+            self.redis_available = False
+            return
+        else:
+            self.redis_available = True
+            self.syncs += 1
+            for (_, limit, window, pending), total in zip(batch, results[::2]):
+                if limit.window == window:
+                    limit.pending -= pending
+                    limit.global_count = max(limit.global_count, int(total))
+        finally:
+            for _, limit, _, _ in batch:
+                limit.syncing = None
+            done.set_result(None)
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            try:
+                await self.sync()
+            except Exception as e:
+                logger.warning(f"Rate limiter sync failed: {e}")
+
+    def stats(self) -> Dict[str, any]:
+        return {
+            "keys": len(self._limits),
+            "allowed": self.allowed,
+            "denied": self.denied,
+            "syncs": self.syncs,
+            "sync_errors": self.sync_errors,
+            "redis_available": self.redis_available,
+        }
+
+
+_rate_limiter: Optional[TieredRateLimiter] = None
+
+
+def get_rate_limiter() -> TieredRateLimiter:
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = TieredRateLimiter()
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[TieredRateLimiter]):
+    global _rate_limiter
+    _rate_limiter = limiter
+
+
+async def enforce_rate_limit(key: str, times: int, seconds: int, cost: int = 1):
+    """Takes `cost` tokens of `key`'s budget of `times` per `seconds`, or responds 429 with Retry-After."""
+    await enforce_rate_limits(key, [(times, seconds)], cost)
+
+
+async def enforce_rate_limits(key: str, rules: List[Tuple[int, int]], cost: int = 1):
+    """`enforce_rate_limit` under every (times, seconds) rule; no budget is charged unless all allow it."""
+    wait_ms = await get_rate_limiter().hit_all(key, rules, cost)
+    if wait_ms:
+        raise HTTPException(
+            status_code=429,
+            detail="Too Many Requests",
+            headers={"Retry-After": str(math.ceil(wait_ms / 1000))},
+        )
+
+
+class RateLimiter:
+    """
+    Route dependency allowing `times` requests per `seconds` per Firebase user, on the shared
+    TieredRateLimiter. Responds 429 with Retry-After when the limit is reached. The budget is the
+    route's own unless routes doing the same work name a shared `key`.
+    """
+
+    def __init__(self, times: int, seconds: int, key: Optional[str] = None):
+        self.times = times
+        self.seconds = seconds
+        self.key = key
+
+    async def __call__(self, request: Request, user=Depends(verify_firebase_token)):
+        await enforce_rate_limit(f"{user['uid']}:{self.key or request.scope['path']}", self.times, self.seconds)
@@ -0,0 +1,234 @@
+import fcntl
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Dict, Optional, Tuple
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+TERMINAL = ("succeeded", "failed")
+
+# Compare-and-act on the job lock, so a worker only extends or releases it while it still holds it
+REFRESH_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+class LocalKV:
+    """
+    Stand-in for the few Redis commands the job store uses (GET, SET with NX/PX, DEL, and EVAL of
+    REFRESH_LOCK and RELEASE_LOCK), one file per key in `directory`, for running the API and the
+    reindex worker on one machine without Redis. Writes are atomic and NX uses link(), which fails
+    if the key exists; NX sets and the scripts hold an flock on the directory's lock file.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock_path = os.path.join(directory, ".lock")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace(":", "_"))
+
+    def _exclusive(self):
+        """An open file holding the directory's exclusive flock until it is closed."""
+        f = open(self.lock_path, "a")
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if entry["expires"] is not None and entry["expires"] <= time.time():
+            return None
+        return entry["value"]
+
+    async def get(self, key: str) -> Optional[str]:
+        return self._read(self._path(key))
+
+    async def set(self, key: str, value: str, nx: bool = False, px: int = None) -> Optional[bool]:
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"value": value, "expires": time.time() + px / 1000 if px else None}, f)
+        try:
+            if not nx:
+                os.replace(tmp_path, path)
+                return True
+            with self._exclusive():
+                if os.path.exists(path) and self._read(path) is None:
+                    # Expired: free the key for this NX set
+                    os.remove(path)
+                try:
+                    os.link(tmp_path, path)
+                    return True
+                except FileExistsError:
+                    return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        return deleted
+
+    async def eval(self, script: str, numkeys: int, key: str, value: str, *args) -> int:
+        """REFRESH_LOCK or RELEASE_LOCK on `key`: 1 if it held `value` (and was extended or deleted), else 0."""
+        path = self._path(key)
+        with self._exclusive():
+            if self._read(path) != value:
+                return 0
+            if script == RELEASE_LOCK:
+                os.remove(path)
+                return 1
+            if script != REFRESH_LOCK:
+                raise NotImplementedError("LocalKV only runs the job lock scripts")
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"value": value, "expires": time.time() + int(args[0]) / 1000}, f)
+            os.replace(tmp_path, path)
+            return 1
+
+
+class ReindexJobs:
+    """
+    Reindex jobs, one at a time: the API enqueues them and `service/reindex_worker.py` runs them.
+    A job is a JSON record with its status (queued, running, succeeded, failed), options and
+    progress, kept for JOB_TTL. `reindex:current` holds the id of the queued or running job, so
+    a second enqueue returns that job instead of starting another rebuild.
+    A worker claims a job by taking `reindex:lock` and keeps it by heartbeat; a running job
+    whose heartbeat stops for REINDEX_STALE_AFTER seconds (a crashed or stalled worker) is
+    claimed again and resumes from the indexer's checkpoint. The lock is only extended or
+    released by the worker holding it, so a stalled worker that wakes up learns it lost the job.
+    - `kv` is a redis.asyncio client with decode_responses=True, or a `LocalKV`
+    """
+
+    CURRENT_KEY = "reindex:current"
+    LAST_KEY = "reindex:last"
+    LOCK_KEY = "reindex:lock"
+    JOB_PREFIX = "reindex:job:"
+
+    def __init__(self, kv=None):
+        self.kv = kv if kv is not None else LocalKV(os.path.join(settings.CHROMA_PERSIST_DIR, "jobs"))
+        self.stale_after = settings.REINDEX_STALE_AFTER
+
+    async def get(self, job_id: str) -> Optional[Dict[str, any]]:
+        raw = await self.kv.get(self.JOB_PREFIX + job_id)
+        return json.loads(raw) if raw else None
+
+    async def save(self, job: Dict[str, any]):
+        await self.kv.set(self.JOB_PREFIX + job["id"], json.dumps(job), px=settings.REINDEX_JOB_TTL * 1000)
+
+    async def enqueue(self, force_reindex: bool = False, incremental: bool = True) -> Tuple[Dict[str, any], bool]:
+        """The new job and True, or the job already queued or running and False."""
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "force_reindex": force_reindex,
+            "incremental": incremental,
+            "created": time.time(),
+            "phase": None,
+            "processed": 0,
+            "total": None,
+        }
+        await self.save(job)
+        if await self.kv.set(self.CURRENT_KEY, job["id"], nx=True):
+            return job, True
+        await self.kv.delete(self.JOB_PREFIX + job["id"])
+        current = await self.current()
+        if current is not None and current["status"] not in TERMINAL:
+            return current, False
+        # The current job finished in between
+        await self.kv.delete(self.CURRENT_KEY)
+        return await self.enqueue(force_reindex, incremental)
+
+    async def current(self) -> Optional[Dict[str, any]]:
+        """The queued or running job, else the last one to finish."""
+        job_id = await self.kv.get(self.CURRENT_KEY) or await self.kv.get(self.LAST_KEY)
+        return await self.get(job_id) if job_id else None
+
+    async def claim(self, owner: str) -> Optional[Dict[str, any]]:
+        """Takes the current job for `owner` if it is queued, or running under a worker that stopped."""
+        job_id = await self.kv.get(self.CURRENT_KEY)
+        job = await self.get(job_id) if job_id else None
+        if job is None:
+            if job_id:
+                # Its record expired; nothing left to run
+                await self.kv.delete(self.CURRENT_KEY)
+            return None
+        if job["status"] == "running" and time.time() - job.get("heartbeat", 0) < self.stale_after:
+            return None
+        if not await self.kv.set(self.LOCK_KEY, owner, nx=True, px=int(self.stale_after * 1000)):
+            return None
+        if job["status"] == "running":
+            logger.warning(f"Reindex job {job['id']} lost its worker {job.get('worker')}, resuming it")
+        job.update(status="running", worker=owner, started=job.get("started") or time.time(), heartbeat=time.time())
+        await self.save(job)
+        return job
+
+    async def refresh_lock(self, owner: str) -> bool:
+        """Extends the lock by REINDEX_STALE_AFTER if `owner` still holds it; False if another worker took the job."""
+        return bool(await self.kv.eval(REFRESH_LOCK, 1, self.LOCK_KEY, owner, int(self.stale_after * 1000)))
+
+    async def heartbeat(self, job: Dict[str, any], owner: str) -> bool:
+        """Keeps the job's lock and saves its progress; False, saving nothing, once `owner` lost the lock."""
+        if not await self.refresh_lock(owner):
+            return False
+        job["heartbeat"] = time.time()
+        await self.save(job)
+        return True
+
+    async def finish(self, job: Dict[str, any], owner: str, status: str, **fields) -> bool:
+        """Records the job's outcome and frees the queue; False, recording nothing, once `owner` lost the lock."""
+        if not await self.refresh_lock(owner):
+            return False
+        job.update(status=status, finished=time.time(), **fields)
+        await self.save(job)
+        await self.kv.set(self.LAST_KEY, job["id"], px=settings.REINDEX_JOB_TTL * 1000)
+        await self.kv.delete(self.CURRENT_KEY)
+        await self.kv.eval(RELEASE_LOCK, 1, self.LOCK_KEY, owner)
+        return True
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def create_reindex_jobs(redis_conn=None) -> ReindexJobs:
+    """Jobs in Redis with REINDEX_QUEUE=redis (the API and the worker must share it), else the local stand-in."""
+    return ReindexJobs(redis_conn if settings.REINDEX_QUEUE == "redis" else None)
+
+
+_reindex_jobs: Optional[ReindexJobs] = None
+
+
+def get_reindex_jobs() -> Optional[ReindexJobs]:
+    """The shared job store, or None when it is not set up (scripts, benchmarks)."""
+    return _reindex_jobs
+
+
+def set_reindex_jobs(jobs: Optional[ReindexJobs]):
+    global _reindex_jobs
+    _reindex_jobs = jobs
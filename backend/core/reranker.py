@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from core.embedding_search import get_lexical_index, get_serving_index, get_vector_index
+from core.lexical_index import tokenize
+from core.scheme_filters import extract_constraints, is_central, purpose_terms
+from core.settings import settings
+from core.utils import MAX_AGE_CEILING, MIN_AGE_FLOOR
+
+logger = logging.getLogger(__name__)
+# One JSON line per agent run: the candidates in its prompt and the ones it picked, for training
+selection_logger = logging.getLogger("yojana.selections")
+
+# Per-candidate features, each in [0, 1]. Similarity and BM25 are scaled within the candidate
+# list, so the weights carry over between embedding models and index sizes.
+FEATURES = (
+    "similarity",      # cosine similarity to the query, min-max scaled over the candidates
+    "bm25",            # BM25 score over the candidates, divided by the best one
+    "retrieval_rank",  # 1 / (1 + position in the retrieved list)
+    "title_overlap",   # share of the query's purpose terms in the scheme's name and short title
+    "category_overlap",  # ... in its categories
+    "term_coverage",   # ... anywhere in its indexed text, tags included
+    "state_match",     # the user's state is the scheme's state
+    "central",         # a central scheme, open in every state
+    "age_match",       # the scheme has an age range and the user's age is in it
+    "female_match",    # a scheme for women, and the user is a woman
+    "gender_conflict",  # a scheme for women, and the user is a man
+)
+
+# Used until a model is trained (python -m service.train_reranker)
+DEFAULT_MODEL = {
+    "weights": {
+        "similarity": 2.0, "bm25": 2.0, "retrieval_rank": 2.0, "title_overlap": 1.5, "category_overlap": 0.5,
+        "term_coverage": 1.5, "state_match": 1.0, "central": 0.0, "age_match": 0.5, "female_match": 0.5,
+        "gender_conflict": -2.0,
+    },
+    "bias": -7.0,
+}
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _scale(values: np.ndarray) -> np.ndarray:
+    low, high = float(values.min()), float(values.max())
+    if high - low < 1e-9:
+        return np.ones_like(values)
+    return (values - low) / (high - low)
+
+
+def _overlap(terms: List[str], text: str) -> float:
+    if not terms:
+        return 0.0
+    words = set(tokenize(text))
+    return sum(term in words for term in terms) / len(terms)
+
+
+def candidate_features(query: str, query_vector: List[float], candidates: List[Dict[str, any]]) -> np.ndarray:
+    """One row of FEATURES per candidate, in the order of `candidates`."""
+    index = get_vector_index()
+    count = len(candidates)
+    features = np.zeros((count, len(FEATURES)), dtype=np.float32)
+    if not count:
+        return features
+    column = {name: i for i, name in enumerate(FEATURES)}
+    terms = sorted(set(purpose_terms(query)))
+    rows = np.array([index.row_by_id.get(c.get("id"), -1) for c in candidates], dtype=np.int64)
+    known = rows >= 0
+
+    if known.any():
+        vector = np.asarray(query_vector, dtype=np.float32)
+        similarity = np.full(count, -1.0, dtype=np.float32)
+        similarity[known] = index.matrix[rows[known]] @ (vector / (np.linalg.norm(vector) or 1.0))
+        features[known, column["similarity"]] = _scale(similarity[known])
+
+        lexical = get_lexical_index()
+        candidate_mask = np.zeros(len(index), dtype=bool)
+        candidate_mask[rows[known]] = True
+        bm25 = dict(lexical.search(query, count, mask=candidate_mask))
+        best = max(bm25.values(), default=0.0)
+        if best > 0:
+            features[:, column["bm25"]] = [bm25.get(int(row), 0.0) / best for row in rows]
+
+        if terms:
+            coverage = np.zeros(count, dtype=np.float32)
+            for term in terms:
+                posting = lexical.postings.get(term)
+                if posting is not None:
+                    coverage += np.isin(rows, posting[0])
+            features[:, column["term_coverage"]] = coverage / len(terms)
+
+    features[:, column["retrieval_rank"]] = 1.0 / (1.0 + np.arange(count))
+
+    constraints = extract_constraints(query)
+    for i, candidate in enumerate(candidates):
+        features[i, column["title_overlap"]] = _overlap(terms, f"{candidate.get('name') or ''} {candidate.get('shortTitle') or ''}")
+        features[i, column["category_overlap"]] = _overlap(terms, candidate.get("category") or "")
+        central = is_central(candidate)
+        features[i, column["central"]] = central
+        if constraints["state"]:
+            features[i, column["state_match"]] = not central and candidate.get("state") == constraints["state"]
+        min_age = candidate.get("minAge", MIN_AGE_FLOOR)
+        max_age = candidate.get("maxAge", MAX_AGE_CEILING)
+        if constraints["age"] is not None and (min_age > MIN_AGE_FLOOR or max_age < MAX_AGE_CEILING):
+            features[i, column["age_match"]] = min_age <= constraints["age"] <= max_age
+        if candidate.get("femaleOnly"):
+            features[i, column["female_match"]] = constraints["gender"] == "female"
+            features[i, column["gender_conflict"]] = constraints["gender"] == "male"
+    return features
+
+
+def explain(query: str, candidate: Dict[str, any]) -> str:
+    """Short reason for a scheme returned without the recommendation agent, from what it matched."""
+    constraints = extract_constraints(query)
+    terms = sorted(set(purpose_terms(query)))
+    covered = []
+    lexical = get_lexical_index()
+    row = get_vector_index().row_by_id.get(candidate.get("id"))
+    if row is not None:
+        covered = [term for term in terms if lexical.contains_all_terms(row, term)]
+    parts = [f"Matches {', '.join(covered[:4])}"] if covered else []
+    if constraints["state"] and candidate.get("state") == constraints["state"] and not is_central(candidate):
+        parts.append(f"offered in {constraints['state']}")
+    elif constraints["state"] and is_central(candidate):
+        parts.append("a central scheme open in every state")
+    if constraints["age"] is not None and candidate.get("minAge", MIN_AGE_FLOOR) <= constraints["age"] <= candidate.get("maxAge", MAX_AGE_CEILING):
+        if candidate.get("minAge", MIN_AGE_FLOOR) > MIN_AGE_FLOOR or candidate.get("maxAge", MAX_AGE_CEILING) < MAX_AGE_CEILING:
+            parts.append(f"open to applicants aged {constraints['age']}")
+    if candidate.get("femaleOnly") and constraints["gender"] == "female":
+        parts.append("meant for women")
+    if not parts:
+        return "Closest match to what you described."
+    reason = "; ".join(parts)
+    return reason[0].upper() + reason[1:] + "."
+
+
+class Reranker:
+    """
+    Local second-stage ranker: logistic regression over `candidate_features`, giving each
+    retrieved candidate the probability that the recommendation agent would pick it.
+    `rank` reorders the candidates, `cutoff` decides how many go on to the agent, and
+    `clear_winner` tells when the best one wins by enough to answer without the agent.
+    Weights are trained offline by `service/train_reranker.py` and loaded from a JSON file.
+    """
+
+    def __init__(self, weights: Dict[str, float], bias: float, metadata: Optional[Dict[str, any]] = None):
+        self.weights = np.array([weights.get(name, 0.0) for name in FEATURES], dtype=np.float32)
+        self.bias = float(bias)
+        self.metadata = metadata or {}
+        self.calls = 0
+        self.direct = 0
+        self.candidates = 0
+        self.kept = 0
+        self.ms = 0.0
+
+    @classmethod
+    def load(cls, path: str = None) -> "Reranker":
+        path = path or settings.RERANKER_MODEL
+        try:
+            with open(path, encoding="utf-8") as f:
+                model = json.load(f)
+        except FileNotFoundError:
+            logger.warning(f"No reranker model at {path}, using the default weights")
+            model = DEFAULT_MODEL
+        # The similarity feature's weight only means something for the embeddings it was trained on
+        backend = model.get("trained", {}).get("embedding_backend")
+        if backend is not None and backend != settings.EMBEDDING_BACKEND:
+            raise ValueError(
+                f"Reranker model {path} was trained on {backend} embeddings, not {settings.EMBEDDING_BACKEND}; "
+                "retrain it with python -m service.train_reranker or set RERANK=false"
+            )
+        return cls(model["weights"], model["bias"], {k: v for k, v in model.items() if k not in ("weights", "bias")})
+
+    def save(self, path: str):
+        model = {
+            **self.metadata,
+            "features": list(FEATURES),
+            "weights": {name: round(float(w), 4) for name, w in zip(FEATURES, self.weights)},
+            "bias": round(self.bias, 4),
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(model, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def score(self, features: np.ndarray) -> np.ndarray:
+        return _sigmoid(features @ self.weights + self.bias)
+
+    def rank(self, query: str, query_vector: List[float], candidates: List[Dict[str, any]]) -> Tuple[List[Dict[str, any]], np.ndarray]:
+        """`candidates` best first by the model, with their scores."""
+        scores = self.score(candidate_features(query, query_vector, candidates))
+        # Stable, so ties keep the retrieval order
+        order = np.argsort(-scores, kind="stable")
+        return [candidates[i] for i in order], scores[order]
+
+    def cutoff(self, scores: np.ndarray) -> int:
+        """
+        How many of the ranked candidates to keep: those scoring at least RERANK_CUTOFF_RATIO of
+        the best and at least RERANK_MIN_SCORE, no fewer than RERANK_MIN_KEEP and no more than
+        RERANK_MAX_KEEP. A flat score list (a vague query) keeps more than a peaked one.
+        """
+        if not len(scores):
+            return 0
+        threshold = max(settings.RERANK_MIN_SCORE, float(scores[0]) * settings.RERANK_CUTOFF_RATIO)
+        keep = int((scores >= threshold).sum())
+        return min(len(scores), max(settings.RERANK_MIN_KEEP, min(keep, settings.RERANK_MAX_KEEP)))
+
+    def clear_winner(self, scores: np.ndarray) -> bool:
+        """True when the best candidate scores RERANK_DIRECT_SCORE and leads the next by RERANK_DIRECT_MARGIN."""
+        if not len(scores) or scores[0] < settings.RERANK_DIRECT_SCORE:
+            return False
+        return len(scores) == 1 or scores[0] - scores[1] >= settings.RERANK_DIRECT_MARGIN
+
+    def record(self, candidates: int, kept: int, direct: bool, ms: float):
+        self.calls += 1
+        self.candidates += candidates
+        self.kept += kept
+        self.direct += direct
+        self.ms += ms
+
+    def stats(self) -> Dict[str, any]:
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "direct": self.direct,
+            "direct_rate": round(self.direct / calls, 4),
+            "mean_candidates": round(self.candidates / calls, 2),
+            "mean_kept": round(self.kept / calls, 2),
+            "mean_ms": round(self.ms / calls, 3),
+        }
+
+
+def log_selection(query: str, candidate_ids: List[str], picked_ids: List[str]):
+    """Logs which of the prompt's candidates the recommendation agent picked, for training the reranker."""
+    if settings.RERANK_LOG_SELECTIONS:
+        selection_logger.info(json.dumps({
+            "query": query,
+            "version": get_serving_index()["version"],
+            "candidates": candidate_ids,
+            "picked": picked_ids,
+        }, ensure_ascii=False))
+
+
+def read_selections(path: str) -> List[Dict[str, any]]:
+    """Selections logged by `log_selection`; anything before the JSON on a line (a log prefix) is ignored."""
+    selections = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            start = line.find("{")
+            # Other loggers' lines in the same log file
+            if start < 0 or (start > 0 and "yojana.selections" not in line[:start]):
+                continue
+            try:
+                selection = json.loads(line[start:])
+            except json.JSONDecodeError:
+                continue
+            if isinstance(selection, dict) and "candidates" in selection and "picked" in selection:
+                selections.append(selection)
+    return selections
+
+
+_reranker: Optional[Reranker] = None
+
+
+def get_reranker() -> Optional[Reranker]:
+    """The shared reranker, or None when reranking is not set up (scripts, benchmarks)."""
+    return _reranker
+
+
+def set_reranker(reranker: Optional[Reranker]):
+    global _reranker
+    _reranker = reranker
@@ -0,0 +1,236 @@
+import hashlib
+import json
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+from core.embedding_cache import LRUCache, encode_vector, normalize_query
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def projection_key(fields: Optional[List[str]] = None) -> str:
+    return ",".join(sorted(fields)) if fields else "*"
+
+
+def response_key(conversation: str, fields: Optional[List[str]] = None) -> str:
+    return hashlib.sha256(f"{projection_key(fields)}\0{normalize_query(conversation)}".encode("utf-8")).hexdigest()
+
+
+def is_followup(response: Dict[str, any]) -> bool:
+    """A follow-up question rather than recommendations (as built by `parse_decision`)."""
+    return "followup_needed" in response
+
+
+class ResponseCache:
+    """
+    Caches whole /recommend responses, namespaced by index version so a reindex invalidates them.
+    - Exact hits: the normalized conversation text (plus the requested field projection)
+    - Near hits: a cached conversation whose embedding is within `threshold` cosine similarity
+      and whose retrieved candidates overlap the new ones by at least `min_overlap`. Only
+      recommendations are served this way: a follow-up question was asked about one conversation
+      and may ask for something another already said, so follow-ups are exact hits only
+    Entries live in an in-process LRU and, when `redis_conn` is given, in Redis with a TTL.
+    Every key stored for an index version is also pushed to `<prefix><version>:near`, which each
+    process mirrors incrementally into a fixed-size NumPy ring for the near-hit search.
+    - `redis_conn` must be a binary (decode_responses=False) redis.asyncio client
+    """
+
+    KEY_PREFIX = "resp:"
+
+    def __init__(
+        self,
+        redis_conn=None,
+        ttl: float = None,
+        threshold: float = None,
+        min_overlap: float = None,
+        max_items: int = None,
+    ):
+        self.redis = redis_conn
+        self.ttl = ttl or settings.RESPONSE_CACHE_TTL
+        self.threshold = threshold or settings.RESPONSE_CACHE_THRESHOLD
+        self.min_overlap = min_overlap if min_overlap is not None else settings.RESPONSE_CACHE_MIN_OVERLAP
+        self.max_items = max_items or settings.RESPONSE_CACHE_SIZE
+        self.local = LRUCache(self.max_items, self.ttl)
+
+        # Near-hit mirror of the current version: a ring of normalized vectors and candidate id sets
+        self._reset_mirror(None)
+
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+        self.saved_ms = 0.0
+
+    def _redis_key(self, version: str, suffix: str) -> str:
+        return f"{self.KEY_PREFIX}{version}:{suffix}"
+
+    def _reset_mirror(self, version: Optional[str]):
+        self.version = version
+        self.synced = 0
+        self.near_keys: List[Optional[str]] = []
+        self.near_candidates: List[set] = []
+        self.near_vectors: Optional[np.ndarray] = None
+        self._mirrored = set()
+        self._next = 0
+
+    def _add_to_mirror(self, key: str, vector: np.ndarray, candidates: List[str]):
+        if key in self._mirrored:
+            return
+        if self.near_vectors is None:
+            self.near_vectors = np.zeros((self.max_items, len(vector)), dtype=np.float32)
+        slot = self._next % self.max_items
+        if slot < len(self.near_keys):
+            self._mirrored.discard(self.near_keys[slot])
+            self.near_keys[slot], self.near_candidates[slot] = key, set(candidates)
+        else:
+            self.near_keys.append(key)
+            self.near_candidates.append(set(candidates))
+        self.near_vectors[slot] = vector / (np.linalg.norm(vector) or 1.0)
+        self._mirrored.add(key)
+        self._next += 1
+
+    async def _sync(self, version: str):
+        """Brings the near-hit mirror up to date with entries other processes stored."""
+        if version != self.version:
+            self._reset_mirror(version)
+        if not self.redis:
+            return
+        try:
+            listed = await self.redis.lrange(self._redis_key(version, "near"), self.synced, -1)
+            new_keys = [key.decode() for key in listed if key.decode() not in self._mirrored]
+            entries = await self.redis.mget([self._redis_key(version, key) for key in new_keys]) if new_keys else []
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Response cache Redis sync failed: {e}")
+            return
+        self.synced += len(listed)
+        for key, raw in zip(new_keys, entries):
+            if raw is not None:
+                entry = json.loads(raw)
+                self._add_to_mirror(key, np.frombuffer(bytes.fromhex(entry["vector"]), dtype=np.float32), entry["candidates"])
+
+    async def _load(self, version: str, key: str) -> Optional[Dict[str, any]]:
+        raw = self.local.get(f"{version}:{key}")
+        if raw is None and self.redis:
+            try:
+                raw = await self.redis.get(self._redis_key(version, key))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Response cache Redis read failed: {e}")
+            if raw is not None:
+                self.local.set(f"{version}:{key}", raw)
+        return json.loads(raw) if raw is not None else None
+
+    def _hit(self, entry: Dict[str, any], started: float) -> Dict[str, any]:
+        self.saved_ms += max(0.0, entry["compute_ms"] - (time.perf_counter() - started) * 1000)
+        return entry["response"]
+
+    async def get_exact(self, version: str, conversation: str, fields: Optional[List[str]] = None) -> Optional[Dict[str, any]]:
+        """Cached response for this exact (normalized) conversation; a miss is counted by `get_near`."""
+        started = time.perf_counter()
+        entry = await self._load(version, response_key(conversation, fields))
+        if entry is None:
+            return None
+        self.exact_hits += 1
+        return self._hit(entry, started)
+
+    async def get_near(
+        self,
+        version: str,
+        embed_query: Callable[[], Awaitable[List[float]]],
+        candidates: List[str],
+        fields: Optional[List[str]] = None,
+    ) -> Optional[Dict[str, any]]:
+        """
+        Closest cached response within the cosine threshold whose candidates overlap enough.
+        `embed_query` is only awaited when there are cached entries to compare against.
+        """
+        started = time.perf_counter()
+        await self._sync(version)
+        if self.near_keys and candidates:
+            query = np.asarray(await embed_query(), dtype=np.float32)
+            scores = self.near_vectors[:len(self.near_keys)] @ (query / (np.linalg.norm(query) or 1.0))
+            projection = projection_key(fields)
+            wanted = set(candidates)
+            for row in np.argsort(-scores):
+                if scores[row] < self.threshold:
+                    break
+                if len(wanted & self.near_candidates[row]) / len(wanted) < self.min_overlap:
+                    continue
+                entry = await self._load(version, self.near_keys[row])
+                if entry is None or entry["projection"] != projection or is_followup(entry["response"]):
+                    continue
+                self.near_hits += 1
+                return self._hit(entry, started)
+        self.misses += 1
+        return None
+
+    async def store(
+        self,
+        version: str,
+        conversation: str,
+        fields: Optional[List[str]],
+        vector: List[float],
+        candidates: List[str],
+        response: Dict[str, any],
+        compute_ms: float,
+    ):
+        key = response_key(conversation, fields)
+        raw = json.dumps({
+            "response": response,
+            "projection": projection_key(fields),
+            "candidates": candidates,
+            "vector": encode_vector(vector).hex(),
+            "compute_ms": compute_ms,
+        }, ensure_ascii=False).encode("utf-8")
+        self.local.set(f"{version}:{key}", raw)
+        self.stores += 1
+        near = not is_followup(response)
+
+        if self.redis:
+            try:
+                near_list = self._redis_key(version, "near")
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.set(self._redis_key(version, key), raw, ex=int(self.ttl))
+                    if near:
+                        pipe.rpush(near_list, key)
+                        pipe.expire(near_list, int(self.ttl))
+                    await pipe.execute()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Response cache Redis write failed: {e}")
+        if version != self.version:
+            self._reset_mirror(version)
+        if near:
+            self._add_to_mirror(key, np.asarray(vector, dtype=np.float32), candidates)
+
+    def stats(self) -> Dict[str, any]:
+        lookups = self.exact_hits + self.near_hits + self.misses
+        return {
+            "version": self.version,
+            "exact_hits": self.exact_hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.exact_hits + self.near_hits) / lookups, 4) if lookups else 0.0,
+            "stores": self.stores,
+            "near_entries": len(self.near_keys),
+            "latency_saved_ms": round(self.saved_ms, 1),
+            "redis": {"enabled": self.redis is not None, "errors": self.errors},
+            "local": self.local.stats(),
+        }
+
+
+_response_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """The shared response cache, or None when caching is not set up (scripts, benchmarks)."""
+    return _response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    global _response_cache
+    _response_cache = cache
@@ -0,0 +1,215 @@
+import re
+from typing import Dict, List, Optional
+import numpy as np
+from core.lexical_index import tokenize
+from core.utils import MAX_AGE_CEILING, MIN_AGE_FLOOR, is_central
+
+# State / UT labels as they appear in the scheme data, with common alternate spellings
+STATE_ALIASES = {
+    "Andaman and Nicobar Islands": ["andaman", "nicobar"],
+    "Andhra Pradesh": ["andhra pradesh", "andhra"],
+    "Arunachal Pradesh": ["arunachal pradesh", "arunachal"],
+    "Assam": ["assam"],
+    "Bihar": ["bihar"],
+    "Chandigarh": ["chandigarh"],
+    "Chhattisgarh": ["chhattisgarh", "chattisgarh"],
+    "Dadra & Nagar Haveli and Daman & Diu": ["dadra", "nagar haveli", "daman", "diu"],
+    "Delhi": ["delhi", "new delhi"],
+    "Goa": ["goa"],
+    "Gujarat": ["gujarat"],
+    "Haryana": ["haryana"],
+    "Himachal Pradesh": ["himachal pradesh", "himachal"],
+    "Jammu and Kashmir": ["jammu and kashmir", "jammu", "kashmir", "j&k"],
+    "Jharkhand": ["jharkhand"],
+    "Karnataka": ["karnataka"],
+    "Kerala": ["kerala"],
+    "Ladakh": ["ladakh"],
+    "Lakshadweep": ["lakshadweep"],
+    "Madhya Pradesh": ["madhya pradesh"],
+    "Maharashtra": ["maharashtra"],
+    "Manipur": ["manipur"],
+    "Meghalaya": ["meghalaya"],
+    "Mizoram": ["mizoram"],
+    "Nagaland": ["nagaland"],
+    "Odisha": ["odisha", "orissa"],
+    "Puducherry": ["puducherry", "pondicherry"],
+    "Punjab": ["punjab"],
+    "Rajasthan": ["rajasthan"],
+    "Sikkim": ["sikkim"],
+    "Tamil Nadu": ["tamil nadu", "tamilnadu"],
+    "Telangana": ["telangana"],
+    "Tripura": ["tripura"],
+    "Uttar Pradesh": ["uttar pradesh"],
+    "Uttarakhand": ["uttarakhand", "uttaranchal"],
+    "West Bengal": ["west bengal", "bengal"],
+}
+
+_STATE_RE = re.compile(
+    r"\b(" + "|".join(re.escape(alias) for aliases in STATE_ALIASES.values() for alias in sorted(aliases, key=len, reverse=True)) + r")\b"
+)
+_STATE_BY_ALIAS = {alias: state for state, aliases in STATE_ALIASES.items() for alias in aliases}
+
+_AGE_RE = re.compile(
+    r"\b(?:i am|i'm|im|aged?|age is|age of)\s*(\d{1,3})\b|\b(\d{1,3})\s*(?:-\s*)?(?:years?|yrs?)(?:\s*-\s*|\s+)old\b"
+)
+# Only words describing the user themself; "my daughter" or "my husband" say nothing about them
+_FEMALE_RE = re.compile(r"\b(woman|female|girl|lady|widow|pregnant)\b")
+_MALE_RE = re.compile(r"\b(man|male|boy|gentleman)\b")
+_CENTRAL_RE = re.compile(r"\b(central|centre|center|union|national)\s+(government|govt|scheme|schemes)\b|\bgovernment of india\b")
+_STATE_LEVEL_RE = re.compile(r"\bstate\s+(government|govt|scheme|schemes)\b")
+
+
+def extract_constraints(text: str) -> Dict[str, any]:
+    """
+    Pulls structured constraints out of the conversation text.
+    Later mentions win, since follow-up answers correct earlier ones.
+    Example: "I am a 45 year old woman farmer from Kerala" → {"state": "Kerala", "age": 45, "gender": "female", "level": None}
+    """
+    text = (text or "").lower()
+
+    states = _STATE_RE.findall(text)
+    ages = [int(a or b) for a, b in _AGE_RE.findall(text)]
+    ages = [age for age in ages if 0 < age < 120]
+
+    female = [m.end() for m in _FEMALE_RE.finditer(text)]
+    male = [m.end() for m in _MALE_RE.finditer(text)]
+    gender = None
+    if female or male:
+        gender = "female" if max(female, default=-1) > max(male, default=-1) else "male"
+
+    central = [m.end() for m in _CENTRAL_RE.finditer(text)]
+    state_level = [m.end() for m in _STATE_LEVEL_RE.finditer(text)]
+    level = None
+    if central or state_level:
+        level = "central" if max(central, default=-1) > max(state_level, default=-1) else "state"
+
+    return {
+        "state": _STATE_BY_ALIAS[states[-1]] if states else None,
+        "age": ages[-1] if ages else None,
+        "gender": gender,
+        "level": level,
+    }
+
+
+# Words that state who or where the user is rather than what they need
+_PROFILE_TERMS = {
+    "old", "year", "years", "yrs", "aged", "age", "live", "living", "from", "resident", "state", "central",
+    "centre", "center", "government", "govt", "india", "please", "help", "support", "get", "find", "like",
+    "woman", "female", "girl", "lady", "man", "male", "boy", "gentleman", "there", "what", "how", "can",
+}
+_STATE_TERMS = {term for aliases in STATE_ALIASES.values() for alias in aliases for term in tokenize(alias)}
+
+
+def purpose_terms(text: str) -> List[str]:
+    """Query terms describing what the user needs: everything except profile words, states and numbers."""
+    return [t for t in tokenize(text) if not t.isdigit() and t not in _PROFILE_TERMS and t not in _STATE_TERMS]
+
+
+def is_specific_query(text: str, min_score: int = 4) -> bool:
+    """
+    Cheap stand-in for the follow-up decision agent.
+    A query is specific enough when it states what is needed (at least two purpose terms) and,
+    together with the extracted constraints, scores `min_score`: one point per constraint
+    and per purpose term, purpose terms capped at three.
+    Example: "dairy loan, I live in Haryana" → 3 purpose terms + state = 4 → specific
+    """
+    purpose = len(set(purpose_terms(text)))
+    if purpose < 2:
+        return False
+    filled = sum(value is not None for value in extract_constraints(text).values())
+    return filled + min(purpose, 3) >= min_score
+
+
+def has_constraints(constraints: Dict[str, any]) -> bool:
+    return any(value is not None for value in (constraints or {}).values())
+
+
+class FilterIndex:
+    """
+    Boolean bitmaps over the filterable scheme fields, one bit per VectorIndex row.
+    - `state_masks` is an inverted index from state label to the rows of that state
+    - Age bounds are kept as arrays so an age filter is two vectorized comparisons
+    """
+
+    def __init__(self, metadatas: List[Dict[str, any]]):
+        count = len(metadatas)
+        self.size = count
+        self.central = np.zeros(count, dtype=bool)
+        self.female_only = np.zeros(count, dtype=bool)
+        self.min_age = np.full(count, MIN_AGE_FLOOR, dtype=np.int16)
+        self.max_age = np.full(count, MAX_AGE_CEILING, dtype=np.int16)
+        self.state_masks: Dict[str, np.ndarray] = {}
+
+        for row, metadata in enumerate(metadatas):
+            self.central[row] = is_central(metadata)
+            self.female_only[row] = bool(metadata.get("femaleOnly"))
+            self.min_age[row] = metadata.get("minAge", MIN_AGE_FLOOR)
+            self.max_age[row] = metadata.get("maxAge", MAX_AGE_CEILING)
+            state = metadata.get("state")
+            if state:
+                if state not in self.state_masks:
+                    self.state_masks[state] = np.zeros(count, dtype=bool)
+                self.state_masks[state][row] = True
+
+    def mask(self, constraints: Dict[str, any]) -> Optional[np.ndarray]:
+        """Rows matching every constraint, or None when there is nothing to filter on."""
+        if not has_constraints(constraints):
+            return None
+
+        mask = np.ones(self.size, dtype=bool)
+        state = constraints.get("state")
+        level = constraints.get("level")
+
+        if level == "central":
+            mask &= self.central
+        elif level == "state":
+            mask &= ~self.central
+
+        if state:
+            # Central schemes apply in every state
+            state_mask = self.state_masks.get(state, np.zeros(self.size, dtype=bool))
+            mask &= state_mask | self.central
+
+        age = constraints.get("age")
+        if age is not None:
+            mask &= (self.min_age <= age) & (self.max_age >= age)
+
+        if constraints.get("gender") == "male":
+            mask &= ~self.female_only
+
+        return mask
+
+    def candidate_rows(self, constraints: Dict[str, any]) -> Optional[np.ndarray]:
+        mask = self.mask(constraints)
+        return None if mask is None else np.flatnonzero(mask)
+
+
+def build_chroma_where(constraints: Dict[str, any]) -> Optional[Dict[str, any]]:
+    """The same constraints as a Chroma `where` clause."""
+    if not has_constraints(constraints):
+        return None
+
+    clauses = []
+    state = constraints.get("state")
+    level = constraints.get("level")
+
+    # The `central` flag, as FilterIndex uses it; collections indexed before it existed need a reindex
+    if level == "central":
+        clauses.append({"central": True})
+    elif level == "state":
+        clauses.append({"central": False})
+
+    if state:
+        clauses.append({"$or": [{"state": state}, {"central": True}]})
+
+    age = constraints.get("age")
+    if age is not None:
+        clauses.append({"minAge": {"$lte": age}})
+        clauses.append({"maxAge": {"$gte": age}})
+
+    if constraints.get("gender") == "male":
+        clauses.append({"femaleOnly": False})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
@@ -0,0 +1,94 @@
+import json
+import mmap
+import os
+from typing import Dict, Iterator, List, Optional
+
+INDEX_SUFFIX = ".idx.json"
+
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+class SchemeStoreWriter:
+    """
+    Writes extracted schemes as JSON Lines plus an offset index: `{id: [offset, length]}`.
+    Records are appended in order; a repeated id keeps its first record, like `_dedupe_schemes`.
+    Both files are written to temporary paths and swapped in on `close`.
+    """
+
+    def __init__(self, path: str, source: Optional[Dict[str, any]] = None):
+        self.path = path
+        self.source = source or {}
+        self.offsets: Dict[str, List[int]] = {}
+        self.position = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path + ".tmp", "wb")
+
+    def write(self, scheme_id: str, line: bytes) -> bool:
+        """Appends one serialized record (without newline); False if the id was already written."""
+        if not scheme_id or scheme_id in self.offsets:
+            return False
+        self._file.write(line + b"\n")
+        self.offsets[scheme_id] = [self.position, len(line)]
+        self.position += len(line) + 1
+        return True
+
+    def close(self):
+        self._file.close()
+        with open(index_path(self.path) + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"source": self.source, "offsets": self.offsets}, f)
+        os.replace(self.path + ".tmp", self.path)
+        os.replace(index_path(self.path) + ".tmp", index_path(self.path))
+
+
+class SchemeStore:
+    """
+    Read side of the JSON Lines artifact. Opening it loads only the offset index;
+    records are decoded on demand from a memory-mapped file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(index_path(path), encoding="utf-8") as f:
+            index = json.load(f)
+        self.source = index["source"]
+        self.offsets: Dict[str, List[int]] = index["offsets"]
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets else b""
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(path) and os.path.exists(index_path(path))
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __contains__(self, scheme_id: str) -> bool:
+        return scheme_id in self.offsets
+
+    def ids(self) -> List[str]:
+        return list(self.offsets)
+
+    def get(self, scheme_id: str) -> Optional[Dict[str, any]]:
+        entry = self.offsets.get(scheme_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        return json.loads(self._map[offset:offset + length])
+
+    def get_many(self, scheme_ids: List[str]) -> List[Dict[str, any]]:
+        return [scheme for scheme in (self.get(scheme_id) for scheme_id in scheme_ids) if scheme is not None]
+
+    def __iter__(self) -> Iterator[Dict[str, any]]:
+        for offset, length in self.offsets.values():
+            yield json.loads(self._map[offset:offset + length])
+
+    def all(self) -> List[Dict[str, any]]:
+        return list(self)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
@@ -0,0 +1,97 @@
+import json
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from core.embedding_cache import LRUCache, encode_vector
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def session_key(uid: str, conversation_id: str) -> str:
+    return f"{uid}:{conversation_id}"
+
+
+def combine_vectors(previous: List[float], turn: List[float], turn_weight: float) -> List[float]:
+    """Embedding of the conversation so far: the earlier turns' vector moved towards the new turn's."""
+    previous = np.asarray(previous, dtype=np.float32)
+    turn = np.asarray(turn, dtype=np.float32)
+    combined = (1 - turn_weight) * previous / (np.linalg.norm(previous) or 1.0) + turn_weight * turn / (np.linalg.norm(turn) or 1.0)
+    return (combined / (np.linalg.norm(combined) or 1.0)).tolist()
+
+
+class SessionStore:
+    """
+    Server-side state of a conversation, keyed by Firebase uid and conversation id:
+    - `turns`: the user's messages so far
+    - `constraints`: state/level/age/gender extracted from them
+    - `candidates`: ids of the last candidate pool, best first
+    - `vector`: embedding of the conversation so far, or None to re-embed on the next turn
+    - `version`: index version the candidates came from
+    Sessions live in Redis with a sliding TTL, or in an in-process LRU without `redis_conn`.
+    - `redis_conn` must be a binary (decode_responses=False) redis.asyncio client
+    """
+
+    KEY_PREFIX = "session:"
+
+    def __init__(self, redis_conn=None, ttl: float = None, max_items: int = None):
+        self.redis = redis_conn
+        self.ttl = ttl or settings.SESSION_TTL
+        self.local = LRUCache(max_items or settings.SESSION_CACHE_SIZE, self.ttl)
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def load(self, key: str) -> Optional[Dict[str, any]]:
+        raw = None
+        if self.redis:
+            try:
+                raw = await self.redis.get(self.KEY_PREFIX + key)
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Session store Redis read failed: {e}")
+        else:
+            raw = self.local.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        session = json.loads(raw)
+        if session.get("vector"):
+            session["vector"] = np.frombuffer(bytes.fromhex(session["vector"]), dtype=np.float32).tolist()
+        return session
+
+    async def save(self, key: str, session: Dict[str, any]):
+        vector = session.get("vector")
+        raw = json.dumps(
+            {**session, "vector": encode_vector(vector).hex() if vector is not None else None},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        if not self.redis:
+            self.local.set(key, raw)
+            return
+        try:
+            await self.redis.set(self.KEY_PREFIX + key, raw, ex=int(self.ttl))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Session store Redis write failed: {e}")
+
+    def stats(self) -> Dict[str, any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "redis": {"enabled": self.redis is not None, "errors": self.errors},
+        }
+
+
+_session_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> Optional[SessionStore]:
+    """The shared session store, or None when sessions are not set up (scripts, benchmarks)."""
+    return _session_store
+
+
+def set_session_store(store: Optional[SessionStore]):
+    global _session_store
+    _session_store = store
@@ -6,7 +6,143 @@ load_dotenv()
 class Settings:
     ENV = os.getenv("ENV", "development")
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
     REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+    # Rate limits are enforced in-process and synced to Redis every interval, or after this many unsynced requests per key
+    RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "1.0"))
+    RATE_LIMIT_SYNC_BATCH = int(os.getenv("RATE_LIMIT_SYNC_BATCH", "2"))
+    RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
     FIREBASE_JSON = os.getenv("FIREBASE_JSON", "firebase.json")
+    # ID token verification: project id (defaults to FIREBASE_JSON's), signing certificates, verified-token cache
+    FIREBASE_PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID")
+    FIREBASE_CERTS_URL = os.getenv("FIREBASE_CERTS_URL", "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com")
+    AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
 
-settings = Settings()
\ No newline at end of file
+    # Vector index storage
+    CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", "./chroma_db")
+    # Extracted scheme details as JSON Lines with an id → offset index, built by reindexing
+    SCHEME_STORE_PATH = os.getenv("SCHEME_STORE_PATH", os.path.join(CHROMA_PERSIST_DIR, "schemes.jsonl"))
+    # Processes parsing the scheme-detail shards; 0 uses every CPU
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+    # Retrieval engine for query_schemes: "chroma" or "numpy" (in-memory exact search)
+    VECTOR_ENGINE = os.getenv("VECTOR_ENGINE", "chroma")
+    # HNSW search breadth of new Chroma collections (raised to SESSION_CANDIDATE_POOL if below it), fixed so
+    # results don't depend on how many are asked for
+    CHROMA_SEARCH_EF = int(os.getenv("CHROMA_SEARCH_EF", "100"))
+    # Restrict vector search to schemes matching the state/level/age/gender in the conversation
+    SCHEME_PREFILTER = os.getenv("SCHEME_PREFILTER", "true").lower() == "true"
+    # Hybrid BM25 + vector retrieval with reciprocal-rank fusion. BM25 and its filter bitmaps run over the
+    # index version's lexical export (written at indexing for either engine); the vector ranking and the
+    # metadata returned come from VECTOR_ENGINE, fused by scheme id
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    # Skip the embedding call when a short keyword query has a clear BM25 winner
+    LEXICAL_SKIP_MAX_TERMS = int(os.getenv("LEXICAL_SKIP_MAX_TERMS", "4"))
+    LEXICAL_SKIP_MARGIN = float(os.getenv("LEXICAL_SKIP_MARGIN", "1.5"))
+
+    # Token budget for the recommendation prompt; scheme rows beyond it are dropped in rank order
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+    # Start the recommendation agent alongside the follow-up decision agent instead of after it
+    SPECULATIVE_AGENTS = os.getenv("SPECULATIVE_AGENTS", "true").lower() == "true"
+    # Skip the decision agent for queries the local heuristic finds specific enough
+    DECISION_SKIP_HEURISTIC = os.getenv("DECISION_SKIP_HEURISTIC", "true").lower() == "true"
+    DECISION_SKIP_MIN_SCORE = int(os.getenv("DECISION_SKIP_MIN_SCORE", "4"))
+    # Local reranker between retrieval and the agents (weights from `python -m service.train_reranker`):
+    # candidates are reordered and cut where their scores fall off (at least RERANK_CUTOFF_RATIO of the best
+    # and RERANK_MIN_SCORE, between MIN_KEEP and MAX_KEEP of them), and with RERANK_DIRECT a best candidate
+    # scoring RERANK_DIRECT_SCORE with a lead of RERANK_DIRECT_MARGIN is returned without the agents.
+    # Both are off until the model is trained on this EMBEDDING_BACKEND and on logged selections
+    RERANK = os.getenv("RERANK", "false").lower() == "true"
+    RERANK_DIRECT = os.getenv("RERANK_DIRECT", "false").lower() == "true"
+    RERANKER_MODEL = os.getenv("RERANKER_MODEL", "./reranker_model.json")
+    RERANK_MIN_KEEP = int(os.getenv("RERANK_MIN_KEEP", "8"))
+    RERANK_MAX_KEEP = int(os.getenv("RERANK_MAX_KEEP", "15"))
+    RERANK_CUTOFF_RATIO = float(os.getenv("RERANK_CUTOFF_RATIO", "0.01"))
+    RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.001"))
+    RERANK_DIRECT_SCORE = float(os.getenv("RERANK_DIRECT_SCORE", "0.6"))
+    RERANK_DIRECT_MARGIN = float(os.getenv("RERANK_DIRECT_MARGIN", "0.5"))
+    RERANK_DIRECT_RESULTS = int(os.getenv("RERANK_DIRECT_RESULTS", "3"))
+    # Log each recommendation agent run's candidates and picks ("yojana.selections") as training data
+    RERANK_LOG_SELECTIONS = os.getenv("RERANK_LOG_SELECTIONS", "true").lower() == "true"
+
+    # Embeddings: "openai" in production, "hashing" for offline runs and benchmarks
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "100"))
+    EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+    # Request-path embedding client: pooled connections, per-request timeout, in-flight cap
+    EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "10"))
+    EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "2"))
+    EMBEDDING_MAX_CONNECTIONS = int(os.getenv("EMBEDDING_MAX_CONNECTIONS", "20"))
+    EMBEDDING_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "32"))
+    # Query-embedding cache: in-process LRU plus optional shared Redis tier (the response cache, sessions
+    # and request coalescing always share Redis)
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+    EMBEDDING_CACHE_TTL = int(os.getenv("EMBEDDING_CACHE_TTL", "86400"))
+    EMBEDDING_CACHE_REDIS = os.getenv("EMBEDDING_CACHE_REDIS", "true").lower() == "true"
+
+    # Whole-turn response cache, keyed by index version: exact conversation text, or a near
+    # match (cosine similarity >= threshold and this share of the retrieved candidates in common)
+    RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "true").lower() == "true"
+    RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+    RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95"))
+    RESPONSE_CACHE_MIN_OVERLAP = float(os.getenv("RESPONSE_CACHE_MIN_OVERLAP", "0.8"))
+
+    # Conversation sessions: follow-up turns re-rank the previous candidate pool
+    SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))
+    SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+    SESSION_CANDIDATE_POOL = int(os.getenv("SESSION_CANDIDATE_POOL", "100"))
+    # Fall back to a full search when re-ranking leaves fewer candidates than this
+    SESSION_MIN_CANDIDATES = int(os.getenv("SESSION_MIN_CANDIDATES", "10"))
+    # Weight of the new turn's embedding against the earlier turns' when re-ranking
+    SESSION_TURN_WEIGHT = float(os.getenv("SESSION_TURN_WEIGHT", "0.3"))
+
+    # Concurrent identical work (same normalized query and index version) runs once per worker, and once
+    # across workers via a Redis lock held for at most LOCK_TTL seconds; the result is shared for RESULT_TTL
+    SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+    SINGLE_FLIGHT_LOCK_TTL = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", "30"))
+    SINGLE_FLIGHT_RESULT_TTL = float(os.getenv("SINGLE_FLIGHT_RESULT_TTL", "10"))
+    SINGLE_FLIGHT_POLL_INTERVAL = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", "0.05"))
+
+    # /recommend/batch: profiles per request, agent runs at once, and per-user budgets in profiles
+    BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", "200"))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    BATCH_PROFILES_PER_MINUTE = int(os.getenv("BATCH_PROFILES_PER_MINUTE", "200"))
+    BATCH_PROFILES_PER_DAY = int(os.getenv("BATCH_PROFILES_PER_DAY", "2000"))
+
+    # Startup: load the agents SDK and the active index before serving (in the gunicorn master with
+    # --preload, so forked workers share them), then warm each worker up with one search of
+    # WARMUP_QUERY; /health reports ready once that is done
+    PRELOAD = os.getenv("PRELOAD", "true").lower() == "true"
+    WARMUP = os.getenv("WARMUP", "true").lower() == "true"
+    WARMUP_QUERY = os.getenv("WARMUP_QUERY", "pension scheme for senior citizens")
+
+    # Background reindexing: jobs queued by POST /admin/reindex (bearer ADMIN_TOKEN) in Redis, or in
+    # files under CHROMA_PERSIST_DIR with REINDEX_QUEUE=local, run by `python -m service.reindex_worker`
+    # (started by gunicorn.conf.py with REINDEX_WORKER) at REINDEX_NICE CPU priority, embedding at most
+    # REINDEX_EMBED_RATE texts per second (0: no cap). A running job saves its progress every
+    # PROGRESS_INTERVAL and is taken over when that stops for STALE_AFTER seconds; job records are
+    # kept for JOB_TTL. Serving workers check the active-index pointer every INDEX_RELOAD_INTERVAL
+    # seconds and switch to a new version without a restart
+    ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+    REINDEX_QUEUE = os.getenv("REINDEX_QUEUE", "redis")
+    REINDEX_WORKER = os.getenv("REINDEX_WORKER", "true").lower() == "true"
+    REINDEX_NICE = int(os.getenv("REINDEX_NICE", "10"))
+    REINDEX_EMBED_RATE = float(os.getenv("REINDEX_EMBED_RATE", "200"))
+    REINDEX_EMBEDDING_CONCURRENCY = int(os.getenv("REINDEX_EMBEDDING_CONCURRENCY", "2"))
+    REINDEX_POLL_INTERVAL = float(os.getenv("REINDEX_POLL_INTERVAL", "2"))
+    REINDEX_PROGRESS_INTERVAL = float(os.getenv("REINDEX_PROGRESS_INTERVAL", "1"))
+    REINDEX_STALE_AFTER = float(os.getenv("REINDEX_STALE_AFTER", "120"))
+    REINDEX_JOB_TTL = int(os.getenv("REINDEX_JOB_TTL", str(7 * 86400)))
+    INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
+
+    # Observability: one JSON trace line per request, bearer token required by /metrics and /stats/*
+    # (closed unless it or ADMIN_TOKEN is set; ADMIN_TOKEN is accepted too),
+    # and the share of requests run under the sampling profiler (written to PROFILE_DIR)
+    TRACE_LOG = os.getenv("TRACE_LOG", "true").lower() == "true"
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "./profiles")
+
+settings = Settings()
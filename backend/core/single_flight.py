@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+from core.embedding_cache import normalize_query
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+_MISSING = object()
+
+
+def flight_key(stage: str, version: Optional[str], query: str, *parts) -> str:
+    """Key for one stage's work on a query under an index version; `parts` are any other inputs (JSON-able)."""
+    payload = json.dumps([stage, version, normalize_query(query), *parts], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Runs concurrent calls for the same key once and hands every caller the same result.
+    - Within a worker, callers share one in-flight task. The work runs as its own task, so a
+      caller that is cancelled (e.g. a client that went away) does not cancel it for the others
+    - Across workers, the leader holds a short Redis lock (`lock_ttl` seconds) while it works and
+      publishes the JSON result for `result_ttl` seconds; other workers poll for that result
+      every `poll_interval` seconds instead of starting the same work. If the lock disappears
+      without a result (the leader failed) they compete for it again, so one of them retries;
+      once `lock_ttl` has passed they do the work themselves
+    - Without Redis, or while it is unreachable, only in-worker sharing applies
+    - Results must be JSON-serializable when `redis_conn` is set (a binary redis.asyncio client)
+    """
+
+    KEY_PREFIX = "flight:"
+
+    def __init__(self, redis_conn=None, lock_ttl: float = None, result_ttl: float = None, poll_interval: float = None):
+        self.redis = redis_conn
+        self.lock_ttl = lock_ttl or settings.SINGLE_FLIGHT_LOCK_TTL
+        self.result_ttl = result_ttl or settings.SINGLE_FLIGHT_RESULT_TTL
+        self.poll_interval = poll_interval or settings.SINGLE_FLIGHT_POLL_INTERVAL
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leads = 0
+        self.local_shared = 0
+        self.remote_shared = 0
+        self.remote_fallbacks = 0
+        self.errors = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """The result of `fn()` for `key`, and whether it came from another caller's run."""
+        task = self._inflight.get(key)
+        if task is not None:
+            self.local_shared += 1
+            result, _ = await asyncio.shield(task)
+            return result, True
+
+        task = asyncio.create_task(self._run(key, fn))
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._inflight.pop(key) if self._inflight.get(key) is done else None)
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        if self.redis is None:
+            self.leads += 1
+            return await fn(), False
+
+        lock_key, result_key = f"{self.KEY_PREFIX}lock:{key}", f"{self.KEY_PREFIX}result:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ttl
+        while True:
+            try:
+                # SET NX replies nil, i.e. None, when another worker holds the lock
+                acquired = bool(await self.redis.set(lock_key, token, nx=True, px=int(self.lock_ttl * 1000)))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Single-flight lock unavailable, running locally: {e}")
+                self.leads += 1
+                return await fn(), False
+            if acquired:
+                break
+
+            result = await self._wait_for_leader(lock_key, result_key, deadline)
+            if result is not _MISSING:
+                self.remote_shared += 1
+                return result, True
+            self.remote_fallbacks += 1
+            # The leader failed: compete for the lock again so only one worker retries,
+            # unless the wait already took the whole lock TTL
+            if time.monotonic() >= deadline:
+                self.leads += 1
+                return await fn(), False
+
+        self.leads += 1
+        try:
+            result = await fn()
+            try:
+                await self.redis.set(result_key, json.dumps(result).encode("utf-8"), px=int(self.result_ttl * 1000))
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Single-flight result not published: {e}")
+            return result, False
+        finally:
+            await self._release(lock_key, token)
+
+    async def _wait_for_leader(self, lock_key: str, result_key: str, deadline: float):
+        """The leader's published result, or _MISSING once its lock is gone without one or `deadline` passes."""
+        while time.monotonic() < deadline:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(result_key)
+                    pipe.exists(lock_key)
+                    raw, locked = await pipe.execute()
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Single-flight wait failed: {e}")
+                return _MISSING
+            if raw is not None:
+                return json.loads(raw)
+            if not locked:
+                return _MISSING
+            await asyncio.sleep(self.poll_interval)
+        return _MISSING
+
+    async def _release(self, lock_key: str, token: str):
+        try:
+            # Only delete our own lock; after lock_ttl another worker may hold it
+            held = await self.redis.get(lock_key)
+            if held is not None and (held.decode() if isinstance(held, bytes) else held) == token:
+                await self.redis.delete(lock_key)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Single-flight lock not released, it expires in {self.lock_ttl}s: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._inflight),
+            "leads": self.leads,
+            "local_shared": self.local_shared,
+            "remote_shared": self.remote_shared,
+            "remote_fallbacks": self.remote_fallbacks,
+            "errors": self.errors,
+        }
+
+
+_single_flight: Optional[SingleFlight] = None
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """The shared single-flight group (in-worker only until the lifespan sets one up), or None when disabled."""
+    global _single_flight
+    if _single_flight is None and settings.SINGLE_FLIGHT:
+        _single_flight = SingleFlight()
+    return _single_flight
+
+
+def set_single_flight(flight: Optional[SingleFlight]):
+    global _single_flight
+    _single_flight = flight
@@ -0,0 +1,83 @@
+import asyncio
+import gc
+import logging
+import time
+from typing import Dict, Iterable
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# How far this process is from serving its first request quickly, as reported by /health
+_state: Dict[str, any] = {"preloaded": False, "ready": False}
+
+
+def preload(fork_safe: bool = False) -> Dict[str, any]:
+    """
+    Imports the agents SDK, loads the tokenizer and the active index's serving indexes into this
+    process, once.
+    With `fork_safe` (the gunicorn master, before it forks workers) the Chroma collection is left
+    for each worker to open, and everything loaded so far is frozen out of the garbage collector
+    (`gc.freeze`) so collections do not write to those pages and the workers keep sharing them
+    copy-on-write. The vectors and the detail store are memory-mapped, so their pages are shared
+    through the page cache in any case.
+    """
+    if _state["preloaded"]:
+        return _state
+    start = time.perf_counter()
+    try:
+        from core.embedding_search import load_serving_indexes
+        from core.prompts import tokenizer_name
+        from service.recommendation import get_runner
+        get_runner()
+        tokenizer_name()
+        load_serving_indexes(open_collection=not fork_safe)
+    except Exception as e:
+        # e.g. nothing indexed yet; the first request loads whatever is there
+        logger.warning(f"Preload failed, loading on first use instead: {e}")
+        return _state
+    if fork_safe:
+        gc.freeze()
+    _state["preloaded"] = True
+    _state["preload_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    logger.info(f"Preloaded the agents SDK, tokenizer and serving indexes in {_state['preload_ms']}ms")
+    return _state
+
+
+async def _warm_search():
+    from core.embedding_cache import CachedEmbeddingClient
+    from core.embedding_search import query_schemes
+    from core.embeddings import get_embedding_client
+    await query_schemes(settings.WARMUP_QUERY, top_k=1)
+    # The search may have been served by the embedding cache or BM25 alone; open the API pool regardless
+    client = get_embedding_client()
+    await (client.client if isinstance(client, CachedEmbeddingClient) else client).embed([settings.WARMUP_QUERY])
+
+
+async def warm_up(redis_conns: Iterable = ()):
+    """
+    Readies this worker for its first request: preloads (unless the master already did), opens
+    a connection on each of `redis_conns`, and runs one search of WARMUP_QUERY, which opens the
+    embedding client's connection pool, loads Chroma's HNSW segment and pages in the vectors.
+    The worker is marked ready even when a step fails, so a slow dependency cannot keep it out
+    of rotation; the failure is logged and reported by `readiness`.
+    """
+    start = time.perf_counter()
+    try:
+        if settings.PRELOAD:
+            await asyncio.to_thread(preload)
+        for conn in redis_conns:
+            if conn is not None:
+                await conn.ping()
+        if settings.WARMUP:
+            await _warm_search()
+    except Exception as e:
+        _state["warmup_error"] = str(e)
+        logger.warning(f"Warmup failed, serving anyway: {e}")
+    _state["warmup_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    _state["ready"] = True
+    logger.info(f"Worker ready after {_state['warmup_ms']}ms of warmup")
+
+
+def readiness() -> Dict[str, any]:
+    """Whether warmup has finished, whether the index was preloaded, and how long each took (ms)."""
+    return dict(_state)
@@ -0,0 +1,129 @@
+import json
+import re
+from typing import Dict, List, Tuple
+
+DEFAULT_LIST_MESSAGE = "Here are some schemes that match your requirement:"
+# An escape sequence cut off at the end of a chunk: a lone backslash or a partial \uXXXX
+_PARTIAL_ESCAPE_RE = re.compile(r"(?<!\\)(\\\\)*\\(u[0-9a-fA-F]{0,3})?$")
+
+
+def format_sse(event: str, data) -> str:
+    """One Server-Sent Events frame; `data` is sent as a single line of JSON."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class IncrementalSchemeParser:
+    """
+    Incremental counterpart of `parse_matched_schemes` for streamed agent output.
+    Accepts `{"message": ..., "schemes": [{"id", "reason"}, ...]}` or a bare list of schemes,
+    optionally wrapped in a ```json fence, fed in arbitrary chunks.
+    `feed` returns the events completed by the chunk, in order:
+    - ("token", str) for each newly decoded piece of the message string, as it is generated
+    - ("message", str) once the message string is closed
+    - ("scheme", dict) for every scheme object as soon as its closing brace arrives
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = 0
+        self.key = None
+        self.after_colon = False
+        self.items_depth = None
+        self.item_start = None
+        self.is_list = False
+        self.message = None
+        self.message_sent = 0
+        self.schemes: List[Dict[str, any]] = []
+
+    def feed(self, chunk: str) -> List[Tuple[str, any]]:
+        events = []
+        self.buffer += chunk
+        buffer = self.buffer
+
+        for i in range(self.position, len(buffer)):
+            char = buffer[i]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    self._on_string(buffer[self.string_start:i + 1], events)
+                continue
+
+            if self.depth == 0 and char not in "{[":
+                # Code fence or chatter before the JSON starts
+                continue
+            if char == '"':
+                self.in_string = True
+                self.string_start = i
+            elif char in "{[":
+                if char == "[" and self.depth == 0:
+                    self.is_list = True
+                    self.items_depth = 1
+                elif char == "[" and self.depth == 1 and self.key == "schemes":
+                    self.items_depth = 2
+                elif char == "{" and self.items_depth is not None and self.depth == self.items_depth:
+                    self.item_start = i
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if char == "}" and self.item_start is not None and self.depth == self.items_depth:
+                    self._on_item(buffer[self.item_start:i + 1], events)
+                    self.item_start = None
+                elif char == "]" and self.items_depth is not None and self.depth == self.items_depth - 1:
+                    self.items_depth = None
+                if self.depth == 0 and self.is_list and self.message is None:
+                    self.message = DEFAULT_LIST_MESSAGE
+                    events.append(("message", self.message))
+            elif self.depth == 1 and char == ":":
+                self.after_colon = True
+            elif self.depth == 1 and char == ",":
+                self.after_colon = False
+
+        if self.in_string and self._in_message_value():
+            raw = buffer[self.string_start + 1:]
+            partial = _PARTIAL_ESCAPE_RE.search(raw)
+            if partial and partial.group(0).count("\\") % 2 == 1:
+                raw = raw[:partial.start() + len(partial.group(1) or "")]
+            decoded = json.loads(f'"{raw}"')
+            if decoded and "\ud800" <= decoded[-1] <= "\udbff":
+                # High surrogate whose pair has not arrived yet
+                decoded = decoded[:-1]
+            self._message_delta(decoded, events)
+
+        self.position = len(buffer)
+        return events
+
+    def _in_message_value(self) -> bool:
+        return self.depth == 1 and not self.is_list and self.after_colon and self.key == "message"
+
+    def _message_delta(self, decoded: str, events: List[Tuple[str, any]]):
+        if len(decoded) > self.message_sent:
+            events.append(("token", decoded[self.message_sent:]))
+            self.message_sent = len(decoded)
+
+    def _on_string(self, raw: str, events: List[Tuple[str, any]]):
+        if self.depth != 1 or self.is_list:
+            return
+        value = json.loads(raw)
+        if not self.after_colon:
+            self.key = value
+        elif self.key == "message":
+            self._message_delta(value, events)
+            self.message = value
+            events.append(("message", value))
+
+    def _on_item(self, raw: str, events: List[Tuple[str, any]]):
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            return
+        if isinstance(item, dict):
+            self.schemes.append(item)
+            events.append(("scheme", item))
@@ -0,0 +1,57 @@
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Awaitable, Dict, TypeVar
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """
+    Wall-clock milliseconds per named stage of one request, plus what the request did.
+    Stages may overlap when they run concurrently, so their sum can exceed `total`; a stage
+    entered more than once accumulates. A stage cancelled before it finished is recorded as
+    "<name> (cancelled)".
+    - `tokens`: prompt and completion tokens per agent, as reported by the model API
+    - `info`: counts and labels such as `candidates`, `results`, `cache` and `outcome`
+    """
+
+    def __init__(self, request_id: str = None):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self.info: Dict[str, any] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            name = f"{name} (cancelled)"
+            raise
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+    async def timed(self, name: str, awaitable: Awaitable[T]) -> T:
+        with self.stage(name):
+            return await awaitable
+
+    def add_usage(self, agent: str, usage):
+        """Adds an agents-SDK `Usage` (input/output tokens of every model call of a run) under `agent`."""
+        if usage is None:
+            return
+        tokens = self.tokens.setdefault(agent, {"prompt": 0, "completion": 0, "requests": 0})
+        tokens["prompt"] += usage.input_tokens
+        tokens["completion"] += usage.output_tokens
+        tokens["requests"] += usage.requests
+
+    def elapsed(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def summary(self) -> Dict[str, float]:
+        stages = {name: round(ms, 1) for name, ms in self.stages.items()}
+        stages["total"] = round(self.elapsed(), 1)
+        return stages
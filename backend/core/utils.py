@@ -1,11 +1,25 @@
 import json
 from typing import List, Dict, Tuple
 import re
+from core.prompts import build_scheme_row
 
 SCHEMES_DB_PATH = "schemes.json"
 MODEL = "gpt-4o-mini"
 EMBEDDINGS_MODEL = "text-embedding-3-small"
 
+# Bounds stored for schemes without an age limit, so range filters match them
+MIN_AGE_FLOOR = 0
+MAX_AGE_CEILING = 150
+
+# The only fields kept in the vector store metadata: what filtering, ranking and the prompt need.
+# Everything else is read from the detail store for the schemes the agent picks.
+SLIM_METADATA_FIELDS = ("id", "name", "shortTitle", "state", "level", "category", "minAge", "maxAge", "femaleOnly", "central", "promptRow")
+# Prepared only for filtering, ranking and the prompt; left out of the scheme details returned to clients
+INDEX_ONLY_FIELDS = ("minAge", "maxAge", "femaleOnly", "central", "promptRow")
+
+# Scheme names that mark a scheme as meant only for women and girls
+FEMALE_ONLY_RE = re.compile(r"\b(women|woman|girls?|female|widows?|mothers?|pregnan\w*|daughters?|mahila)\b", re.IGNORECASE)
+
 def parse_matched_schemes(agent_output: str) -> Tuple[str, List[Dict[str, any]], bool]:
     cleaned_output = agent_output.strip()
     if cleaned_output.startswith("```json"):
@@ -27,6 +41,21 @@ def parse_matched_schemes(agent_output: str) -> Tuple[str, List[Dict[str, any]],
 def combine_conversation(history: List[str], current_input: str) -> str:
     return ". ".join(history + [current_input]) if current_input else ". ".join(history)
 
+# clean_text_field rules, compiled once
+_LINK_RE = re.compile(r"\[(.*?)\]\((.*?)\)")
+_BR_RE = re.compile(r"<br\s*/?>", re.IGNORECASE)
+_LIST_MARKER_RE = re.compile(r"^\s*(\d+\.\s*|[-•]\s*)", re.MULTILINE)
+_NON_SPACE_WHITESPACE_RE = re.compile(r"[^\S ]")
+
+def _is_clean(text: str) -> bool:
+    """True when no cleaning rule would change `text`, i.e. it is already in cleaned form."""
+    return not (
+        "*" in text or "_" in text or "](" in text or "<" in text or "  " in text
+        or text[0] == " " or text[-1] == " "
+        or _LIST_MARKER_RE.match(text)
+        or _NON_SPACE_WHITESPACE_RE.search(text)
+    )
+
 def clean_text_field(text: str) -> str:
     """
     Cleans a scheme-related text field by:
@@ -35,27 +64,41 @@ def clean_text_field(text: str) -> str:
     - Flattening markdown links
     - Removing list bullets and numbers
     - Normalizing whitespace
+    Already-clean text is recognised with a few substring checks and returned unchanged,
+    so cleaning a field twice costs little more than one scan.
     """
     if not text or not isinstance(text, str):
         return ""
+    if _is_clean(text):
+        return text
 
     # Remove markdown bold/italic
-    text = re.sub(r"[*_]{1,3}", "", text)
+    if "*" in text or "_" in text:
+        text = text.replace("*", "").replace("_", "")
 
     # Replace markdown links [text](url) → text (url)
-    text = re.sub(r"\[(.*?)\]\((.*?)\)", r"\1 ( \2 )", text)
+    if "](" in text:
+        text = _LINK_RE.sub(r"\1 ( \2 )", text)
 
     # Remove HTML <br> tags
-    text = re.sub(r"<br\s*/?>", " ", text, flags=re.IGNORECASE)
+    if "<" in text:
+        text = _BR_RE.sub(" ", text)
 
     # Remove list bullets, dashes, or numbered lists at line start
-    text = re.sub(r"^\s*(\d+\.\s*|[-•]\s*)", "", text, flags=re.MULTILINE)
+    if "\n" in text:
+        text = _LIST_MARKER_RE.sub("", text)
+    else:
+        marker = _LIST_MARKER_RE.match(text)
+        if marker:
+            text = text[marker.end():]
 
-    # Remove newlines and tabs
-    text = re.sub(r"\s*[\n\r\t]+\s*", " ", text)
+    # Collapse newlines, tabs and runs of whitespace; str.split uses the same whitespace as re's \s
+    return " ".join(text.split())
 
-    # Collapse multiple spaces
-    return re.sub(r"\s+", " ", text).strip()
+def clean_text_fields(texts: List[str]) -> List[str]:
+    """Batch form of clean_text_field, e.g. for the steps of an application process."""
+    clean = clean_text_field
+    return [clean(text) for text in texts]
 
 def get_age_text(age_limits: dict) -> str:
     """
@@ -79,11 +122,38 @@ def get_age_text(age_limits: dict) -> str:
     return "Eligible age: " + ", ".join(age_parts)
 
 
+def get_age_bounds(age_limits: dict) -> Tuple[int, int]:
+    """
+    Widest (min, max) age across all ageLimits categories.
+    Example: {"general": {"min_age": 18, "max_age": 40}, "sc": {"min_age": 18, "max_age": 45}} → (18, 45)
+    """
+    if not age_limits:
+        return MIN_AGE_FLOOR, MAX_AGE_CEILING
+
+    min_ages = [limits.get("min_age") for limits in age_limits.values()]
+    max_ages = [limits.get("max_age") for limits in age_limits.values()]
+    min_age = MIN_AGE_FLOOR if None in min_ages else min(min_ages)
+    max_age = MAX_AGE_CEILING if None in max_ages else max(max_ages)
+    return min_age, max_age
+
+
+def is_central(scheme: dict) -> bool:
+    """
+    Whether a scheme applies in every state: central level, or no state at all. Both search
+    engines filter on the `central` flag this sets at indexing; metadata indexed before the
+    flag existed gets the same answer from its level and state.
+    """
+    if "central" in scheme:
+        return bool(scheme["central"])
+    return (scheme.get("level") or "").lower() == "central" or not scheme.get("state")
+
 def prepare_scheme_for_metadata(scheme: dict) -> dict:
     """
     Prepares a scheme object for ChromaDB metadata.
     - Flattens or stringifies all non-primitive fields
     - Extracts readable age text
+    - Adds filterable fields: minAge, maxAge, femaleOnly, central
+    - Precomputes the compact prompt row (promptRow) used by the recommendation agent
     """
     def is_primitive(val):
         return isinstance(val, (str, int, float, bool))
@@ -97,11 +167,15 @@ def prepare_scheme_for_metadata(scheme: dict) -> dict:
         metadata["ageText"] = get_age_text(age_limits)  # e.g., "PWD: 10–100"
         del metadata["ageLimits"]
 
+    # Numeric fields for structured pre-filtering
+    metadata["minAge"], metadata["maxAge"] = get_age_bounds(age_limits if isinstance(age_limits, dict) else {})
+    metadata["femaleOnly"] = bool(FEMALE_ONLY_RE.search(scheme.get("name") or ""))
+    metadata["central"] = is_central(scheme)
+    metadata["promptRow"] = build_scheme_row(scheme)
+
     # Clean up applicationProcess list
     if isinstance(scheme.get("applicationProcess"), list):
-        metadata["applicationProcess"] = " ".join(
-            clean_text_field(step) for step in scheme["applicationProcess"]
-        )
+        metadata["applicationProcess"] = " ".join(clean_text_fields(scheme["applicationProcess"]))
 
     # Convert list of tags, category, beneficiaries into comma-separated strings
     for key in ["tags", "category", "beneficiaries"]:
@@ -119,4 +193,18 @@ def prepare_scheme_for_metadata(scheme: dict) -> dict:
         if not is_primitive(value):
             metadata[key] = str(value)
 
-    return metadata
\ No newline at end of file
+    return metadata
+
+def slim_metadata(metadata: dict) -> dict:
+    """Projects prepared metadata onto SLIM_METADATA_FIELDS for the vector store."""
+    return {key: metadata[key] for key in SLIM_METADATA_FIELDS if key in metadata}
+
+def detail_record(metadata: dict) -> dict:
+    """Prepared metadata without INDEX_ONLY_FIELDS, as kept in the detail store."""
+    return {key: value for key, value in metadata.items() if key not in INDEX_ONLY_FIELDS}
+
+def project_fields(scheme: dict, fields: List[str] = None) -> dict:
+    """`scheme` restricted to the requested `fields`; id and reason are always kept."""
+    if not fields:
+        return scheme
+    return {key: scheme[key] for key in ("id", *fields, "reason") if key in scheme}
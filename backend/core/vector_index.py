@@ -0,0 +1,102 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+METADATA_FILE = "metadata.json"
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _top_k(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Row indices of the `top_k` highest scores, best first."""
+    if top_k >= scores.shape[0]:
+        return np.argsort(-scores)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+class VectorIndex:
+    """
+    Exact cosine-similarity search over all scheme embeddings held in memory.
+    - `matrix` is one contiguous float32 array, L2-normalized, one row per scheme
+    - `ids` and `metadatas` are parallel to the matrix rows
+    """
+
+    def __init__(self, ids: List[str], matrix: np.ndarray, metadatas: List[Dict[str, any]]):
+        self.ids = ids
+        self.matrix = matrix
+        self.metadatas = metadatas
+        self.row_by_id = {scheme_id: row for row, scheme_id in enumerate(ids)}
+
+    @classmethod
+    def from_embeddings(cls, ids: List[str], embeddings, metadatas: List[Dict[str, any]]) -> "VectorIndex":
+        matrix = np.ascontiguousarray(_normalize_rows(np.asarray(embeddings, dtype=np.float32)))
+        return cls(list(ids), matrix, list(metadatas))
+
+    @classmethod
+    def from_collection(cls, collection) -> "VectorIndex":
+        data = collection.get(include=["embeddings", "metadatas"])
+        return cls.from_embeddings(data["ids"], data["embeddings"], data["metadatas"])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query(self, vector, top_k: int = 10, rows: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """
+        (row, cosine score) pairs of the `top_k` nearest schemes, best first.
+        `rows` optionally restricts the search to a subset of matrix rows.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        if rows is None:
+            scores = self.matrix @ query
+            best = _top_k(scores, top_k)
+            return [(int(row), float(scores[row])) for row in best]
+
+        if len(rows) == 0:
+            return []
+        scores = self.matrix[rows] @ query
+        best = _top_k(scores, top_k)
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def query_batch(self, vectors, top_k: int = 10, masks: Optional[List[Optional[np.ndarray]]] = None) -> List[List[Tuple[int, float]]]:
+        """
+        Nearest schemes for many queries at once, with a single matrix-matrix product.
+        `masks` optionally restricts each query to the rows set in its boolean mask (None: all rows).
+        """
+        queries = _normalize_rows(np.asarray(vectors, dtype=np.float32))
+        scores = queries @ self.matrix.T
+        results = []
+        for i, query_scores in enumerate(scores):
+            mask = masks[i] if masks is not None else None
+            k = top_k
+            if mask is not None:
+                query_scores = np.where(mask, query_scores, -np.inf)
+                k = min(top_k, int(mask.sum()))
+            best = _top_k(query_scores, k) if k else []
+            results.append([(int(row), float(query_scores[row])) for row in best])
+        return results
+
+    def search(self, vector, top_k: int = 10) -> List[Dict[str, any]]:
+        """Metadata of the `top_k` nearest schemes, the same shape `query_schemes` returns."""
+        return [self.metadatas[row] for row, _ in self.query(vector, top_k)]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, VECTORS_FILE), self.matrix)
+        with open(os.path.join(directory, METADATA_FILE), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "metadatas": self.metadatas}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> "VectorIndex":
+        """Loads a saved index; rows were normalized before saving, so the matrix can be memory-mapped as-is."""
+        matrix = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(directory, METADATA_FILE), encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["ids"], matrix, data["metadatas"])
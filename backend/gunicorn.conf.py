@@ -0,0 +1,35 @@
+# gunicorn -c gunicorn.conf.py main:app
+# The master imports the app and preloads the agents SDK and the active index once; uvicorn
+# workers forked from it share those pages copy-on-write and only warm up their own connections.
+# With REINDEX_WORKER it also starts the background reindex worker, which shares the index directory.
+import os
+import subprocess
+import sys
+from core.settings import settings
+from core.startup import preload
+
+bind = "0.0.0.0:8000"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+_reindex_worker = None
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before any worker is forked
+    global _reindex_worker
+    if settings.PRELOAD:
+        preload(fork_safe=True)
+    if settings.REINDEX_WORKER:
+        _reindex_worker = subprocess.Popen([sys.executable, "-m", "service.reindex_worker"], cwd=os.path.dirname(os.path.abspath(__file__)))
+        server.log.info(f"Started reindex worker {_reindex_worker.pid}")
+
+
+def on_exit(server):
+    if _reindex_worker is not None and _reindex_worker.poll() is None:
+        _reindex_worker.terminate()
+        try:
+            _reindex_worker.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _reindex_worker.kill()
@@ -1,25 +1,67 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends
+import hmac
+import json
+from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-from service.recommendation import get_scheme_response
-from service.reindex import reindex_schemes
+from typing import Dict, List, Optional, Union
+from service.batch import recommend_batch
+from service.recommendation import get_scheme_response, stream_scheme_response
 from contextlib import asynccontextmanager
-from agents import set_tracing_export_api_key
+import asyncio
 import redis.asyncio as redis
-from fastapi_limiter import FastAPILimiter
-from fastapi_limiter.depends import RateLimiter
-from core.firebase_auth import verify_firebase_token
+from core.firebase_auth import FirebaseTokenVerifier, firebase_project_id, get_token_verifier, set_token_verifier, verify_firebase_token
+from core.rate_limit import RateLimiter, TieredRateLimiter, enforce_rate_limits, get_rate_limiter, set_rate_limiter
 from core.settings import settings
-
-set_tracing_export_api_key(settings.OPENAI_API_KEY)
+from core.embeddings import create_embedding_client, get_embedding_client, set_embedding_client, close_embedding_client
+from core.embedding_cache import CachedEmbeddingClient
+from core.embedding_search import get_serving_index, watch_active_index
+from core.metrics import render_metrics, track_request
+from core.reindex_jobs import create_reindex_jobs, get_reindex_jobs, set_reindex_jobs
+from core.reranker import Reranker, get_reranker, set_reranker
+from core.response_cache import ResponseCache, get_response_cache, set_response_cache
+from core.session_store import SessionStore, get_session_store, session_key, set_session_store
+from core.single_flight import SingleFlight, get_single_flight, set_single_flight
+from core.startup import readiness, warm_up
+from core.streaming import format_sse
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis_conn = redis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True)
-    await FastAPILimiter.init(redis_conn)
+    rate_limiter = TieredRateLimiter(redis_conn)
+    await rate_limiter.start()
+    set_rate_limiter(rate_limiter)
+
+    token_verifier = FirebaseTokenVerifier(firebase_project_id())
+    await token_verifier.start()
+    set_token_verifier(token_verifier)
+
+    # Vectors are stored as raw float32 bytes, so the caches, sessions and coalescing share a binary
+    # connection. It is opened whatever EMBEDDING_CACHE_REDIS says: without it, sessions would only be
+    # visible to the worker that created them and identical requests only coalesced within each worker
+    cache_redis_conn = redis.from_url(settings.REDIS_URL)
+    embedding_cache_redis = cache_redis_conn if settings.EMBEDDING_CACHE_REDIS else None
+    set_embedding_client(CachedEmbeddingClient(create_embedding_client(), redis_conn=embedding_cache_redis))
+    if settings.RESPONSE_CACHE:
+        set_response_cache(ResponseCache(redis_conn=cache_redis_conn))
+    set_session_store(SessionStore(redis_conn=cache_redis_conn))
+    set_single_flight(SingleFlight(redis_conn=cache_redis_conn) if settings.SINGLE_FLIGHT else None)
+    set_reranker(Reranker.load() if settings.RERANK else None)
+    set_reindex_jobs(create_reindex_jobs(redis_conn))
+    # In the background, so /health can answer (not ready yet) while the worker warms up
+    warmup_task = asyncio.create_task(warm_up([redis_conn, cache_redis_conn]))
+    # Switches to the index a reindex job publishes, without a restart
+    reload_task = asyncio.create_task(watch_active_index())
     yield
+    warmup_task.cancel()
+    reload_task.cancel()
+    await asyncio.gather(warmup_task, reload_task, return_exceptions=True)
+    await rate_limiter.close()
+    await redis_conn.aclose()
+    await token_verifier.close()
+    await close_embedding_client()
+    await cache_redis_conn.aclose()
     
 # FastAPI app setup
 app = FastAPI(lifespan=lifespan)
@@ -34,32 +76,186 @@ app.add_middleware(
 
 
 class SchemeQuery(BaseModel):
-    conversation_history: List[str]
+    # May be left empty once the conversation has a server-side session
+    conversation_history: List[str] = []
     current_input: Optional[str] = ""
+    # Scheme fields to return, e.g. ["name", "benefits", "links"]; all fields when omitted
+    fields: Optional[List[str]] = None
+    # Client-chosen id that keeps this conversation's state on the server between turns
+    conversation_id: Optional[str] = None
+
+    def session_key(self, user) -> Optional[str]:
+        return session_key(user["uid"], self.conversation_id) if self.conversation_id else None
+
+# /recommend and /recommend/stream run the same agents, so they draw on one budget per user
+RECOMMEND_LIMIT_KEY = "/recommend"
 
 # API endpoint
 @app.post("/recommend", dependencies=[
-    Depends(RateLimiter(times=5, seconds=60)),       # 5 requests per minute
-    Depends(RateLimiter(times=50, seconds=86400))    # 20 requests per day
+    Depends(RateLimiter(times=5, seconds=60, key=RECOMMEND_LIMIT_KEY)),       # 5 requests per minute
+    Depends(RateLimiter(times=50, seconds=86400, key=RECOMMEND_LIMIT_KEY))    # 20 requests per day
 ])
 async def refine_endpoint(payload: SchemeQuery, user=Depends(verify_firebase_token)):
-    try:        
-        return await get_scheme_response(payload.conversation_history, payload.current_input)
+    try:
+        with track_request("recommend") as timer:
+            return await get_scheme_response(payload.conversation_history, payload.current_input, timer=timer, fields=payload.fields, session_key=payload.session_key(user))
     except Exception as e:
         raise HTTPException(status_code=200, detail=str(e))
 
-# Re-indexing endpoint
-# @app.post("/reindex", dependencies=[
-#     Depends(RateLimiter(times=100, seconds=86400))    # 1 request per day
-# ])
-# async def trigger_reindex():
-#     try:
-#         await reindex_schemes()
-#         return {"message": "Re-indexing complete."}
-#     except Exception as e:
-#         raise HTTPException(status_code=500, detail=str(e))
-
-# Health
+# Streaming variant of /recommend over Server-Sent Events
+@app.post("/recommend/stream", dependencies=[
+    Depends(RateLimiter(times=5, seconds=60, key=RECOMMEND_LIMIT_KEY)),       # 5 requests per minute
+    Depends(RateLimiter(times=50, seconds=86400, key=RECOMMEND_LIMIT_KEY))    # 20 requests per day
+])
+async def refine_stream_endpoint(payload: SchemeQuery, user=Depends(verify_firebase_token)):
+    async def event_stream():
+        try:
+            with track_request("recommend_stream") as timer:
+                async for frame in stream_scheme_response(payload.conversation_history, payload.current_input, timer=timer, fields=payload.fields, session_key=payload.session_key(user)):
+                    yield frame
+        except Exception as e:
+            # Headers are already sent, so errors travel as an event
+            yield format_sse("error", {"detail": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+class BatchProfile(BaseModel):
+    # Echoed back on the profile's result line
+    id: Optional[str] = None
+    conversation_history: List[str] = []
+    current_input: Optional[str] = ""
+    # Used when there is no conversation, e.g. {"age": 45, "gender": "female", "state": "Kerala", "occupation": "farmer"}
+    profile: Optional[Dict[str, Union[str, int, float]]] = None
+
+class BatchQuery(BaseModel):
+    profiles: List[BatchProfile]
+    fields: Optional[List[str]] = None
+
+# Many profiles in one request, for partner integrations; answered as NDJSON, one line per profile as it finishes
+@app.post("/recommend/batch")
+async def batch_endpoint(payload: BatchQuery, user=Depends(verify_firebase_token)):
+    if not payload.profiles:
+        raise HTTPException(status_code=400, detail="No profiles.")
+    if len(payload.profiles) > settings.BATCH_MAX_PROFILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_PROFILES} profiles per batch.")
+    # Batches have their own budgets, separate from /recommend's, and every profile costs one token of them;
+    # a batch over either budget takes nothing from the other
+    await enforce_rate_limits(
+        f"{user['uid']}:/recommend/batch",
+        [(settings.BATCH_PROFILES_PER_MINUTE, 60), (settings.BATCH_PROFILES_PER_DAY, 86400)],
+        cost=len(payload.profiles),
+    )
+
+    async def lines():
+        try:
+            with track_request("recommend_batch") as timer:
+                async for line in recommend_batch([profile.model_dump() for profile in payload.profiles], payload.fields, timer=timer):
+                    yield json.dumps(line, ensure_ascii=False) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+# Re-indexing runs as a background job (service/reindex_worker.py); these endpoints queue it and report its progress
+class ReindexRequest(BaseModel):
+    # Discard an interrupted rebuild's checkpoint and re-parse the shards
+    force_reindex: bool = False
+    # Re-embed only new and changed schemes
+    incremental: bool = True
+
+def bearer_matches(request: Request, token: Optional[str]) -> bool:
+    # An unset token matches nothing
+    return bool(token) and hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {token}")
+
+def verify_admin_token(request: Request):
+    # Closed unless ADMIN_TOKEN is set
+    if not bearer_matches(request, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+def verify_metrics_token(request: Request):
+    # /metrics and /stats/*: closed unless METRICS_TOKEN or ADMIN_TOKEN is set, and either one is accepted
+    if not (bearer_matches(request, settings.METRICS_TOKEN) or bearer_matches(request, settings.ADMIN_TOKEN)):
+        raise HTTPException(status_code=403, detail="Invalid metrics token.")
+
+# 202 with the queued job, or 200 with the job already queued or running
+@app.post("/admin/reindex", dependencies=[Depends(verify_admin_token)])
+async def trigger_reindex(payload: Optional[ReindexRequest] = None):
+    payload = payload or ReindexRequest()
+    job, created = await get_reindex_jobs().enqueue(payload.force_reindex, payload.incremental)
+    return JSONResponse(status_code=202 if created else 200, content=job)
+
+# The queued or running job, else the last one to finish, with the version this worker serves
+@app.get("/admin/reindex", dependencies=[Depends(verify_admin_token)])
+async def current_reindex():
+    return {"job": await get_reindex_jobs().current(), "serving_version": get_serving_index()["version"]}
+
+@app.get("/admin/reindex/{job_id}", dependencies=[Depends(verify_admin_token)])
+async def reindex_job(job_id: str):
+    job = await get_reindex_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No such reindex job.")
+    return job
+
+# Embedding cache counters, for sizing the cache
+@app.get("/stats/embedding-cache", dependencies=[Depends(verify_metrics_token)])
+async def embedding_cache_stats():
+    client = get_embedding_client()
+    return client.stats() if isinstance(client, CachedEmbeddingClient) else {}
+
+# Response cache hit rate and latency saved, for tuning the near-hit threshold
+@app.get("/stats/response-cache", dependencies=[Depends(verify_metrics_token)])
+async def response_cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {}
+
+# Token verification cache and signing-key refresh counters
+@app.get("/stats/auth", dependencies=[Depends(verify_metrics_token)])
+async def auth_stats():
+    return get_token_verifier().stats()
+
+# Rate limiter counters and Redis sync state
+@app.get("/stats/rate-limit", dependencies=[Depends(verify_metrics_token)])
+async def rate_limit_stats():
+    return get_rate_limiter().stats()
+
+# Requests coalesced onto another request's search or agent run
+@app.get("/stats/single-flight", dependencies=[Depends(verify_metrics_token)])
+async def single_flight_stats():
+    flight = get_single_flight()
+    return flight.stats() if flight is not None else {}
+
+# Local reranker: candidates kept per request and how often it answered without the agents
+@app.get("/stats/reranker", dependencies=[Depends(verify_metrics_token)])
+async def reranker_stats():
+    reranker = get_reranker()
+    return reranker.stats() if reranker is not None else {}
+
+# Prometheus scrape endpoint: request and stage latency histograms, token counts, cache and limiter counters
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(verify_metrics_token)])
+async def metrics():
+    client = get_embedding_client()
+    cache = get_response_cache()
+    sessions = get_session_store()
+    flight = get_single_flight()
+    reranker = get_reranker()
+    component_stats = {
+        "embedding_cache": client.stats() if isinstance(client, CachedEmbeddingClient) else {},
+        "response_cache": cache.stats() if cache is not None else {},
+        "session_store": sessions.stats() if sessions is not None else {},
+        "single_flight": flight.stats() if flight is not None else {},
+        "reranker": reranker.stats() if reranker is not None else {},
+        "auth": get_token_verifier().stats(),
+        "rate_limit": get_rate_limiter().stats(),
+    }
+    return PlainTextResponse(render_metrics(component_stats), media_type="text/plain; version=0.0.4")
+
+# Health: 503 until this worker has finished warming up, so it only takes traffic once ready
 @app.get("/health")
 async def health_check():
-    return {"status": "OK"}
\ No newline at end of file
+    state = readiness()
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "STARTING", **state})
+    return {"status": "OK", **state}
\ No newline at end of file
@@ -0,0 +1,118 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from typing import AsyncIterator, Dict, List, Optional
+from core.embedding_search import query_schemes_batch
+from core.embeddings import close_embedding_client
+from core.reranker import Reranker, set_reranker
+from core.settings import settings
+from core.timing import StageTimer
+from core.utils import combine_conversation
+from service.recommendation import recommend_from_candidates
+
+logger = logging.getLogger(__name__)
+
+
+def profile_query(profile: Dict[str, any]) -> str:
+    """
+    Search text for one batch profile: its conversation, or else its structured fields as
+    "name value" phrases, e.g. {"age": 45, "state": "Kerala"} -> "age 45, state Kerala".
+    Empty when there is nothing to search with, blank turns and values included.
+    """
+    history = [turn for turn in profile.get("conversation_history") or [] if turn and turn.strip()]
+    current_input = (profile.get("current_input") or "").strip()
+    if not history and not current_input and profile.get("profile"):
+        current_input = ", ".join(f"{name} {value}" for name, value in profile["profile"].items() if value is not None and str(value).strip())
+    return combine_conversation(history, current_input)
+
+async def recommend_batch(profiles: List[Dict[str, any]], fields: Optional[List[str]] = None, concurrency: int = None, timer: Optional[StageTimer] = None) -> AsyncIterator[Dict[str, any]]:
+    """
+    Recommendations for many profiles, yielded as each one finishes rather than in input order.
+    Each item has the profile's `index` in `profiles`, its `id` if it had one, and the response's
+    `message` and `results`, or an `error` for that profile alone.
+    All profiles are retrieved together (`query_schemes_batch`: one embedding call and one batched
+    vector query), then the recommendation agent runs for up to `concurrency` profiles at a time.
+    Nobody is there to answer a follow-up question, so the decision agent is skipped.
+    Stages and token usage of every profile accumulate on `timer`.
+    """
+    timer = timer or StageTimer()
+    semaphore = asyncio.Semaphore(concurrency or settings.BATCH_CONCURRENCY)
+    with timer.stage("combine"):
+        queries = [profile_query(profile) for profile in profiles]
+    searched = [i for i, query in enumerate(queries) if query]
+    with timer.stage("retrieval"):
+        candidates = dict(zip(searched, await query_schemes_batch([queries[i] for i in searched], 25, timer)))
+    timer.info["profiles"] = len(profiles)
+    timer.info["candidates"] = sum(len(matched) for matched in candidates.values())
+
+    async def recommend(i: int) -> Dict[str, any]:
+        line = {"index": i}
+        if profiles[i].get("id") is not None:
+            line["id"] = profiles[i]["id"]
+        if not queries[i]:
+            # Retrieval needs text, and nobody is there to answer a follow-up question asking for some
+            return {**line, "error": "Empty profile: no conversation_history, current_input or profile fields"}
+        async with semaphore:
+            try:
+                response = await recommend_from_candidates(queries[i], candidates[i], timer, fields, ask_followup=False)
+            except Exception as e:
+                logger.error(f"Batch profile {i} failed: {e}")
+                return {**line, "error": str(e)}
+        return {**line, **response}
+
+    tasks = [asyncio.create_task(recommend(i)) for i in range(len(profiles))]
+    failed = results = 0
+    try:
+        for finished in asyncio.as_completed(tasks):
+            line = await finished
+            failed += "error" in line
+            results += len(line.get("results") or [])
+            yield line
+    finally:
+        # A client that disconnects mid-batch stops the profiles not yet answered
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        timer.info["failed"] = failed
+        timer.info["results"] = results
+    logger.info(f"Batch of {len(profiles)} profiles ({failed} failed), stage timings (ms): {timer.summary()}")
+
+def read_profiles(path: str) -> List[Dict[str, any]]:
+    """Profiles from a JSON array or a JSON Lines file ("-" for stdin)."""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        text = f.read()
+    finally:
+        if f is not sys.stdin:
+            f.close()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+async def main(args):
+    set_reranker(Reranker.load() if settings.RERANK else None)
+    profiles = read_profiles(args.profiles)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        async for line in recommend_batch(profiles, args.fields, args.concurrency):
+            out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        await close_embedding_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Recommend schemes for a file of beneficiary profiles against the local index, writing NDJSON as each profile finishes.",
+        epilog='cd backend && python -m service.batch profiles.jsonl -o results.ndjson. Each profile is '
+               '{"id": ..., "conversation_history": [...], "current_input": ...} or {"id": ..., "profile": {"age": 45, ...}}.',
+    )
+    parser.add_argument("profiles", help="JSON array or JSON Lines file of profiles, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON output file, - for stdout")
+    parser.add_argument("--fields", nargs="*", help="scheme fields to return; all fields when omitted")
+    parser.add_argument("--concurrency", type=int, default=None, help="agent runs at once (BATCH_CONCURRENCY)")
+    asyncio.run(main(parser.parse_args()))
@@ -1,114 +1,378 @@
+import asyncio
 import json
 import logging
-from typing import List, Dict, Union, Tuple
-from agents import Agent, Runner
-from core.prompts import build_prompt, build_decision_prompt, SYSTEM_PROMPT, DECISION_PROMPT
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Awaitable, Callable, List, Dict, Optional, TypeVar, Union, Tuple
+from core.prompts import build_prompt, build_decision_prompt, build_scheme_row, count_tokens, tokenizer_name, SYSTEM_PROMPT, DECISION_PROMPT
 from core.utils import MODEL, combine_conversation, parse_matched_schemes
-from core.embedding_search import query_schemes
+from core.embedding_search import get_scheme_details, get_serving_index, query_schemes, rerank_candidates
+from core.embeddings import get_embedding_client
+from core.reranker import explain, get_reranker, log_selection
+from core.response_cache import get_response_cache, projection_key
+from core.session_store import combine_vectors, get_session_store
+from core.single_flight import flight_key, get_single_flight
+from core.streaming import IncrementalSchemeParser, format_sse
+from core.scheme_filters import extract_constraints, is_specific_query
+from core.settings import settings
+from core.timing import StageTimer
+
+if TYPE_CHECKING:
+    from agents import Agent
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def summarize_scheme(scheme: Dict[str, str]) -> Dict[str, str]:
-    """Summarize a scheme's relevant fields for use in the Recommendation Agent prompt."""
-    
-    # Fallback helpers
-    def safe(val, fallback="N/A"):
-        return val if val else fallback
+T = TypeVar("T")
 
-    def short(text, limit=100):
-        return text[:limit].strip() + ("..." if len(text) > limit else "")
-    
-    # Compose the summary
-    summary = (
-        f"Id: {scheme.get('id')} "
-        f"{scheme.get('name', 'Unnamed Scheme')} "
-        f"is a {safe(scheme.get('benefitType'), 'benefit')} scheme by the "
-        f"{safe(scheme.get('department'), 'concerned department')} in {safe(scheme.get('state'), 'India')}.\n"
-        f"Target group: {', '.join(scheme.get('beneficiaries', [])) if isinstance(scheme.get('beneficiaries'), list) else safe(scheme.get('beneficiaries'))}.\n"
-        f"Eligibility: {short(scheme.get('eligibility', 'N/A'), 150)}\n"
-        f"Purpose: {short(scheme.get('description') or scheme.get('purpose'), 200)}\n"
-        f"Benefit Amount: {safe(scheme.get('amount_range')) or safe(scheme.get('benefits'), 'N/A')}"
-    )
+# Fields sent for each retrieved candidate before the agents have run
+CANDIDATE_FIELDS = ("id", "name", "shortTitle", "level", "state", "category")
 
-    return {
-        "name": scheme.get("name", "Unnamed Scheme"),
-        "summary": summary
-    }
+def summarize_scheme(scheme: Dict[str, str]) -> str:
+    """Compact prompt row for a scheme; precomputed at index time, rebuilt only for older indexes."""
+    return scheme.get("promptRow") or build_scheme_row(scheme)
 
 
-async def get_followup_question(combined_query: str, summarized_schemes: list):
-    decision_agent = Agent(
-        name="Follow-up Decision Agent",
-        instructions=DECISION_PROMPT,
+# The agents SDK (and the openai types it pulls in) takes seconds to import, so it is loaded on
+# first use, or ahead of time by `core.startup.preload`. Benchmarks replace `Runner` with a stand-in.
+Runner = None
+
+def get_runner():
+    global Runner
+    if Runner is None:
+        from agents import Runner as AgentsRunner, set_tracing_export_api_key
+        set_tracing_export_api_key(settings.OPENAI_API_KEY)
+        Runner = AgentsRunner
+    return Runner
+
+def build_agent(name: str, instructions: str) -> "Agent":
+    from agents import Agent, ModelSettings
+    return Agent(
+        name=name,
+        instructions=instructions,
         model=MODEL,
+        # Ask for token usage on streamed completions too, so every run reports real token counts
+        model_settings=ModelSettings(include_usage=True),
         tools=[],
     )
 
+async def get_followup_question(combined_query: str, summarized_schemes: list, timer: Optional[StageTimer] = None):
+    decision_agent = build_agent("Follow-up Decision Agent", DECISION_PROMPT)
+
     decision_prompt = build_decision_prompt(combined_query, summarized_schemes)
-    logger.info(f"Follow-up Decision Prompt Token Length: {len(decision_prompt)}")
-    decision_response = await Runner.run(decision_agent, decision_prompt)
+    logger.info(f"Follow-up Decision Prompt tokens ({tokenizer_name()}): {count_tokens(decision_prompt)}")
+    decision_response = await get_runner().run(decision_agent, decision_prompt)
+    if timer is not None:
+        timer.add_usage("decision", decision_response.context_wrapper.usage)
 
     return decision_response.final_output.strip()
 
-async def get_scheme_response(conversation_history: List[str], current_input: str) -> Dict[str, Union[str, List[Dict[str, any]]]]:
-    combined_query = combine_conversation(conversation_history, current_input)
+def parse_decision(decision_response_raw: str, matched_schemes: List[Dict[str, any]], fields: Optional[List[str]] = None) -> Optional[Dict[str, any]]:
+    """The follow-up response when the decision agent asks a question, else None."""
+    try:
+        decision_json = json.loads(decision_response_raw)
+    except Exception as e:
+        logger.error("Invalid JSON from decision agent")
+        raise e
+
+    followup_needed = decision_json.get("followup_needed", False)
+    show_recommendations = decision_json.get("show_recommendations", False)
+    followup_question = decision_json.get("followup_question", "null")
+
+    logger.info(decision_json)
+
+    if followup_question != None:
+        preview_ids = [scheme.get("id") for scheme in matched_schemes[:5]] if show_recommendations else []
+        details = get_scheme_details(preview_ids, fields)
+        return {
+            "followup_needed": followup_needed,
+            "message": followup_question,
+            "results": [details[scheme_id] for scheme_id in preview_ids if scheme_id in details]
+        }
+    return None
+
+def build_matcher_agent() -> "Agent":
+    return build_agent("Scheme Recommendation Agent", SYSTEM_PROMPT)
+
+def needs_decision(combined_query: str, matched_schemes: List[Dict[str, any]]) -> bool:
+    """Whether to ask the decision agent for a follow-up; specific queries skip it when the heuristic is enabled."""
+    if len(matched_schemes) <= 10:
+        return False
+    if settings.DECISION_SKIP_HEURISTIC and is_specific_query(combined_query, settings.DECISION_SKIP_MIN_SCORE):
+        logger.info("Query is specific enough, skipping follow-up decision agent")
+        return False
+    return True
+
+async def decide_followup(combined_query: str, summarized_schemes: list, matched_schemes: List[Dict[str, any]], timer: StageTimer, fields: Optional[List[str]] = None) -> Optional[Dict[str, any]]:
+    with timer.stage("decision"):
+        decision_response_raw = await get_followup_question(combined_query, summarized_schemes, timer)
+    return parse_decision(decision_response_raw, matched_schemes, fields)
+
+async def embed_query(combined_query: str) -> List[float]:
+    # Usually served by the embedding cache, since retrieval just embedded the same text
+    return (await get_embedding_client().embed([combined_query]))[0]
+
+async def query_vector_for(combined_query: str, query_vector: Optional[List[float]]) -> List[float]:
+    return query_vector if query_vector is not None else await embed_query(combined_query)
+
+def conflicting_constraints(previous: Dict[str, any], new: Dict[str, any]) -> bool:
+    """True when the new turn changes a constraint stated earlier, e.g. a different state."""
+    return any(value is not None and previous.get(name) not in (None, value) for name, value in new.items())
+
+async def coalesced(stage: str, key: str, work: Callable[[], Awaitable[T]], timer: StageTimer) -> Tuple[T, bool]:
+    """
+    `work()` run once for concurrent callers with the same key, in this worker and across workers;
+    True with the result when another caller's run produced it.
+    """
+    flight = get_single_flight()
+    if flight is None:
+        return await work(), False
+    result, shared = await flight.do(key, work)
+    if shared:
+        timer.info.setdefault("coalesced", []).append(stage)
+    return result, shared
+
+async def search_schemes(
+    combined_query: str,
+    top_k: int,
+    constraints: Optional[Dict[str, any]],
+    version: Optional[str],
+    timer: StageTimer,
+    fusion_depth: Optional[int] = None,
+    query_vector: Optional[List[float]] = None,
+) -> List[Dict[str, any]]:
+    key = flight_key("search", version, combined_query, top_k, constraints, fusion_depth)
+    matched, _ = await coalesced(
+        "search", key,
+        lambda: query_schemes(combined_query, top_k=top_k, constraints=constraints, timer=timer, fusion_depth=fusion_depth, query_vector=query_vector),
+        timer,
+    )
+    return matched
+
+async def retrieve_candidates(combined_query: str, new_turn: str, session: Optional[Dict[str, any]], version: Optional[str], timer: StageTimer) -> Tuple[List[Dict[str, any]], Optional[List[float]], Optional[Dict[str, any]]]:
+    """
+    Candidates for this turn, the conversation embedding when one was computed, and the session
+    state to save (None outside a session).
+    A follow-up turn in a session embeds only the new message and re-ranks the previous candidate
+    pool with it; the first turn, a changed constraint, a reindex or a pool narrowed below
+    SESSION_MIN_CANDIDATES run the full search over the whole conversation, returning the same
+    candidates as outside a session and storing SESSION_CANDIDATE_POOL of them as the pool.
+    """
+    if session is None:
+        timer.info["retrieval"] = "search"
+        return await search_schemes(combined_query, 25, None, version, timer), None, None
+
+    new_constraints = extract_constraints(new_turn)
+    previous = session.get("constraints") or {}
+    if (
+        new_turn and session.get("vector") and session.get("candidates")
+        and session.get("version") == version
+        and not conflicting_constraints(previous, new_constraints)
+    ):
+        constraints = {**previous, **{name: value for name, value in new_constraints.items() if value is not None}}
+        with timer.stage("embed"):
+            vector = combine_vectors(session["vector"], await embed_query(new_turn), settings.SESSION_TURN_WEIGHT)
+        with timer.stage("rerank"):
+            pool = rerank_candidates(combined_query, vector, session["candidates"], constraints if settings.SCHEME_PREFILTER else None)
+        if len(pool) >= settings.SESSION_MIN_CANDIDATES:
+            timer.info["retrieval"] = "rerank"
+            logger.info(f"Re-ranked {len(session['candidates'])} session candidates, {len(pool)} left")
+            state = {"constraints": constraints, "candidates": [m.get("id") for m in pool], "vector": vector, "version": version}
+            return pool[:25], vector, state
+
+    timer.info["retrieval"] = "search"
+    constraints = extract_constraints(combined_query)
+    # The session keeps the conversation embedding, so it is computed once and handed to the search
+    with timer.stage("embed"):
+        vector = await embed_query(combined_query)
+    # One search for the pool; fused at depth 25, its first 25 are the candidates outside a session
+    pool = await search_schemes(combined_query, max(settings.SESSION_CANDIDATE_POOL, 25), None, version, timer, fusion_depth=25, query_vector=vector)
+    state = {"constraints": constraints, "candidates": [m.get("id") for m in pool], "vector": vector, "version": version}
+    return pool[:25], vector, state
+
+async def load_session(session_key: Optional[str]) -> Optional[Dict[str, any]]:
+    """The stored session for `session_key` ({} for a new one), or None outside a session."""
+    sessions = get_session_store() if session_key else None
+    if sessions is None:
+        return None
+    return await sessions.load(session_key) or {}
+
+async def remember_turn(session_key: Optional[str], state: Optional[Dict[str, any]], turns: List[str]):
+    sessions = get_session_store() if session_key else None
+    if sessions is not None and state is not None:
+        await sessions.save(session_key, {**state, "turns": turns})
+
+def direct_response(combined_query: str, ranked: List[Dict[str, any]], count: int, fields: Optional[List[str]] = None) -> Dict[str, any]:
+    """The response for a query whose best candidate clearly wins, made without the agents: it and the next few kept candidates."""
+    picked = ranked[:count]
+    details = get_scheme_details([scheme.get("id") for scheme in picked], fields)
+    results = [{**details[scheme["id"]], "reason": explain(combined_query, scheme)} for scheme in picked if scheme.get("id") in details]
+    message = f"{picked[0].get('name')} looks like the best match for what you described."
+    if len(results) > 1:
+        message += " A few related schemes follow it."
+    return {"message": message, "results": results}
+
+async def rerank_for_agents(combined_query: str, matched_schemes: List[Dict[str, any]], query_vector: Optional[List[float]], timer: StageTimer, fields: Optional[List[str]] = None) -> Tuple[List[Dict[str, any]], Optional[Dict[str, any]]]:
+    """
+    The candidates to send to the agents, reordered by the local reranker and cut where their
+    scores fall off, and a response that skips the agents when the best candidate clearly wins
+    (else None). Without a reranker set up the candidates are returned as they are.
+    """
+    reranker = get_reranker()
+    if reranker is None or not matched_schemes:
+        return matched_schemes, None
+    with timer.stage("embed"):
+        vector = await query_vector_for(combined_query, query_vector)
+    started = time.perf_counter()
+    with timer.stage("reranker"):
+        ranked, scores = reranker.rank(combined_query, vector, matched_schemes)
+        keep = reranker.cutoff(scores)
+        direct = settings.RERANK_DIRECT and reranker.clear_winner(scores)
+    reranker.record(len(matched_schemes), keep, direct, (time.perf_counter() - started) * 1000)
+    timer.info["rerank"] = "direct" if direct else "agents"
+    # Summed over the profiles of a batch
+    timer.info["kept"] = timer.info.get("kept", 0) + keep
+    logger.info(f"Reranked {len(matched_schemes)} candidates, kept {keep}, top scores {[round(float(s), 3) for s in scores[:3]]}")
+    if not direct:
+        return ranked[:keep], None
+    with timer.stage("map"):
+        response = direct_response(combined_query, ranked, min(keep, settings.RERANK_DIRECT_RESULTS), fields)
+    logger.info(f"Clear reranker winner, skipping the agents, stage timings (ms): {timer.summary()}")
+    return ranked[:keep], response
+
+def record_response(timer: StageTimer, response: Dict[str, any], cache: Optional[str] = None):
+    """Notes on `timer` what the request returned, for its metrics and trace record."""
+    timer.info["outcome"] = "followup" if "followup_needed" in response else "recommendation"
+    timer.info["results"] = len(response.get("results") or [])
+    if cache is not None:
+        timer.info["cache"] = cache
+
+async def get_scheme_response(conversation_history: List[str], current_input: str, timer: Optional[StageTimer] = None, fields: Optional[List[str]] = None, session_key: Optional[str] = None) -> Dict[str, Union[str, List[Dict[str, any]]]]:
+    """
+    Recommendation for one conversation turn. Retrieval works on slim metadata; full details
+    are read from the detail store only for the schemes returned, projected onto `fields` if given.
+    With the response cache set up, an exact or near repeat of a cached turn skips the agents.
+    With a `session_key`, earlier turns come from the stored session rather than `conversation_history`.
+    Concurrent identical turns share one search and one run of the agents (see `coalesced`).
+    """
+    timer = timer or StageTimer()
+    with timer.stage("session"):
+        session = await load_session(session_key)
+    if session:
+        conversation_history = session["turns"]
+    turns = conversation_history + [current_input] if current_input else list(conversation_history)
+    with timer.stage("combine"):
+        combined_query = combine_conversation(conversation_history, current_input)
 
     logger.info(f"combined query from user: {combined_query}")
 
-    matched_schemes = await query_schemes(combined_query, top_k=25)
+    cache = get_response_cache()
+    version = get_serving_index()["version"] if cache or session is not None or get_single_flight() else None
+    started = time.perf_counter()
+    if cache:
+        with timer.stage("cache"):
+            cached_response = await cache.get_exact(version, combined_query, fields)
+        if cached_response is not None:
+            record_response(timer, cached_response, cache="exact")
+            logger.info(f"Response cache exact hit, stage timings (ms): {timer.summary()}")
+            # Retrieval was skipped, so the next turn in the session searches afresh
+            await remember_turn(session_key, session and {**session, "vector": None}, turns)
+            return cached_response
+
+    with timer.stage("retrieval"):
+        matched_schemes, query_vector, state = await retrieve_candidates(combined_query, current_input, session, version, timer)
+    timer.info["candidates"] = len(matched_schemes)
     
     logger.info(f"Initial matched scheme count: {len(matched_schemes)}")
-    
-    summarized_schemes = [summarize_scheme(s) for s in matched_schemes]
 
-    if len(matched_schemes) > 10:
-        decision_response_raw = await get_followup_question(combined_query, summarized_schemes)
+    candidate_ids = [scheme.get("id") for scheme in matched_schemes]
+    if cache:
+        with timer.stage("cache (near)"):
+            cached_response = await cache.get_near(version, lambda: query_vector_for(combined_query, query_vector), candidate_ids, fields)
+        if cached_response is not None:
+            record_response(timer, cached_response, cache="near")
+            logger.info(f"Response cache near hit, stage timings (ms): {timer.summary()}")
+            await remember_turn(session_key, state, turns)
+            return cached_response
+        timer.info["cache"] = "miss"
+
+    key = flight_key("recommend", version, combined_query, candidate_ids, projection_key(fields))
+    response, shared = await coalesced("recommend", key, lambda: recommend_from_candidates(combined_query, matched_schemes, timer, fields, query_vector=query_vector), timer)
+    record_response(timer, response)
+    # The caller whose run produced a shared response stores it
+    if cache and not shared:
+        compute_ms = (time.perf_counter() - started) * 1000
+        await cache.store(version, combined_query, fields, await query_vector_for(combined_query, query_vector), candidate_ids, response, compute_ms)
+    await remember_turn(session_key, state, turns)
+    return response
+
+async def recommend_from_candidates(combined_query: str, matched_schemes: List[Dict[str, any]], timer: StageTimer, fields: Optional[List[str]] = None, ask_followup: bool = True, query_vector: Optional[List[float]] = None) -> Dict[str, Union[str, List[Dict[str, any]]]]:
+    """
+    The follow-up question or the picked schemes for retrieved candidates, via the decision and
+    recommendation agents. Without `ask_followup` only the recommendation agent runs.
+    The local reranker first narrows the candidates the agents see, and answers by itself when
+    one clearly wins; `query_vector` is the conversation's embedding if retrieval computed one.
+    """
+    retrieved = matched_schemes
+    matched_schemes, response = await rerank_for_agents(combined_query, matched_schemes, query_vector, timer, fields)
+    if response is not None:
+        return response
+
+    with timer.stage("summarize"):
+        summarized_schemes = [summarize_scheme(s) for s in matched_schemes]
+        matching_prompt, prompt_stats = build_prompt(combined_query, summarized_schemes)
+    logger.info(f"Recommendation Prompt tokens ({tokenizer_name()}): {prompt_stats}")
 
+    match_response = None
+    # Whether to ask depends on how broad retrieval was, not on how far the reranker narrowed it
+    if ask_followup and needs_decision(combined_query, retrieved):
+        # Speculatively start the recommendation agent; it is cancelled if a follow-up is returned instead
+        match_task = None
+        if settings.SPECULATIVE_AGENTS:
+            async def run_matcher():
+                # The run is created inside the task, so cancelling it before it starts leaves no coroutine unawaited
+                return await timer.timed("recommendation", get_runner().run(build_matcher_agent(), matching_prompt))
+
+            match_task = asyncio.create_task(run_matcher())
         try:
-            decision_json = json.loads(decision_response_raw)
-        except Exception as e:
-            logger.error("Invalid JSON from decision agent")
-            raise e
-
-        followup_needed = decision_json.get("followup_needed", False)
-        show_recommendations = decision_json.get("show_recommendations", False)
-        followup_question = decision_json.get("followup_question", "null")
-        
-        logger.info(decision_json)
-
-        if followup_question != None:
-            return {
-                "followup_needed": followup_needed,
-                "message": followup_question,
-                "results": matched_schemes[:5] if show_recommendations else [] 
-            }
-
-    matcher_agent = Agent(
-        name="Scheme Recommendation Agent",
-        instructions=SYSTEM_PROMPT,
-        model=MODEL,
-        tools=[]
-    )
+            followup_response = await decide_followup(combined_query, summarized_schemes, matched_schemes, timer, fields)
+        except BaseException:
+            if match_task is not None:
+                match_task.cancel()
+                await asyncio.gather(match_task, return_exceptions=True)
+            raise
+        if followup_response is not None:
+            if match_task is not None:
+                match_task.cancel()
+                await asyncio.gather(match_task, return_exceptions=True)
+            logger.info(f"Stage timings (ms): {timer.summary()}")
+            return followup_response
+        if match_task is not None:
+            match_response = await match_task
 
-    matching_prompt = build_prompt(combined_query, summarized_schemes)
-    logger.info(f"Recommendation Prompt Token Length: {len(matching_prompt)}")
-    match_response = await Runner.run(matcher_agent, matching_prompt)
+    if match_response is None:
+        match_response = await timer.timed("recommendation", get_runner().run(build_matcher_agent(), matching_prompt))
+    timer.add_usage("recommendation", match_response.context_wrapper.usage)
+    logger.info(f"Stage timings (ms): {timer.summary()}")
 
     try:
-        message, parsed_schemes = parse_matched_schemes(match_response.final_output)
+        with timer.stage("parse"):
+            message, parsed_schemes = parse_matched_schemes(match_response.final_output)
         
         logger.info(f"Final schemes returned: {len(parsed_schemes)}")
 
-        # Create a mapping of scheme IDs to full scheme details
-        scheme_map = {scheme.get("id"): scheme for scheme in matched_schemes}
-        
-        # Map parsed schemes to full scheme details using list comprehension
-        mapped_schemes = [
-            {**scheme_map[parsed_scheme["id"]], "reason": parsed_scheme.get("reason", "")}
-            for parsed_scheme in parsed_schemes
-            if parsed_scheme.get("id") in scheme_map
-        ]
+        # Only ids that retrieval returned are valid picks
+        matched_ids = {scheme.get("id") for scheme in matched_schemes}
+        picked = [parsed_scheme for parsed_scheme in parsed_schemes if parsed_scheme.get("id") in matched_ids]
+        log_selection(combined_query, [scheme.get("id") for scheme in matched_schemes], [parsed_scheme["id"] for parsed_scheme in picked])
+
+        # Full scheme details are read only for the picked schemes
+        with timer.stage("map"):
+            scheme_map = get_scheme_details([parsed_scheme["id"] for parsed_scheme in picked], fields)
+            mapped_schemes = [
+                {**scheme_map[parsed_scheme["id"]], "reason": parsed_scheme.get("reason", "")}
+                for parsed_scheme in picked
+                if parsed_scheme["id"] in scheme_map
+            ]
 
         return {
             "message": message,
@@ -118,3 +382,159 @@ async def get_scheme_response(conversation_history: List[str], current_input: st
     except Exception as e:
         logger.error(f"Error parsing agent response: {str(e)}")
         raise ValueError(f"Failed to parse response: {str(e)}")
+
+def replay_sse(response: Dict[str, any]) -> List[str]:
+    """SSE frames for a cached response: `followup` or `message` plus one `scheme` per result, then `done`."""
+    if "followup_needed" in response:
+        return [format_sse("followup", response), format_sse("done", response)]
+    frames = [format_sse("message", {"text": response["message"]})]
+    frames += [format_sse("scheme", scheme) for scheme in response["results"]]
+    return frames + [format_sse("done", response)]
+
+async def stream_scheme_response(conversation_history: List[str], current_input: str, timer: Optional[StageTimer] = None, fields: Optional[List[str]] = None, session_key: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Same flow as `get_scheme_response`, as Server-Sent Events frames:
+    - `candidates` as soon as retrieval returns
+    - `token` for each piece of the agent's message as it is generated, then `message`
+    - `scheme` for each recommended scheme once its JSON object is complete
+    - `followup` instead of the above when the decision agent asks a question
+    - `done` with the full response, identical to the non-streaming endpoint
+    A response cache hit replays the cached response; an exact hit skips `candidates` and `token`.
+    """
+    from openai.types.responses import ResponseTextDeltaEvent
+    timer = timer or StageTimer()
+    with timer.stage("session"):
+        session = await load_session(session_key)
+    if session:
+        conversation_history = session["turns"]
+    turns = conversation_history + [current_input] if current_input else list(conversation_history)
+    with timer.stage("combine"):
+        combined_query = combine_conversation(conversation_history, current_input)
+
+    logger.info(f"combined query from user: {combined_query}")
+
+    cache = get_response_cache()
+    version = get_serving_index()["version"] if cache or session is not None or get_single_flight() else None
+    started = time.perf_counter()
+    if cache:
+        with timer.stage("cache"):
+            cached_response = await cache.get_exact(version, combined_query, fields)
+        if cached_response is not None:
+            record_response(timer, cached_response, cache="exact")
+            logger.info(f"Response cache exact hit, stage timings (ms): {timer.summary()}")
+            await remember_turn(session_key, session and {**session, "vector": None}, turns)
+            for frame in replay_sse(cached_response):
+                yield frame
+            return
+
+    with timer.stage("retrieval"):
+        matched_schemes, query_vector, state = await retrieve_candidates(combined_query, current_input, session, version, timer)
+    timer.info["candidates"] = len(matched_schemes)
+
+    logger.info(f"Initial matched scheme count: {len(matched_schemes)}")
+
+    yield format_sse("candidates", {
+        "results": [{field: scheme.get(field) for field in CANDIDATE_FIELDS} for scheme in matched_schemes]
+    })
+
+    candidate_ids = [scheme.get("id") for scheme in matched_schemes]
+    if cache:
+        with timer.stage("cache (near)"):
+            cached_response = await cache.get_near(version, lambda: query_vector_for(combined_query, query_vector), candidate_ids, fields)
+        if cached_response is not None:
+            record_response(timer, cached_response, cache="near")
+            logger.info(f"Response cache near hit, stage timings (ms): {timer.summary()}")
+            await remember_turn(session_key, state, turns)
+            for frame in replay_sse(cached_response):
+                yield frame
+            return
+        timer.info["cache"] = "miss"
+
+    retrieved = matched_schemes
+    matched_schemes, direct = await rerank_for_agents(combined_query, matched_schemes, query_vector, timer, fields)
+    if direct is not None:
+        record_response(timer, direct)
+        for frame in replay_sse(direct):
+            yield frame
+        if cache:
+            compute_ms = (time.perf_counter() - started) * 1000
+            await cache.store(version, combined_query, fields, await query_vector_for(combined_query, query_vector), candidate_ids, direct, compute_ms)
+        await remember_turn(session_key, state, turns)
+        return
+
+    with timer.stage("summarize"):
+        summarized_schemes = [summarize_scheme(s) for s in matched_schemes]
+        matching_prompt, prompt_stats = build_prompt(combined_query, summarized_schemes)
+    logger.info(f"Recommendation Prompt tokens ({tokenizer_name()}): {prompt_stats}")
+
+    match_response = None
+    recommendation_started = None
+    try:
+        if needs_decision(combined_query, retrieved):
+            if settings.SPECULATIVE_AGENTS:
+                # Starts generating in the background; events queue up until they are consumed
+                recommendation_started = time.perf_counter()
+                match_response = get_runner().run_streamed(build_matcher_agent(), matching_prompt)
+            followup_response = await decide_followup(combined_query, summarized_schemes, matched_schemes, timer, fields)
+            if followup_response is not None:
+                if match_response is not None:
+                    match_response.cancel()
+                    timer.stages["recommendation (cancelled)"] = (time.perf_counter() - recommendation_started) * 1000
+                    timer.add_usage("recommendation", match_response.context_wrapper.usage)
+                record_response(timer, followup_response)
+                logger.info(f"Stage timings (ms): {timer.summary()}")
+                yield format_sse("followup", followup_response)
+                yield format_sse("done", followup_response)
+                if cache:
+                    compute_ms = (time.perf_counter() - started) * 1000
+                    await cache.store(version, combined_query, fields, await query_vector_for(combined_query, query_vector), candidate_ids, followup_response, compute_ms)
+                await remember_turn(session_key, state, turns)
+                return
+
+        if match_response is None:
+            recommendation_started = time.perf_counter()
+            match_response = get_runner().run_streamed(build_matcher_agent(), matching_prompt)
+
+        matched_ids = {scheme.get("id") for scheme in matched_schemes}
+        parser = IncrementalSchemeParser()
+        mapped_schemes = []
+
+        async for event in match_response.stream_events():
+            if event.type != "raw_response_event" or not isinstance(event.data, ResponseTextDeltaEvent):
+                continue
+            with timer.stage("parse"):
+                parsed = parser.feed(event.data.delta)
+            for kind, value in parsed:
+                if kind == "scheme":
+                    with timer.stage("map"):
+                        details = get_scheme_details([value.get("id")], fields) if value.get("id") in matched_ids else {}
+                    if not details:
+                        continue
+                    value = {**details[value["id"]], "reason": value.get("reason", "")}
+                    mapped_schemes.append(value)
+                yield format_sse(kind, value if kind == "scheme" else {"text": value})
+    finally:
+        if match_response is not None and not match_response.is_complete:
+            match_response.cancel()
+
+    timer.stages["recommendation"] = (time.perf_counter() - recommendation_started) * 1000
+    timer.add_usage("recommendation", match_response.context_wrapper.usage)
+    logger.info(f"Stage timings (ms): {timer.summary()}")
+
+    if parser.message is None:
+        logger.error("Error parsing streamed agent response")
+        raise ValueError("Failed to parse response: incomplete agent output")
+
+    logger.info(f"Final schemes returned: {len(mapped_schemes)}")
+    log_selection(combined_query, [scheme.get("id") for scheme in matched_schemes], [scheme["id"] for scheme in mapped_schemes])
+
+    response = {
+        "message": parser.message,
+        "results": mapped_schemes
+    }
+    record_response(timer, response)
+    yield format_sse("done", response)
+    if cache:
+        compute_ms = (time.perf_counter() - started) * 1000
+        await cache.store(version, combined_query, fields, await query_vector_for(combined_query, query_vector), candidate_ids, response, compute_ms)
+    await remember_turn(session_key, state, turns)
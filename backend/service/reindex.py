@@ -1,8 +1,15 @@
 import os
+import re
 import json
-from typing import List, Dict
-from core.utils import clean_text_field
-from core.embedding_search import index_schemes
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Tuple
+from core.utils import clean_text_field, clean_text_fields
+from core.embedding_search import index_schemes, update_index
+from core.scheme_store import SchemeStore, SchemeStoreWriter
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
 
 DETAILS_DIR = os.path.join(os.path.dirname(__file__), '../../data/scheme-details')
 SCHEMES_JSON_PATH = os.path.join(os.path.dirname(__file__), '../../data/schemes.json')
@@ -21,19 +28,17 @@ def load_schemes_age_limits():
     global SCHEMES_AGE_LIMITS
     if SCHEMES_AGE_LIMITS is None:
         SCHEMES_AGE_LIMITS = {}
-        with open(SCHEMES_JSON_PATH, encoding='utf-8') as f:
-            schemes = json.load(f)
-            for scheme in schemes:
-                fields = scheme.get('fields', {})
-                slug = fields.get('slug')
-                age = fields.get('age', {})
-                if slug and age:
-                    SCHEMES_AGE_LIMITS[slug] = {}
-                    for category, limits in age.items():
-                        SCHEMES_AGE_LIMITS[slug][category] = {
-                            'min_age': limits.get('gte'),
-                            'max_age': limits.get('lte')
-                        }
+        for scheme in load_schemes_json():
+            fields = scheme.get('fields', {})
+            slug = fields.get('slug')
+            age = fields.get('age', {})
+            if slug and age:
+                SCHEMES_AGE_LIMITS[slug] = {}
+                for category, limits in age.items():
+                    SCHEMES_AGE_LIMITS[slug][category] = {
+                        'min_age': limits.get('gte'),
+                        'max_age': limits.get('lte')
+                    }
     return SCHEMES_AGE_LIMITS
 
 def get_age_by_slug(slug: str):
@@ -74,6 +79,8 @@ def extract_scheme_fields(scheme_obj, scheme_id):
             "id": scheme_id,
             
             "name": basic.get("schemeName", ""),
+
+            "shortTitle": basic.get("schemeShortTitle") or "",
             
             "ageLimits": get_age_by_slug(scheme_id),
 
@@ -99,7 +106,7 @@ def extract_scheme_fields(scheme_obj, scheme_id):
 
             "benefitType": content.get("benefitTypes", {}).get("label", "") if basic.get("benefitTypes") else "" ,
 
-            "applicationProcess": [clean_text_field(ap.get("process_md", "")) for ap in applicationProcess],
+            "applicationProcess": clean_text_fields([ap.get("process_md", "") for ap in applicationProcess]),
             
             "eligibility": clean_text_field(eligibility.get("eligibilityDescription_md", "")),
             
@@ -120,7 +127,92 @@ def load_all_scheme_details() -> List[Dict]:
     
     return all_schemes
 
-async def reindex_schemes():
-    schemes = load_all_scheme_details()
+def list_detail_shards() -> List[str]:
+    """Scheme-detail shard paths in shard-number order, so duplicate ids resolve the same way every run."""
+    names = [fname for fname in os.listdir(DETAILS_DIR) if fname.endswith('.json')]
+    names.sort(key=lambda fname: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', fname)])
+    return [os.path.join(DETAILS_DIR, fname) for fname in names]
+
+def source_fingerprint(shards: List[str]) -> Dict[str, List[int]]:
+    """Size and mtime of every input file; the scheme store is rebuilt when any of them changes."""
+    paths = shards + ([SCHEMES_JSON_PATH] if os.path.exists(SCHEMES_JSON_PATH) else [])
+    return {os.path.basename(path): [os.path.getsize(path), os.stat(path).st_mtime_ns] for path in paths}
+
+def _init_ingest_worker(age_limits: Dict):
+    # Workers get the age limits from the parent instead of each parsing schemes.json again
+    global SCHEMES_AGE_LIMITS
+    SCHEMES_AGE_LIMITS = age_limits
+
+def _extract_shard(path: str) -> List[Tuple[str, bytes]]:
+    """Parses one shard and returns its extracted schemes as compact JSON lines."""
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    records = []
+    for scheme_id, scheme_obj in data.items():
+        scheme = extract_scheme_fields(scheme_obj, scheme_id)
+        if scheme.get("id"):
+            records.append((scheme_id, json.dumps(scheme, ensure_ascii=False, separators=(",", ":")).encode("utf-8")))
+    return records
+
+def build_scheme_store(path: str = None, workers: int = None) -> Dict[str, int]:
+    """
+    Parses the scheme-detail shards in parallel across a process pool and writes the
+    extracted schemes to the JSON Lines store at `path` (SCHEME_STORE_PATH by default).
+    """
+    path = path or settings.SCHEME_STORE_PATH
+    workers = workers or settings.INGEST_WORKERS or os.cpu_count()
+    shards = list_detail_shards()
+
+    if os.path.exists(SCHEMES_JSON_PATH):
+        age_limits = load_schemes_age_limits()
+    else:
+        # data/schemes.json is produced by scripts/fetch_schemes.ts and not checked in
+        logger.warning(f"{SCHEMES_JSON_PATH} not found, indexing without age limits")
+        age_limits = {}
+
+    writer = SchemeStoreWriter(path, source=source_fingerprint(shards))
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)) or 1, initializer=_init_ingest_worker, initargs=(age_limits,)) as pool:
+        # map yields shards in order as they finish, so only a few shards' records are held at once
+        for records in pool.map(_extract_shard, shards):
+            for scheme_id, line in records:
+                writer.write(scheme_id, line)
+    writer.close()
+
+    logger.info(f"Scheme store written: {len(writer.offsets)} schemes from {len(shards)} shards")
+    return {"shards": len(shards), "schemes": len(writer.offsets), "bytes": writer.position}
+
+def load_scheme_details(rebuild: bool = False) -> List[Dict]:
+    """
+    Extracted schemes from the scheme store, rebuilding it first when the shards changed.
+    Replaces `load_all_scheme_details`, which parses every shard serially on each call.
+    """
+    path = settings.SCHEME_STORE_PATH
+    if not rebuild and SchemeStore.exists(path):
+        store = SchemeStore(path)
+        try:
+            if store.source == source_fingerprint(list_detail_shards()):
+                return store.all()
+        finally:
+            store.close()
+    build_scheme_store(path)
+    store = SchemeStore(path)
+    try:
+        return store.all()
+    finally:
+        store.close()
+
+async def reindex_schemes(force_reindex: bool = False, incremental: bool = True, embedding_client=None, concurrency: int = None, progress=None):
+    """
+    Syncs the index with the scraped scheme details.
+    Incremental runs only re-embed schemes whose content changed since the last run;
+    `force_reindex` or `incremental=False` rebuilds every embedding.
+    `embedding_client`, `concurrency` and `progress` are passed on to the indexer (see `index_schemes`).
+    """
+    options = {"embedding_client": embedding_client, "concurrency": concurrency}
+    if progress is not None:
+        options["progress"] = progress
+    schemes = load_scheme_details(rebuild=force_reindex)
     print(len(schemes))
-    await index_schemes(schemes, force_reindex=True)
+    if incremental and not force_reindex:
+        return await update_index(schemes, **options)
+    return await index_schemes(schemes, force_reindex=force_reindex, **options)
@@ -0,0 +1,198 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Tuple
+import redis.asyncio as redis
+from core.embedding_search import get_active_index
+from core.embeddings import create_embedding_client
+from core.reindex_jobs import ReindexJobs, create_reindex_jobs, worker_name
+from core.settings import settings
+from service.reindex import reindex_schemes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ThrottledEmbeddingClient:
+    """
+    Embeds at most `texts_per_second` texts per second through `client` (0: no cap), spacing
+    the reindex's requests out so the serving workers keep most of the embedding API's rate limit.
+    """
+
+    def __init__(self, client, texts_per_second: float):
+        self.client = client
+        self.model = client.model
+        self.texts_per_second = texts_per_second
+        self.next_slot = 0.0
+        self.waited = 0.0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if self.texts_per_second > 0:
+            now = time.monotonic()
+            start = max(now, self.next_slot)
+            self.next_slot = start + len(texts) / self.texts_per_second
+            if start > now:
+                self.waited += start - now
+                await asyncio.sleep(start - now)
+        return await self.client.embed(texts)
+
+    async def close(self):
+        await self.client.close()
+
+
+class JobLost(Exception):
+    """Raised in the reindex once another worker has claimed its job."""
+
+
+class JobProgress:
+    """
+    The indexer's `progress` callback: records the phase, schemes processed, throughput and ETA on
+    the job, and aborts the reindex (before its next batch or the swap) once `lost` is set.
+    """
+
+    def __init__(self, job: Dict[str, any]):
+        self.job = job
+        self.embedding_started = None
+        self.lost = False
+
+    def __call__(self, phase: str, done: int, total: int):
+        if self.lost:
+            raise JobLost(f"Reindex job {self.job['id']} was claimed by another worker")
+        now = time.time()
+        self.job.update(phase=phase, processed=done, total=total)
+        if phase != "embedding":
+            self.job["eta_seconds"] = None
+            return
+        if self.embedding_started is None or done == 0:
+            self.embedding_started = now
+        elapsed = now - self.embedding_started
+        throughput = done / elapsed if elapsed > 0 else 0.0
+        self.job["throughput"] = round(throughput, 2)
+        self.job["eta_seconds"] = round((total - done) / throughput, 1) if throughput else None
+
+
+async def _reindex(job: Dict[str, any], progress: JobProgress) -> Tuple[Dict[str, any], float]:
+    """The reindex itself, with a throttled embedding client; its report and the seconds spent throttled."""
+    client = ThrottledEmbeddingClient(create_embedding_client(), settings.REINDEX_EMBED_RATE)
+    try:
+        report = await reindex_schemes(
+            force_reindex=job["force_reindex"],
+            incremental=job["incremental"],
+            embedding_client=client,
+            concurrency=settings.REINDEX_EMBEDDING_CONCURRENCY,
+            progress=progress,
+        )
+    finally:
+        await client.close()
+    return report, client.waited
+
+
+async def run_job(jobs: ReindexJobs, job: Dict[str, any], owner: str):
+    """
+    Runs one claimed job, saving its progress every REINDEX_PROGRESS_INTERVAL seconds. The reindex
+    runs on its own event loop in a thread: parsing the shards and writing the index block, and
+    the heartbeat must keep going meanwhile or another worker would take the job over. If another
+    worker did take it over (this one stalled for REINDEX_STALE_AFTER), the reindex is aborted and
+    the job is left to that worker.
+    """
+    logger.info(f"Running reindex job {job['id']} (force={job['force_reindex']}, incremental={job['incremental']})")
+    # Every progress field exists up front, so the thread only replaces values while the heartbeat serializes the job
+    job.update(phase="loading", processed=0, total=None, throughput=None, eta_seconds=None, error=None)
+    progress = JobProgress(job)
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(settings.REINDEX_PROGRESS_INTERVAL)
+            try:
+                if not await jobs.heartbeat(job, owner):
+                    logger.warning(f"Reindex job {job['id']} was claimed by another worker, aborting it")
+                    progress.lost = True
+                    return
+            except Exception as e:
+                logger.warning(f"Saving reindex job progress failed: {e}")
+
+    beat = asyncio.create_task(heartbeat())
+    started = time.perf_counter()
+    try:
+        report, throttled = await asyncio.to_thread(asyncio.run, _reindex(job, progress))
+    except JobLost:
+        return
+    except Exception as e:
+        logger.exception(f"Reindex job {job['id']} failed")
+        if not await jobs.finish(job, owner, "failed", error=str(e), seconds=round(time.perf_counter() - started, 1)):
+            logger.warning(f"Reindex job {job['id']} was claimed by another worker, leaving its outcome to that worker")
+        return
+    finally:
+        beat.cancel()
+        await asyncio.gather(beat, return_exceptions=True)
+    finished = await jobs.finish(
+        job, owner, "succeeded",
+        phase="done",
+        eta_seconds=None,
+        report=report,
+        version=get_active_index()["version"],
+        seconds=round(time.perf_counter() - started, 1),
+        throttled_seconds=round(throttled, 1),
+    )
+    if not finished:
+        logger.warning(f"Reindex job {job['id']} was claimed by another worker before it finished here")
+        return
+    logger.info(f"Reindex job {job['id']} finished: {report}")
+
+
+async def run_worker(once: bool = False):
+    """
+    Polls the job store and runs each reindex job in this process, at REINDEX_NICE CPU priority
+    so the serving workers get the CPU first. With `once`, returns when no job is waiting.
+    """
+    if settings.REINDEX_NICE:
+        os.nice(settings.REINDEX_NICE)
+    redis_conn = redis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True) if settings.REINDEX_QUEUE == "redis" else None
+    jobs = create_reindex_jobs(redis_conn)
+    owner = worker_name()
+    logger.info(f"Reindex worker {owner} polling the {settings.REINDEX_QUEUE} job queue")
+    try:
+        while True:
+            try:
+                job = await jobs.claim(owner)
+            except Exception as e:
+                logger.warning(f"Polling for reindex jobs failed: {e}")
+                job = None
+            if job is not None:
+                await run_job(jobs, job, owner)
+            elif once:
+                return
+            else:
+                await asyncio.sleep(settings.REINDEX_POLL_INTERVAL)
+    finally:
+        if redis_conn is not None:
+            await redis_conn.aclose()
+
+
+async def enqueue(force_reindex: bool, incremental: bool):
+    redis_conn = redis.from_url(settings.REDIS_URL, encoding="utf8", decode_responses=True) if settings.REINDEX_QUEUE == "redis" else None
+    try:
+        job, created = await create_reindex_jobs(redis_conn).enqueue(force_reindex, incremental)
+    finally:
+        if redis_conn is not None:
+            await redis_conn.aclose()
+    print(json.dumps({**job, "created_now": created}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run queued reindex jobs in the background, or queue one.",
+        epilog="cd backend && python -m service.reindex_worker. gunicorn.conf.py starts one next to the API when REINDEX_WORKER is set.",
+    )
+    parser.add_argument("--once", action="store_true", help="run the waiting job, if any, then exit")
+    parser.add_argument("--enqueue", action="store_true", help="queue a job instead of running the worker")
+    parser.add_argument("--full", action="store_true", help="with --enqueue: re-embed every scheme instead of an incremental sync")
+    parser.add_argument("--force", action="store_true", help="with --enqueue: discard an interrupted rebuild and re-parse the shards")
+    args = parser.parse_args()
+    if args.enqueue:
+        asyncio.run(enqueue(args.force, not args.full))
+    else:
+        asyncio.run(run_worker(args.once))
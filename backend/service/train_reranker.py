@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from core.embedding_search import get_active_index, get_detail_store, get_vector_index, query_schemes
+from core.embeddings import create_embedding_client, set_embedding_client
+from core.reranker import FEATURES, Reranker, candidate_features, read_selections
+from core.settings import settings
+from core.utils import MAX_AGE_CEILING, MIN_AGE_FLOOR, combine_conversation
+
+logger = logging.getLogger(__name__)
+
+CONVERSATIONS_PATH = os.path.join(os.path.dirname(__file__), "../benchmarks/data/conversations.jsonl")
+RECALL_KS = (5, 10)
+
+# One example: a query, its retrieved candidates (slim metadata, retrieval order) and the ids that are right for it
+Example = Tuple[str, List[Dict[str, any]], set]
+
+
+def synthetic_query(details: Dict[str, any], rng: random.Random) -> Optional[str]:
+    """
+    A user-like query for one scheme from its tags, state, age range and audience, without
+    its name, e.g. "stipend, skill upgradation in Andhra Pradesh, I am 32 years old".
+    """
+    tags = [tag.strip().lower() for tag in str(details.get("tags") or "").split(",") if tag.strip()]
+    if not tags:
+        return None
+    query = ", ".join(rng.sample(tags, min(len(tags), rng.randint(1, 3))))
+    level = str(details.get("level") or "").lower()
+    if details.get("state") and level != "central" and rng.random() < 0.7:
+        query += f" in {details['state']}"
+    min_age, max_age = int(details.get("minAge", MIN_AGE_FLOOR)), int(details.get("maxAge", MAX_AGE_CEILING))
+    if (min_age > MIN_AGE_FLOOR or max_age < MAX_AGE_CEILING) and rng.random() < 0.5:
+        query += f", I am {rng.randint(max(min_age, 1), min(max_age, 99))} years old"
+    if str(details.get("femaleOnly")) == "True" and rng.random() < 0.5:
+        query += ", I am a woman"
+    return query
+
+
+async def synthetic_examples(count: int, seed: int) -> List[Example]:
+    """Queries generated from `count` random schemes of the active index, labelled with their source scheme."""
+    rng = random.Random(seed)
+    index = get_vector_index()
+    store = get_detail_store()
+    examples = []
+    for scheme_id in rng.sample(index.ids, min(count, len(index.ids))):
+        # Age bounds and the women-only flag are index metadata, not details
+        query = synthetic_query({**store.get(scheme_id), **index.metadatas[index.row_by_id[scheme_id]]}, rng)
+        if query:
+            examples.append((query, await query_schemes(query, top_k=25), {scheme_id}))
+    return examples
+
+
+def selection_examples(paths: List[str]) -> List[Example]:
+    """Logged agent runs whose candidates are still in the active index, labelled with the agent's picks."""
+    index = get_vector_index()
+    examples = []
+    for path in paths:
+        for selection in read_selections(path):
+            candidates = [index.metadatas[index.row_by_id[i]] for i in selection["candidates"] if i in index.row_by_id]
+            if candidates and selection["picked"]:
+                examples.append((selection["query"], candidates, set(selection["picked"])))
+    return examples
+
+
+async def conversation_examples(path: str) -> List[Example]:
+    with open(path, encoding="utf-8") as f:
+        conversations = [json.loads(line) for line in f if line.strip()]
+    examples = []
+    for conversation in conversations:
+        if conversation.get("expected_ids"):
+            query = combine_conversation(conversation["conversation_history"], conversation["current_input"])
+            examples.append((query, await query_schemes(query, top_k=25), set(conversation["expected_ids"])))
+    return examples
+
+
+async def featurize(examples: List[Example], client) -> Tuple[List[Tuple[np.ndarray, np.ndarray]], List[List[float]]]:
+    """(features, labels) per example and the query vectors; one embedding call for all the queries."""
+    vectors = await client.embed([query for query, _, _ in examples]) if examples else []
+    data = [
+        (candidate_features(query, vector, candidates), np.array([c.get("id") in relevant for c in candidates], dtype=np.float32))
+        for (query, candidates, relevant), vector in zip(examples, vectors)
+    ]
+    return data, vectors
+
+
+def train(data: List[Tuple[np.ndarray, np.ndarray]], epochs: int, learning_rate: float, l2: float) -> Tuple[Dict[str, float], float]:
+    """
+    Logistic regression by full-batch gradient descent. Positives are weighted up to balance the
+    classes, since most candidates of a query are not picked.
+    """
+    x = np.concatenate([features for features, _ in data])
+    y = np.concatenate([labels for _, labels in data])
+    positive_weight = (len(y) - y.sum()) / max(y.sum(), 1.0)
+    sample_weight = np.where(y > 0, positive_weight, 1.0)
+    sample_weight /= sample_weight.sum()
+    weights = np.zeros(x.shape[1], dtype=np.float64)
+    bias = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+        error = (p - y) * sample_weight
+        weights -= learning_rate * (x.T @ error + l2 * weights)
+        bias -= learning_rate * error.sum()
+    # Balancing the classes inflates every probability; shift the bias back so scores estimate how often a candidate is picked
+    bias -= np.log(positive_weight)
+    return {name: float(w) for name, w in zip(FEATURES, weights)}, float(bias)
+
+
+def evaluate(reranker: Reranker, examples: List[Example], vectors: List[List[float]]) -> Dict[str, float]:
+    """
+    Retrieval order against the reranked order: recall@k, MRR, recall within the dynamic cutoff
+    (at most the recall of all the candidates),
+    how many candidates the cutoff keeps, how often the clear-winner rule would skip the agent
+    and how often that winner is right, plus the time of each `rank` + `cutoff` call.
+    """
+    rows, latencies = [], []
+    for (query, candidates, relevant), vector in zip(examples, vectors):
+        start = time.perf_counter()
+        ranked, scores = reranker.rank(query, vector, candidates)
+        keep = reranker.cutoff(scores)
+        direct = reranker.clear_winner(scores)
+        latencies.append((time.perf_counter() - start) * 1000)
+        retrieved_ids = [c.get("id") for c in candidates]
+        ranked_ids = [c.get("id") for c in ranked]
+        rows.append({
+            "recall of all candidates": _recall(retrieved_ids, relevant),
+            **{f"retrieval recall@{k}": _recall(retrieved_ids[:k], relevant) for k in RECALL_KS},
+            "retrieval mrr": _mrr(retrieved_ids, relevant),
+            **{f"reranked recall@{k}": _recall(ranked_ids[:k], relevant) for k in RECALL_KS},
+            "reranked mrr": _mrr(ranked_ids, relevant),
+            "recall within cutoff": _recall(ranked_ids[:keep], relevant),
+            "kept": keep,
+            "direct": float(direct),
+            "direct correct": float(direct and ranked_ids[0] in relevant),
+        })
+    if not rows:
+        return {}
+    report = {name: statistics.mean(row[name] for row in rows) for name in rows[0]}
+    report["examples"] = len(rows)
+    report["direct precision"] = report["direct correct"] / report["direct"] if report["direct"] else 0.0
+    latencies.sort()
+    report["rerank p50 ms"] = latencies[len(latencies) // 2]
+    report["rerank p95 ms"] = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return report
+
+
+def _recall(ids: List[str], relevant: set) -> float:
+    return len(relevant & set(ids)) / len(relevant)
+
+
+def _mrr(ids: List[str], relevant: set) -> float:
+    return next((1 / (i + 1) for i, scheme_id in enumerate(ids) if scheme_id in relevant), 0.0)
+
+
+def print_reports(reports: Dict[str, Dict[str, float]]):
+    names = [name for name in next(iter(reports.values()))]
+    print(f"{'':28}" + "".join(f"{label:>16}" for label in reports))
+    for name in names:
+        print(f"{name:28}" + "".join(f"{report.get(name, 0.0):16.3f}" for report in reports.values()))
+
+
+async def main(args):
+    logging.basicConfig(level=logging.WARNING)
+    client = create_embedding_client()
+    # Retrieval for the generated queries goes through the same client
+    set_embedding_client(client)
+    try:
+        synthetic = await synthetic_examples(args.synthetic, args.seed)
+        selections = selection_examples(args.selections or [])
+        examples = synthetic + selections
+        random.Random(args.seed).shuffle(examples)
+        held_out = max(1, int(len(examples) * args.held_out))
+        train_examples, test_examples = examples[held_out:], examples[:held_out]
+        conversations = await conversation_examples(args.conversations) if os.path.exists(args.conversations) else []
+
+        train_data, _ = await featurize(train_examples, client)
+        test_vectors = await client.embed([query for query, _, _ in test_examples]) if test_examples else []
+        conversation_vectors = await client.embed([query for query, _, _ in conversations]) if conversations else []
+
+        if args.eval_only:
+            reranker = Reranker.load(args.model)
+        else:
+            weights, bias = train([d for d in train_data if d[1].any()], args.epochs, args.learning_rate, args.l2)
+            reranker = Reranker(weights, bias, {
+                "trained": {
+                    "index_version": get_active_index()["version"],
+                    "embedding_backend": settings.EMBEDDING_BACKEND,
+                    "synthetic_queries": len(synthetic),
+                    "logged_selections": len(selections),
+                    "examples_with_positive": sum(bool(d[1].any()) for d in train_data),
+                },
+            })
+        reports = {
+            "held out": evaluate(reranker, test_examples, test_vectors),
+            "conversations": evaluate(reranker, conversations, conversation_vectors),
+        }
+    finally:
+        await client.close()
+
+    print(f"{len(train_examples)} training and {len(test_examples)} held-out queries, {len(conversations)} labelled conversations")
+    print("weights: " + ", ".join(f"{name} {w:+.2f}" for name, w in zip(FEATURES, reranker.weights)) + f", bias {reranker.bias:+.2f}")
+    print_reports({label: report for label, report in reports.items() if report})
+    if not args.eval_only:
+        reranker.save(args.model)
+        print(f"saved {args.model}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Train the local reranker on the active index and evaluate it against retrieval order.",
+        epilog="cd backend && python -m service.train_reranker --selections app.log. Training queries are generated "
+               "from the indexed schemes' tags, state and age range, plus any selections the recommendation agent made "
+               "(logged with RERANK_LOG_SELECTIONS). The labelled benchmark conversations are used for evaluation only.",
+    )
+    parser.add_argument("--selections", nargs="*", help="log files with yojana.selections lines")
+    parser.add_argument("--synthetic", type=int, default=2000, help="queries to generate from the scheme data")
+    parser.add_argument("--conversations", default=CONVERSATIONS_PATH, help="labelled conversations to evaluate on")
+    parser.add_argument("--held-out", type=float, default=0.2, help="share of the training queries kept for evaluation")
+    parser.add_argument("--model", default=settings.RERANKER_MODEL, help="where to write (or, with --eval-only, read) the model")
+    parser.add_argument("--eval-only", action="store_true", help="evaluate the saved model instead of training one")
+    parser.add_argument("--epochs", type=int, default=3000)
+    parser.add_argument("--learning-rate", type=float, default=2.0)
+    parser.add_argument("--l2", type=float, default=1e-4)
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main(parser.parse_args()))